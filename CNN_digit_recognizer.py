@@ -1,19 +1,41 @@
 import os
 os.environ["OMP_NUM_THREADS"] = "10"
 import sys
+import csv
+import glob
+import json
 import numpy as np
-from PIL import Image
 from simple_cnn import SimpleCNN
+from dataset_cache import build_dataset_cache, has_dataset_cache, load_dataset_cache, iter_minibatches
 import pickle
 
 # Configuration
 IMG_SIZE = 24
 NUM_CLASSES = 10
 DATA_DIR = "../Generate_Modified_Images/Dataset_24x24/"
-MODEL_FILE = "trained_model.pkl"
+MODEL_FILE = "trained_model.weights"
+# Pickle checkpoint written before model_format; read when MODEL_FILE is missing
+LEGACY_MODEL_FILE = "trained_model.pkl"
+# Architecture for train(): a simple_cnn.SPECS name or a layer spec string
+MODEL_SPEC = os.environ.get("MODEL_SPEC", "baseline")
+# Built by `python CNN_digit_recognizer.py preprocess`; train() uses it when present
+DATASET_CACHE_DIR = "dataset_cache"
+# Fraction of the dataset (in load order) used for training
+DATA_FRACTION = 0.25
 EPOCHS = 1
 LR = 0.01
-BATCH_SIZE = 1
+BATCH_SIZE = int(os.environ.get("TRAIN_BATCH_SIZE", "1"))
+# >1: split each batch across this many processes (parallel_train); use with a larger BATCH_SIZE
+WORKERS = int(os.environ.get("TRAIN_WORKERS", "0"))
+INFER_BATCH_SIZE = 64
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp")
+
+def load_image(image_path):
+    # PIL is imported on first use so the module (and infer's model load) starts quickly
+    from PIL import Image
+    img = Image.open(image_path).convert('L')
+    img = img.resize((IMG_SIZE, IMG_SIZE))
+    return np.asarray(img, dtype=np.float32) / 255.0
 
 def load_data(data_dir):
     X = []
@@ -25,14 +47,11 @@ def load_data(data_dir):
         for fname in os.listdir(folder):
             if fname.endswith(".jpg"):
                 img_path = os.path.join(folder, fname)
-                img = Image.open(img_path).convert('L')
-                img = img.resize((IMG_SIZE, IMG_SIZE))
-                arr = np.array(img) / 255.0
-                X.append(arr)
+                X.append(load_image(img_path))
                 y.append(label)
     
-    X = X[:len(X)//4]
-    y = y[:len(y)//4]
+    X = X[:int(len(X) * DATA_FRACTION)]
+    y = y[:int(len(y) * DATA_FRACTION)]
     # X = X[0]
     # y = y[0]
     X = np.array(X).reshape(-1, 1, IMG_SIZE, IMG_SIZE)
@@ -40,7 +59,7 @@ def load_data(data_dir):
     return X, y
 
 def one_hot(y, num_classes=10):
-    return np.eye(num_classes)[y]
+    return np.eye(num_classes, dtype=np.float32)[y]
 
 def cross_entropy_loss(pred, label):
     loss = -np.sum(label * np.log(pred + 1e-8)) / pred.shape[0]
@@ -49,64 +68,178 @@ def cross_entropy_loss(pred, label):
 def accuracy(pred, label):
     return np.mean(np.argmax(pred, axis=1) == np.argmax(label, axis=1))
 
+def preprocess(data_dir=DATA_DIR, cache_dir=DATASET_CACHE_DIR):
+    print(f"Preprocessing '{data_dir}' into '{cache_dir}'...")
+    count = build_dataset_cache(data_dir, cache_dir, img_size=IMG_SIZE, num_classes=NUM_CLASSES)
+    print(f"Cached {count} images.")
+
 def train():
-    print("Loading training data...")
-    X, y = load_data(DATA_DIR)
-    y_onehot = one_hot(y)
+    if has_dataset_cache(DATASET_CACHE_DIR):
+        print(f"Loading training data from cache '{DATASET_CACHE_DIR}'...")
+        images, labels = load_dataset_cache(DATASET_CACHE_DIR)
+        n = int(len(images) * DATA_FRACTION)
+        images, labels = images[:n], labels[:n]
+    else:
+        print("Loading training data...")
+        X, y = load_data(DATA_DIR)
+        images, labels = X.reshape(-1, IMG_SIZE, IMG_SIZE), y
 
-    model = SimpleCNN()
+    model = SimpleCNN(spec=MODEL_SPEC)
+    trainer = None
+    if WORKERS > 1:
+        from parallel_train import DataParallelTrainer
+        trainer = DataParallelTrainer(model, workers=WORKERS)
 
     print("Training model...")
-    for epoch in range(EPOCHS):
-        permutation = np.random.permutation(len(X))
-        X_shuffled, y_shuffled = X[permutation], y_onehot[permutation]
-
-        total_loss = 0
-        for i in range(0, len(X_shuffled), BATCH_SIZE):
-            x_batch = X_shuffled[i:i+BATCH_SIZE]
-            y_batch = y_shuffled[i:i+BATCH_SIZE]
-
-            output = model.forward(x_batch)
-            loss = cross_entropy_loss(output, y_batch)
-            total_loss += loss
-
-            d_out = (output - y_batch) / BATCH_SIZE
-            model.backward(d_out, LR)
-
-        acc = accuracy(model.forward(X), y_onehot)
-        print(f"Epoch {epoch+1}/{EPOCHS} - Loss: {total_loss:.4f}, Accuracy: {acc:.4f}")
+    try:
+        for epoch in range(EPOCHS):
+            total_loss = 0
+            for x_batch, y_labels in iter_minibatches(images, labels, BATCH_SIZE, shuffle=True):
+                y_batch = one_hot(y_labels)
+
+                if trainer is not None:
+                    loss, _ = trainer.step(x_batch, y_batch, LR)
+                    total_loss += loss
+                    continue
+
+                _, loss = model.train_step(x_batch, y_batch, LR)
+                total_loss += loss
+
+            correct = 0
+            with model.no_grad():
+                for x_batch, y_labels in iter_minibatches(images, labels, INFER_BATCH_SIZE, shuffle=False):
+                    correct += np.sum(np.argmax(model.forward(x_batch), axis=1) == y_labels)
+            acc = correct / len(labels)
+            print(f"Epoch {epoch+1}/{EPOCHS} - Loss: {total_loss:.4f}, Accuracy: {acc:.4f}")
+    finally:
+        if trainer is not None:
+            trainer.close()
 
     model.save(MODEL_FILE)
     print(f"Training completed. Model saved to '{MODEL_FILE}'.")
 
-def infer(image_path):
-    print(f"Loading model from '{MODEL_FILE}'...")
-    model = SimpleCNN()
-    model.load(MODEL_FILE)
-
-    img = Image.open(image_path).convert('L')
-    img = img.resize((IMG_SIZE, IMG_SIZE))
-    arr = np.array(img) / 255.0
-    x = arr.reshape(1, 1, IMG_SIZE, IMG_SIZE)
-
-    output = model.forward(x)
-    pred = np.argmax(output)
-    print(f"Predicted class: {pred}")
+def resolve_model_file(path=MODEL_FILE):
+    """
+    path, or LEGACY_MODEL_FILE when path is the default MODEL_FILE and only
+    the old pickle checkpoint exists. `python CNN_digit_recognizer.py convert`
+    rewrites that checkpoint as MODEL_FILE.
+    """
+    if path == MODEL_FILE and not os.path.exists(path) and os.path.exists(LEGACY_MODEL_FILE):
+        print(f"'{MODEL_FILE}' not found; reading the pickle checkpoint '{LEGACY_MODEL_FILE}'.")
+        return LEGACY_MODEL_FILE
+    return path
+
+def convert(src=LEGACY_MODEL_FILE, dst=MODEL_FILE):
+    """
+    One-shot conversion of a pickle checkpoint to the memory-mappable format.
+    """
+    SimpleCNN.from_file(src).save(dst)
+    print(f"Converted '{src}' to '{dst}'.")
+
+def expand_image_paths(specs):
+    """
+    Turns image files, directories and glob patterns into one sorted path list.
+    """
+    paths = []
+    for spec in specs:
+        if os.path.isdir(spec):
+            matches = [os.path.join(spec, f) for f in os.listdir(spec)
+                       if f.lower().endswith(IMAGE_EXTS)]
+        elif glob.has_magic(spec):
+            matches = [p for p in glob.glob(spec, recursive=True)
+                       if p.lower().endswith(IMAGE_EXTS)]
+        else:
+            matches = [spec]
+        paths.extend(sorted(matches))
+    return paths
+
+def write_predictions(results, output_path):
+    """
+    results: list of dicts with path / pred / confidence. Format from the extension.
+    """
+    if output_path.endswith(".json"):
+        with open(output_path, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        with open(output_path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=["path", "pred", "confidence"])
+            writer.writeheader()
+            writer.writerows(results)
+
+def infer(image_paths, batch_size=INFER_BATCH_SIZE, output_path=None):
+    """
+    image_paths: one path or a list of paths / directories / glob patterns.
+    The model is loaded once and images are decoded and forwarded
+    batch_size at a time. Predictions go to output_path (.csv or .json)
+    when given, else to stdout. Returns the list of result dicts.
+    """
+    if isinstance(image_paths, str):
+        image_paths = [image_paths]
+    paths = expand_image_paths(image_paths)
+    if not paths:
+        print("No images found.")
+        return []
+
+    model_file = resolve_model_file()
+    print(f"Loading model from '{model_file}'...")
+    model = SimpleCNN.from_file(model_file)
+    model.eval()
+
+    results = []
+    for i in range(0, len(paths), batch_size):
+        chunk = paths[i:i+batch_size]
+        x = np.stack([load_image(p) for p in chunk]).reshape(-1, 1, IMG_SIZE, IMG_SIZE)
+        output = model.forward(x)
+        preds = np.argmax(output, axis=1)
+        for path, pred, probs in zip(chunk, preds, output):
+            results.append({"path": path, "pred": int(pred), "confidence": float(probs[pred])})
+
+    if output_path is not None:
+        write_predictions(results, output_path)
+        print(f"Wrote {len(results)} predictions to '{output_path}'.")
+    elif len(results) == 1:
+        print(f"Predicted class: {results[0]['pred']}")
+    else:
+        for r in results:
+            print(f"{r['path']}: {r['pred']} ({r['confidence']:.3f})")
+    return results
 
 if __name__ == "__main__":
     if len(sys.argv) < 2:
         print("Usage:")
+        print("  python CNN_digit_recognizer.py preprocess   (decode the dataset once into a memory-mapped cache)")
         print("  python CNN_digit_recognizer.py train")
         print("  python CNN_digit_recognizer.py infer path_to_image.jpg")
+        print("  python CNN_digit_recognizer.py infer <images|dirs|'globs'...> [--batch-size N] [--output preds.csv|preds.json]")
+        print(f"  python CNN_digit_recognizer.py convert [{LEGACY_MODEL_FILE}] [{MODEL_FILE}]   (pickle checkpoint -> memory-mapped weights)")
+        print("Set MODEL_SPEC=pool16x / pool64x (or a layer spec, see simple_cnn.SPECS) to train a smaller model.")
+        print("For a resident, micro-batching service see: python inference_server.py --help")
+        print("Set MATMUL_BACKEND=hw (or emulator) to run the matmuls off the NumPy path.")
         sys.exit(1)
 
-    if sys.argv[1] == "train":
+    if sys.argv[1] == "preprocess":
+        preprocess()
+    elif sys.argv[1] == "train":
         train()
     elif sys.argv[1] == "infer":
-        if len(sys.argv) != 3:
-            print("Usage: python CNN_digit_recognizer.py infer path_to_image.jpg")
+        args = sys.argv[2:]
+        batch_size = INFER_BATCH_SIZE
+        output_path = None
+        specs = []
+        while args:
+            arg = args.pop(0)
+            if arg == "--batch-size" and args:
+                batch_size = int(args.pop(0))
+            elif arg == "--output" and args:
+                output_path = args.pop(0)
+            else:
+                specs.append(arg)
+        if not specs:
+            print("Usage: python CNN_digit_recognizer.py infer <images|dirs|'globs'...> [--batch-size N] [--output preds.csv|preds.json]")
             sys.exit(1)
-        infer(sys.argv[2])
+        infer(specs, batch_size=batch_size, output_path=output_path)
+    elif sys.argv[1] == "convert":
+        convert(*sys.argv[2:4])
     else:
         print(f"Unknown command: {sys.argv[1]}")
-        print("Use 'train' or 'infer'.")
+        print("Use 'preprocess', 'train', 'infer' or 'convert'.")
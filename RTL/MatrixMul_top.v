@@ -27,6 +27,7 @@ module MatrixMul_top #(
     wire [31:0] matrix_B [0:MAX_K*MAX_N-1];
     wire [31:0] matrix_C [0:MAX_M*MAX_N-1];
     wire A_loaded, B_loaded;
+    wire burst; // C is read back in the framing B was loaded with
 
     reg [15:0] c_size; // Size of matrix C, calculated as M * N
 
@@ -46,7 +47,8 @@ module MatrixMul_top #(
         .matrix_A(matrix_A),
         .matrix_B(matrix_B),
         .matrix_A_ready(A_loaded), // Ready signal for matrix A
-        .matrix_B_ready(B_loaded)   // Ready signal for matrix B
+        .matrix_B_ready(B_loaded),   // Ready signal for matrix B
+        .burst(burst)
     );
 
     MatrixMulEngine #(
@@ -79,6 +81,7 @@ module MatrixMul_top #(
         .cs_n(cs_n), // Assuming Serial_in[2] is CS_N
         .start_tx(send_c),
         .matrix_C(matrix_C),
+        .burst(burst),
         .done_tx(done)
     );
 
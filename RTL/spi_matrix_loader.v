@@ -18,7 +18,9 @@ module spi_matrix_loader #(
     output reg  [31:0] matrix_A [0:MAX_M*MAX_K-1],
     output reg  [31:0] matrix_B [0:MAX_K*MAX_N-1],
     output reg         matrix_A_ready,
-    output reg         matrix_B_ready
+    output reg         matrix_B_ready,
+    // Header bit 28 of the last A/B header: that matrix came in one CS frame
+    output reg         burst
 );
 
     // SPI interface
@@ -30,6 +32,7 @@ module spi_matrix_loader #(
     wire [31:0] tx_data = 32'h00000000;
     wire        tx_valid = 0;
     wire        tx_ready;
+    wire        cs_n_sync;
 
     spi_slave spi_inst (
         .clk       (clk),
@@ -43,9 +46,17 @@ module spi_matrix_loader #(
         .rx_ready  (rx_ready),
         .tx_data   (tx_data),
         .tx_valid  (tx_valid),
-        .tx_ready  (tx_ready)
+        .tx_ready  (tx_ready),
+        .burst     (1'b0),
+        .cs_n_sync (cs_n_sync)
     );
 
+    // Header word: [28] burst, [27:24] matrix tag (A or B), [23:12] rows,
+    // [11:0] cols; rows * cols data words follow, one per CS frame or, with
+    // the burst bit set, all in the header's CS frame. A burst whose CS is
+    // released before the last word is abandoned (the ready flag stays low)
+    // so the next header is not stored as data.
+
     // FSM states
     localparam IDLE       = 0,
                LOAD_DATA  = 1;
@@ -64,6 +75,7 @@ module spi_matrix_loader #(
             current_matrix <= 0;
             matrix_A_ready <= 0;
             matrix_B_ready <= 0;
+            burst <= 0;
             rx_ready <= 1;
             rx_data_d <= 0;
         end else begin
@@ -77,25 +89,35 @@ module spi_matrix_loader #(
                             4'hA: begin
                                 current_matrix <= 0;
                                 matrix_A_ready <= 0;
+                                burst <= rx_data[28];
+                                state <= LOAD_DATA;
                             end
                             4'hB: begin
                                 current_matrix <= 1;
                                 matrix_B_ready <= 0;
+                                burst <= rx_data[28];
+                                state <= LOAD_DATA;
                             end
                             default: begin
-                                // Unknown header; ignore and stay in IDLE
+                                // Unknown header (e.g. the idle MOSI words
+                                // clocked in while C is read back); ignore
+                                // and stay in IDLE. Loading them would
+                                // overwrite B while the engine, whose start
+                                // stays high, keeps recomputing C.
                             end
                         endcase
-                
+
                         rows <= rx_data[23:12];
                         cols <= rx_data[11:0];
                         load_count <= 0;
-                        state <= LOAD_DATA;
                     end
                 end
 
                 LOAD_DATA: begin
-                    if (rx_valid) begin
+                    if (burst && cs_n_sync && !rx_valid) begin
+                        // Burst cut short
+                        state <= IDLE;
+                    end else if (rx_valid) begin
                         if (!current_matrix)
                             matrix_A[load_count] <= rx_data;
                         else
@@ -11,12 +11,14 @@ module spi_matrix_sender #(
     input  wire        sclk,
     input  wire        mosi,
     input  wire        cs_n,
-    output reg        miso,
+    output wire        miso,
 
     // Control
     input  wire        start_tx,
     input  wire [31:0] matrix_C [0:MAX_M*MAX_N-1],
     input  wire [15:0] C_size,
+    // Read C back in one CS frame (B was loaded with header bit 28)
+    input  wire        burst,
     output reg         done_tx
 );
 
@@ -41,21 +43,29 @@ module spi_matrix_sender #(
         .rx_ready  (rx_ready),
         .tx_data   (tx_data),
         .tx_valid  (tx_valid),
-        .tx_ready  (tx_ready)
+        .tx_ready  (tx_ready),
+        .burst     (burst_tx),
+        .cs_n_sync ()
     );
 
-    // FSM states
+    // FSM states. Word framing: one C word per CS frame
+    // (WAIT_CS_LOW .. WAIT_CS_HIGH). Burst framing: the next C word is always
+    // waiting on tx_data/tx_valid and the slave takes it (tx_ready) as the
+    // previous one goes out; rx_valid marks the end of every word on the bus.
     typedef enum logic [2:0] {
         IDLE       = 3'b000,
         WAIT_CS_LOW = 3'b001,
         PULSE_VALID = 3'b010,
         WAIT_READY  = 3'b011,
         WAIT_CS_HIGH = 3'b100,
-        DONE       = 3'b101
+        DONE       = 3'b101,
+        BURST_SEND  = 3'b110,
+        BURST_DRAIN = 3'b111
     } state_t;
 
     state_t state;
     reg [15:0] send_index;
+    reg burst_tx;  // burst, latched for the whole readback
 
     always @(posedge clk or negedge rst_n) begin
         if (!rst_n) begin
@@ -64,6 +74,7 @@ module spi_matrix_sender #(
             tx_data    <= 0;
             tx_valid   <= 0;
             done_tx    <= 0;
+            burst_tx   <= 0;
         end else begin
             case (state)
                 IDLE: begin
@@ -72,7 +83,13 @@ module spi_matrix_sender #(
                     if (start_tx) begin
                         send_index <= 0;
                         tx_data <= matrix_C[0];
-                        state <= WAIT_CS_LOW;
+                        burst_tx <= burst;
+                        if (burst) begin
+                            tx_valid <= 1;
+                            state <= BURST_SEND;
+                        end else begin
+                            state <= WAIT_CS_LOW;
+                        end
                     end
                 end
 
@@ -111,6 +128,24 @@ module spi_matrix_sender #(
                     done_tx <= 1;
                     state <= IDLE;
                 end
+
+                BURST_SEND: begin
+                    if (tx_ready) begin
+                        if (send_index + 1 == C_size) begin
+                            tx_valid <= 0;
+                            state <= BURST_DRAIN;
+                        end else begin
+                            send_index <= send_index + 1;
+                            tx_data <= matrix_C[send_index + 1];
+                        end
+                    end
+                end
+
+                // Last word handed to the slave; done once it is on the wire
+                BURST_DRAIN: begin
+                    if (rx_valid)
+                        state <= DONE;
+                end
             endcase
         end
     end
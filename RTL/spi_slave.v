@@ -1,5 +1,21 @@
 `timescale 1ns/1ps
 
+// MOSI is sampled and MISO shifted on rising SCLK edges. sclk, mosi and
+// cs_n are registered together and edges are detected against a second
+// stage, so every SCLK level must last at least one clk period.
+//
+// A word completes on every 32nd rising edge while CS is low: rx_valid
+// pulses for one clk with rx_data. CS high restarts the count.
+//
+// TX, word framing (burst = 0): the word on tx_data is latched (tx_ready
+// pulse) while CS is low and no bit of the frame has been shifted yet.
+// TX, burst framing (burst = 1, from header bit 28 via the parent): a word
+// is latched as soon as the slave holds none, with CS high or low, and the
+// next one is taken on the last edge of the current word, so a sender that
+// keeps the next word on tx_data/tx_valid streams MISO across words in a
+// single CS frame.
+// A word is never latched on a clk that shifts, so a tx_ready pulse always
+// means the word will go out whole.
 module spi_slave (
     input  clk,
     input  rst_n,
@@ -14,17 +30,22 @@ module spi_slave (
 
     input  wire [31:0] tx_data,
     input  wire        tx_valid,
-    output reg         tx_ready
+    output reg         tx_ready,
+
+    input  wire        burst,
+    // cs_n as seen by the slave (same clk stage as the sampled SCLK/MOSI)
+    output reg         cs_n_sync
 );
 
-    reg [5:0] bit_cnt;
+    reg [4:0] bit_cnt;
     reg [31:0] shift_reg_rx;
     reg [31:0] shift_reg_tx;
-    reg sclk_d, sclk_prev;
-    reg captured;
+    reg sclk_d, sclk_prev, mosi_d;
+    reg tx_loaded;  // burst: shift_reg_tx holds a word not yet shifted out
 
-    wire sclk_rising  = (sclk == 1'b1 && sclk_prev == 1'b0);
-    wire sclk_falling = (sclk == 1'b0 && sclk_prev == 1'b1);
+    wire sclk_rising = (sclk_d == 1'b1 && sclk_prev == 1'b0);
+    wire shift       = (cs_n_sync == 1'b0) && sclk_rising;
+    wire word_end    = shift && (bit_cnt == 5'd31);
 
     always @(posedge clk or negedge rst_n) begin
         if (!rst_n) begin
@@ -34,51 +55,60 @@ module spi_slave (
             rx_data      <= 0;
             rx_valid     <= 0;
             tx_ready     <= 0;
+            tx_loaded    <= 0;
             miso         <= 0;
             sclk_d       <= 0;
             sclk_prev    <= 0;
-            captured     <= 0;
+            mosi_d       <= 0;
+            cs_n_sync    <= 1;
         end else begin
             sclk_d    <= sclk;
             sclk_prev <= sclk_d;
+            mosi_d    <= mosi;
+            cs_n_sync <= cs_n;
+
+            rx_valid <= 0;
+            tx_ready <= 0;
 
-            if (cs_n == 0) begin
-                // === RX ===
+            if (cs_n_sync == 0) begin
                 if (sclk_rising) begin
-                    shift_reg_rx <= {shift_reg_rx[30:0], mosi};
-                    bit_cnt <= bit_cnt + 1;
-                    captured <= 1;
-                end else begin
-                    captured <= 0;
-                end
+                    // === RX ===
+                    shift_reg_rx <= {shift_reg_rx[30:0], mosi_d};
+                    bit_cnt      <= bit_cnt + 1;  // wraps to 0 after the 32nd edge
+                    if (word_end) begin
+                        rx_data  <= {shift_reg_rx[30:0], mosi_d};
+                        rx_valid <= 1;
+                    end
 
-                if (bit_cnt == 6'd32) begin
-                    bit_cnt  <= 0;
-                    rx_data  <= shift_reg_rx;
-                    rx_valid <= 1;
-                end else begin
-                    rx_valid <= 0;
+                    // === TX ===
+                    miso         <= shift_reg_tx[31];
+                    shift_reg_tx <= {shift_reg_tx[30:0], 1'b0};
                 end
+            end else begin
+                // CS high ends the frame and restarts the RX bit count
+                bit_cnt <= 0;
+                miso    <= 0;
+            end
 
-                // === TX ===
-                if (bit_cnt == 0 && tx_valid) begin
+            // === TX: latch the next word ===
+            if (!burst) begin
+                if (cs_n_sync == 0 && bit_cnt == 0 && tx_valid && !shift) begin
                     shift_reg_tx <= tx_data;
                     tx_ready     <= 1;
-                end else begin
-                    tx_ready <= 0;
                 end
-
-                if (sclk_rising) begin
-                    miso         <= shift_reg_tx[31];
-                    shift_reg_tx <= {shift_reg_tx[30:0], 1'b0};
+            end else if (word_end) begin
+                // Last bit of this word is on its way out; the next word
+                // (if any) replaces the shifted register
+                if (tx_valid) begin
+                    shift_reg_tx <= tx_data;
+                    tx_ready     <= 1;
+                end else begin
+                    tx_loaded <= 0;
                 end
-            end else begin
-                // Reset on CS high
-                bit_cnt   <= 0;
-                rx_valid  <= 0;
-                tx_ready  <= 0;
-                miso      <= 0;
-                captured <= 0;
+            end else if (!tx_loaded && tx_valid && !shift) begin
+                shift_reg_tx <= tx_data;
+                tx_loaded    <= 1;
+                tx_ready     <= 1;
             end
         end
     end
@@ -0,0 +1,345 @@
+import argparse
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import time
+import numpy as np
+
+from simple_cnn import SimpleCNN, IMG_SIZE, NUM_CLASSES
+from conv2d import Conv2D
+from dense import Dense
+from matmul_backend import matmul, available_backends
+from matmul_cache import CACHE_DIR_ENV_VAR, set_default_cache
+from matrix_hw_wrapper import FIDELITIES
+
+# Reproducible benchmarks with a JSON history.
+#
+#   python benchmark.py list
+#   python benchmark.py run                              # numpy + emulator backends
+#   python benchmark.py run --backends all --filter matmul/hw
+#   python benchmark.py run --backends hw_server --filter spi/     # SPI transport cost
+#   python benchmark.py compare                          # latest run vs the one before
+#   python benchmark.py compare --baseline main-sweep --threshold 0.05
+#
+# Every run appends {"label", "time", "commit", "machine", "config",
+# "results": {name: stats}} to the history file. compare matches results by
+# name and flags a regression when the candidate's median is more than
+# threshold slower than the baseline's (exit status 1), so it can gate CI.
+# Inputs come from a fixed seed; the hardware backends run with the matmul
+# cache off so every repeat is a real simulation.
+#
+# For hw and hw_server, the spi/<backend>/<fidelity>/<shape> cases run each
+# GEMM once with full SPI transfers ("protocol") and once with backdoor
+# loads ("functional"); run prints their difference as the SPI transport
+# cost of that shape.
+HISTORY_FILE = "benchmark_history.json"
+# Conv GEMM shapes (M, K, N) of one 24x24 image through the baseline model
+MATMUL_SHAPES = ((576, 9, 8), (576, 72, 32), (576, 288, 64))
+# Backends that take seconds per call (simulation / bit-level emulation):
+# at most two repeats and no warm-up
+SLOW_BACKENDS = ("hw", "hw_server", "hw_farm", "emulator")
+DEFAULT_BACKENDS = ("numpy", "emulator")
+# Backends with a fidelity setting -> persistent flag for matrix_mul_hw
+FIDELITY_BACKENDS = {"hw": False, "hw_server": True}
+
+
+class Case:
+    def __init__(self, name, setup, slow=False):
+        """
+        setup() -> zero-argument callable that runs one iteration.
+        """
+        self.name = name
+        self.setup = setup
+        self.slow = slow
+
+
+def layer_inputs(model, batch_size, rng):
+    """
+    [(name, layer, input)] for every layer, from one training-mode forward.
+    """
+    x = rng.random((batch_size, 1, IMG_SIZE, IMG_SIZE), dtype=np.float32).astype(model.dtype)
+    inputs = []
+    for name in model.layers:
+        layer = getattr(model, name)
+        # Copied: layer outputs live in the model's reused workspace buffers
+        inputs.append((name, layer, x.copy()))
+        x = layer.forward(x)
+    return inputs
+
+
+def layer_cases(spec, batch_size):
+    cases = []
+    rng = np.random.default_rng(0)
+    model = SimpleCNN(spec=spec)
+    for name, layer, x in layer_inputs(model, batch_size, rng):
+        if not isinstance(layer, (Conv2D, Dense)):
+            continue
+        kind = "conv" if isinstance(layer, Conv2D) else "dense"
+        shape = "x".join(map(str, x.shape))
+
+        def forward(layer=layer, x=x):
+            layer.train(False)
+            return lambda: layer.forward(x)
+
+        def backward(layer=layer, x=x):
+            layer.train(True)
+            d_out = rng.standard_normal(layer.forward(x).shape).astype(layer.dtype)
+            return lambda: layer.backward(d_out)
+
+        cases.append(Case(f"{kind}/{name}/forward/{shape}", forward))
+        cases.append(Case(f"{kind}/{name}/backward/{shape}", backward))
+    return cases
+
+
+def model_cases(spec, batch_size, infer_batch_size):
+    def infer():
+        model = SimpleCNN(spec=spec).eval()
+        x = np.random.default_rng(0).random((infer_batch_size, 1, IMG_SIZE, IMG_SIZE), dtype=np.float32)
+        return lambda: model.forward(x)
+
+    def train_step():
+        rng = np.random.default_rng(0)
+        model = SimpleCNN(spec=spec).train()
+        x = rng.random((batch_size, 1, IMG_SIZE, IMG_SIZE), dtype=np.float32)
+        labels = np.eye(NUM_CLASSES, dtype=np.float32)[rng.integers(0, NUM_CLASSES, batch_size)]
+        # lr=0 keeps the weights, so every iteration does the same work
+        return lambda: model.train_step(x, labels, 0.0)
+
+    return [Case(f"model/{spec}/infer/b{infer_batch_size}", infer),
+            Case(f"model/{spec}/train_step/b{batch_size}", train_step)]
+
+
+def matmul_cases(backends):
+    cases = []
+    for backend in backends:
+        for M, K, N in MATMUL_SHAPES:
+            def setup(backend=backend, M=M, K=K, N=N):
+                rng = np.random.default_rng(0)
+                A = rng.uniform(-2, 2, (M, K)).astype(np.float32)
+                B = rng.uniform(-2, 2, (K, N)).astype(np.float32)
+                return lambda: matmul(A, B, backend)
+            cases.append(Case(f"matmul/{backend}/{M}x{K}x{N}", setup, slow=backend in SLOW_BACKENDS))
+    return cases
+
+
+def spi_cases(backends):
+    cases = []
+    for backend in backends:
+        if backend not in FIDELITY_BACKENDS:
+            continue
+        for fidelity in FIDELITIES:
+            for M, K, N in MATMUL_SHAPES:
+                def setup(persistent=FIDELITY_BACKENDS[backend], fidelity=fidelity, M=M, K=K, N=N):
+                    from tiled_matmul import matrix_mul_tiled
+                    from matrix_hw_wrapper import matrix_mul_hw
+                    rng = np.random.default_rng(0)
+                    A = rng.uniform(-2, 2, (M, K)).astype(np.float32)
+                    B = rng.uniform(-2, 2, (K, N)).astype(np.float32)
+                    hw = lambda A, B: matrix_mul_hw(A, B, persistent, cache=False, fidelity=fidelity)
+                    return lambda: matrix_mul_tiled(A, B, hw)
+                cases.append(Case(f"spi/{backend}/{fidelity}/{M}x{K}x{N}", setup, slow=True))
+    return cases
+
+
+def spi_transport(results):
+    """
+    [(backend/shape, seconds)]: protocol minus functional median for every
+    spi case measured in both fidelities.
+    """
+    rows = []
+    for name, stats in results.items():
+        parts = name.split("/")
+        if len(parts) != 4 or parts[0] != "spi" or parts[2] != "protocol":
+            continue
+        functional = results.get(f"spi/{parts[1]}/functional/{parts[3]}", {})
+        if "median_s" in stats and "median_s" in functional:
+            rows.append((f"{parts[1]}/{parts[3]}", stats["median_s"] - functional["median_s"]))
+    return rows
+
+
+def all_cases(spec="baseline", batch_size=16, infer_batch_size=64, backends=DEFAULT_BACKENDS):
+    return (layer_cases(spec, batch_size) + model_cases(spec, batch_size, infer_batch_size) +
+            matmul_cases(backends) + spi_cases(backends))
+
+
+def time_case(case, repeat, warmup=1, min_time=0.0):
+    """
+    Runs warmup untimed iterations, then at least repeat timed ones (more
+    while their total is under min_time). Returns stats in seconds.
+    """
+    fn = case.setup()
+    for _ in range(warmup):
+        fn()
+    times = []
+    while len(times) < repeat or sum(times) < min_time:
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return {
+        "repeat": len(times),
+        "min_s": min(times),
+        "median_s": statistics.median(times),
+        "mean_s": statistics.fmean(times),
+        "stdev_s": statistics.stdev(times) if len(times) > 1 else 0.0,
+    }
+
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def machine_info():
+    return {"platform": platform.platform(), "python": platform.python_version(),
+            "numpy": np.__version__, "cpus": os.cpu_count()}
+
+
+def load_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_history(path, history):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(history, f, indent=1)
+    os.replace(tmp_path, path)
+
+
+def find_run(history, ref):
+    """
+    ref: a label, or an index into the history (negative counts from the end).
+    """
+    for run in reversed(history):
+        if run.get("label") == ref:
+            return run
+    try:
+        return history[int(ref)]
+    except (ValueError, IndexError):
+        raise SystemExit(f"No benchmark run '{ref}' in history ({len(history)} runs)") from None
+
+
+def compare_runs(baseline, candidate, threshold):
+    """
+    Returns rows (name, baseline median, candidate median, ratio, status) for
+    every result present in both runs; status is "REGRESSION", "improved" or "".
+    """
+    rows = []
+    for name, cand in candidate["results"].items():
+        base = baseline["results"].get(name)
+        if base is None or "median_s" not in base or "median_s" not in cand:
+            continue
+        ratio = cand["median_s"] / base["median_s"]
+        status = "REGRESSION" if ratio > 1 + threshold else "improved" if ratio < 1 / (1 + threshold) else ""
+        rows.append((name, base["median_s"], cand["median_s"], ratio, status))
+    return rows
+
+
+def cmd_list(args):
+    for case in all_cases(args.spec, args.batch_size, args.infer_batch_size, args.backends):
+        print(case.name + ("  (slow)" if case.slow else ""))
+
+
+def cmd_run(args):
+    # Benchmark the simulation, not cache hits
+    os.environ.pop(CACHE_DIR_ENV_VAR, None)
+    set_default_cache(None)
+
+    cases = all_cases(args.spec, args.batch_size, args.infer_batch_size, args.backends)
+    if args.filter:
+        cases = [c for c in cases if re.search(args.filter, c.name)]
+
+    results = {}
+    for case in cases:
+        repeat = min(args.repeat, 2) if case.slow else args.repeat
+        try:
+            stats = time_case(case, repeat, warmup=0 if case.slow else 1,
+                              min_time=0.0 if case.slow else args.min_time)
+        except Exception as e:
+            # e.g. the cocotb flow is not installed; keep going with the rest
+            stats = {"error": f"{type(e).__name__}: {e}"}
+            print(f"{case.name:48s} ERROR {stats['error']}")
+        else:
+            print(f"{case.name:48s} {stats['median_s'] * 1e3:10.3f} ms  (min {stats['min_s'] * 1e3:.3f}, "
+                  f"n={stats['repeat']})")
+        results[case.name] = stats
+
+    for name, seconds in spi_transport(results):
+        print(f"SPI transport {name}: {seconds * 1e3:.1f} ms")
+
+    run = {
+        "label": args.label,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": git_commit(),
+        "machine": machine_info(),
+        "config": {"spec": args.spec, "batch_size": args.batch_size,
+                   "infer_batch_size": args.infer_batch_size, "backends": list(args.backends)},
+        "results": results,
+    }
+    history = load_history(args.history)
+    history.append(run)
+    save_history(args.history, history)
+    print(f"Appended run {len(history) - 1} to '{args.history}'.")
+
+
+def cmd_compare(args):
+    history = load_history(args.history)
+    if len(history) < 2 and args.baseline is None:
+        raise SystemExit(f"Need at least two runs in '{args.history}' to compare")
+    baseline = find_run(history, args.baseline if args.baseline is not None else -2)
+    candidate = find_run(history, args.candidate)
+    print(f"baseline:  {baseline.get('label') or ''} {baseline['time']} {baseline.get('commit') or ''}")
+    print(f"candidate: {candidate.get('label') or ''} {candidate['time']} {candidate.get('commit') or ''}")
+    if baseline.get("machine") != candidate.get("machine"):
+        print("warning: runs are from different machines or library versions")
+
+    rows = compare_runs(baseline, candidate, args.threshold)
+    print(f"{'benchmark':48s} {'base ms':>10s} {'new ms':>10s} {'ratio':>7s}")
+    for name, base, cand, ratio, status in rows:
+        print(f"{name:48s} {base * 1e3:10.3f} {cand * 1e3:10.3f} {ratio:7.2f} {status}")
+    regressions = [r for r in rows if r[4] == "REGRESSION"]
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}")
+        sys.exit(1)
+    print("No regressions.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SimpleCNN / matmul backend benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    for name in ("list", "run"):
+        p = sub.add_parser(name)
+        p.add_argument("--spec", default="baseline", help="SimpleCNN spec (see simple_cnn.SPECS)")
+        p.add_argument("--batch-size", type=int, default=16, help="layer and train_step batch size")
+        p.add_argument("--infer-batch-size", type=int, default=64)
+        p.add_argument("--backends", default=",".join(DEFAULT_BACKENDS),
+                       help="comma-separated matmul backends, or 'all'")
+        if name == "run":
+            p.add_argument("--filter", default=None, help="regex on benchmark names")
+            p.add_argument("--repeat", type=int, default=5)
+            p.add_argument("--min-time", type=float, default=0.2,
+                           help="keep repeating fast cases until this many seconds are timed")
+            p.add_argument("--label", default=None)
+            p.add_argument("--history", default=HISTORY_FILE)
+
+    p = sub.add_parser("compare")
+    p.add_argument("--history", default=HISTORY_FILE)
+    p.add_argument("--baseline", default=None, help="label or index (default: second to last run)")
+    p.add_argument("--candidate", default="-1", help="label or index (default: last run)")
+    p.add_argument("--threshold", type=float, default=0.10, help="allowed slowdown, e.g. 0.10 = 10%%")
+
+    args = parser.parse_args()
+    if args.command in ("list", "run"):
+        args.backends = available_backends() if args.backends == "all" else args.backends.split(",")
+    {"list": cmd_list, "run": cmd_run, "compare": cmd_compare}[args.command](args)
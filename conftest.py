@@ -0,0 +1,10 @@
+# The cocotb testbenches share the test_* prefix but run under make (see the
+# Makefile), not pytest; test_rtl_regression.py launches them from pytest.
+collect_ignore = [
+    "test_matrix_mul.py",
+    "test_matrix_mul_regression.py",
+    "test_matrix_mul_server.py",
+    "test_matrix_mul_spi.py",
+    "test_matrix_spi_transfer.py",
+    "test_spi_sender.py",
+]
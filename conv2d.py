@@ -1,8 +1,10 @@
 import numpy as np
-from matrix_hw_wrapper import matrix_mul_hw
+from matmul_backend import matmul
+from workspace import get_buffer
+from layer_profiler import span
 
 class Conv2D:
-    def __init__(self, in_channels, out_channels, kernel_size, stride=1, padding=0):
+    def __init__(self, in_channels, out_channels, kernel_size, stride=1, padding=0, backend=None, dtype=np.float32):
         if isinstance(kernel_size, int):
             self.kernel_size = (kernel_size, kernel_size)
         else:
@@ -12,21 +14,64 @@ class Conv2D:
         self.out_channels = out_channels
         self.stride = stride
         self.padding = padding
+        # Matmul backend name for this layer; None follows matmul_backend's default
+        self.backend = backend
+        # Parameters, activations and gradients are kept in this dtype
+        self.dtype = np.dtype(dtype)
 
-        self.weights = np.random.randn(out_channels, in_channels, *self.kernel_size) * 0.1
-        self.biases = np.zeros(out_channels)
+        self.weights = (np.random.randn(out_channels, in_channels, *self.kernel_size) * 0.1).astype(self.dtype)
+        self.biases = np.zeros(out_channels, dtype=self.dtype)
 
         self.grad_w = np.zeros_like(self.weights)
         self.grad_b = np.zeros_like(self.biases)
 
+        # Cache for backprop, only kept in training mode (see train())
+        self.training = True
         self.last_input = None
 
+        # Optional workspace.Workspace for temporaries; None allocates per call
+        self.workspace = None
+
+    def train(self, mode=True):
+        """
+        mode=False (eval): forward stops caching tensors for backward and
+        drops the ones already held.
+        """
+        self.training = mode
+        if not mode:
+            self.last_input = None
+
     def _pad_input(self, x):
         if self.padding == 0:
             return x
-        return np.pad(x, ((0, 0), (0, 0),
-                          (self.padding, self.padding),
-                          (self.padding, self.padding)), mode='constant')
+        if self.workspace is None:
+            return np.pad(x, ((0, 0), (0, 0),
+                              (self.padding, self.padding),
+                              (self.padding, self.padding)), mode='constant')
+        p = self.padding
+        batch_size, channels, in_h, in_w = x.shape
+        # Only the interior is ever written, so the border stays zero across calls
+        x_padded = self.workspace.get('x_padded', (batch_size, channels, in_h + 2 * p, in_w + 2 * p), self.dtype)
+        x_padded[:, :, p:p + in_h, p:p + in_w] = x
+        return x_padded
+
+    def _im2col(self, x_padded, out_h, out_w):
+        """
+        x_padded: (batch_size, in_channels, padded_h, padded_w)
+        Returns: (batch_size * out_h * out_w, in_channels * kh * kw)
+        Rows are ordered (b, i, j) and each row is a (C, kh, kw) window
+        flattened in C order, same layout as window.flatten().
+        """
+        kh, kw = self.kernel_size
+        batch_size = x_padded.shape[0]
+        # View of every kh x kw window: (B, C, H - kh + 1, W - kw + 1, kh, kw)
+        windows = np.lib.stride_tricks.sliding_window_view(x_padded, (kh, kw), axis=(2, 3))
+        windows = windows[:, :, ::self.stride, ::self.stride][:, :, :out_h, :out_w]
+        # (B, out_h, out_w, C, kh, kw) -> one row per output pixel
+        windows = windows.transpose(0, 2, 3, 1, 4, 5)
+        cols = get_buffer(self.workspace, 'cols', (batch_size * out_h * out_w, self.in_channels * kh * kw), self.dtype)
+        np.copyto(cols.reshape(windows.shape), windows)
+        return cols
 
     def matrix_mul_sw(self, A, B):
         """
@@ -37,19 +82,14 @@ class Conv2D:
         print(f"Matrix Mul SW: A shape: {A.shape}, B shape: {B.shape}")
         return np.dot(A, B)
 
-    def matrix_add_bias(self, C, bias):
-        """
-        C: (M, N)
-        bias: (N,)
-        Adds bias to each row of C
-        """
-        return C + bias
-
-    def forward(self, x):
+    def forward(self, x, backend=None):
         """
         x shape: (batch_size, in_channels, height, width)
+        backend: per-call matmul backend, overrides self.backend
         """
-        self.last_input = x
+        x = x.astype(self.dtype, copy=False)
+        if self.training:
+            self.last_input = x
         batch_size, _, in_h, in_w = x.shape
         kh, kw = self.kernel_size
         out_h = (in_h + 2 * self.padding - kh) // self.stride + 1
@@ -58,25 +98,18 @@ class Conv2D:
         x_padded = self._pad_input(x)
 
         # Prepare matrix A: each row is a flattened window
-        A = []
-        for b in range(batch_size):
-            for i in range(out_h):
-                for j in range(out_w):
-                    h_start = i * self.stride
-                    w_start = j * self.stride
-                    window = x_padded[b, :, h_start:h_start+kh, w_start:w_start+kw]
-                    A.append(window.flatten())
-        A = np.array(A)  # Shape: (batch_size * out_h * out_w, K)
+        A = self._im2col(x_padded, out_h, out_w)  # Shape: (batch_size * out_h * out_w, K)
 
         # Prepare matrix B: each column is a flattened filter
         B = self.weights.reshape(self.out_channels, -1).T  # Shape: (K, out_channels)
 
         # Multiply
         # C = self.matrix_mul_sw(A, B)  # Shape: (batch_size * out_h * out_w, out_channels)
-        C = matrix_mul_hw(A, B)  # Shape: (batch_size * out_h * out_w, out_channels)
+        C = get_buffer(self.workspace, 'out', (A.shape[0], self.out_channels), self.dtype)
+        matmul(A, B, backend if backend is not None else self.backend, out=C)  # Shape: (batch_size * out_h * out_w, out_channels)
 
         # Add bias
-        C = self.matrix_add_bias(C, self.biases)  # shape: (M, N)
+        C += self.biases  # shape: (M, N)
 
         # Reshape back to (batch_size, out_channels, out_h, out_w)
         C = C.reshape(batch_size, out_h, out_w, self.out_channels)
@@ -84,31 +117,56 @@ class Conv2D:
         return C
 
 
-    def backward(self, d_out, learning_rate):
+    def _col2im(self, cols, d_x_padded, out_h, out_w):
+        """
+        cols: (batch_size * out_h * out_w, in_channels * kh * kw)
+        Scatter-adds every window row back into d_x_padded (in place).
+        Inverse layout of _im2col; overlapping windows accumulate.
+        """
+        batch_size = d_x_padded.shape[0]
+        kh, kw = self.kernel_size
+        s = self.stride
+        # (B, out_h, out_w, C, kh, kw) -> (B, C, kh, kw, out_h, out_w)
+        cols = cols.reshape(batch_size, out_h, out_w, self.in_channels, kh, kw)
+        cols = cols.transpose(0, 3, 4, 5, 1, 2)
+        for ki in range(kh):
+            for kj in range(kw):
+                d_x_padded[:, :, ki:ki + s * out_h:s, kj:kj + s * out_w:s] += cols[:, :, ki, kj]
+        return d_x_padded
+
+    def backward(self, d_out, learning_rate=None):
         """
         d_out shape: same as output of forward
+        Stores the parameter gradients in grad_w / grad_b; applies them right
+        away when learning_rate is given, else leaves that to apply_gradients().
         """
         x = self.last_input
+        if x is None:
+            raise RuntimeError("Conv2D.backward needs a forward pass in training mode")
+        d_out = d_out.astype(self.dtype, copy=False)
         batch_size, _, in_h, in_w = x.shape
-        kh, kw = self.kernel_size
         x_padded = self._pad_input(x)
-        d_x_padded = np.zeros_like(x_padded)
-        d_w = np.zeros_like(self.weights)
-        d_b = np.zeros_like(self.biases)
+        d_x_padded = get_buffer(self.workspace, 'd_x_padded', x_padded.shape, self.dtype, zero=True)
 
         out_h = d_out.shape[2]
         out_w = d_out.shape[3]
 
-        for b in range(batch_size):
-            for oc in range(self.out_channels):
-                for i in range(out_h):
-                    for j in range(out_w):
-                        h_start = i * self.stride
-                        w_start = j * self.stride
-                        window = x_padded[b, :, h_start:h_start+kh, w_start:w_start+kw]
-                        d_w[oc] += d_out[b, oc, i, j] * window
-                        d_b[oc] += d_out[b, oc, i, j]
-                        d_x_padded[b, :, h_start:h_start+kh, w_start:w_start+kw] += d_out[b, oc, i, j] * self.weights[oc]
+        # Same patch matrix as forward: (batch_size * out_h * out_w, K)
+        A = self._im2col(x_padded, out_h, out_w)
+        # d_out as a GEMM operand: (batch_size * out_h * out_w, out_channels)
+        d_out_mat = get_buffer(self.workspace, 'd_out_mat', (A.shape[0], self.out_channels), self.dtype)
+        np.copyto(d_out_mat.reshape(batch_size, out_h, out_w, self.out_channels), d_out.transpose(0, 2, 3, 1))
+        W = self.weights.reshape(self.out_channels, -1)  # Shape: (out_channels, K)
+
+        d_w = get_buffer(self.workspace, 'grad_w', W.shape, self.dtype)
+        with span("matmul", "matmul", backend="numpy"):
+            np.dot(d_out_mat.T, A, out=d_w)
+        d_w = d_w.reshape(self.weights.shape)
+        d_b = np.sum(d_out_mat, axis=0, out=get_buffer(self.workspace, 'grad_b', self.biases.shape, self.dtype))
+        # A is no longer needed, so its buffer takes the column gradients
+        with span("matmul", "matmul", backend="numpy"):
+            d_x_cols = np.dot(d_out_mat, W, out=A)  # Shape: (batch_size * out_h * out_w, K)
+        self._col2im(d_x_cols, d_x_padded, out_h, out_w)
 
         # Remove padding from gradient if any
         if self.padding != 0:
@@ -116,8 +174,14 @@ class Conv2D:
         else:
             d_x = d_x_padded
 
-        # Update weights and biases
-        self.weights -= learning_rate * d_w
-        self.biases -= learning_rate * d_b
+        self.grad_w = d_w
+        self.grad_b = d_b
+        if learning_rate is not None:
+            self.apply_gradients(learning_rate)
 
         return d_x
+
+    def apply_gradients(self, learning_rate):
+        step = get_buffer(self.workspace, 'step_w', self.weights.shape, self.dtype)
+        self.weights -= np.multiply(self.grad_w, learning_rate, out=step)
+        self.biases -= learning_rate * self.grad_b
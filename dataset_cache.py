@@ -0,0 +1,105 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+# One-time preprocessed copy of the Dataset_24x24 tree.
+#
+#   <cache_dir>/images.npy : uint8 (N, IMG_SIZE, IMG_SIZE), opened with mmap
+#   <cache_dir>/labels.npy : uint8 (N,)
+#   <cache_dir>/meta.json  : source dir, image size, count
+#
+# Images are stored in the same order load_data() reads them (label folders
+# 0..9, os.listdir order inside each), so subsets taken by position match.
+IMAGES_FILE = "images.npy"
+LABELS_FILE = "labels.npy"
+META_FILE = "meta.json"
+CACHE_VERSION = 1
+
+
+def list_dataset(data_dir, num_classes=10):
+    """
+    Returns ([paths], [labels]) for every .jpg under data_dir/<label>/.
+    """
+    paths, labels = [], []
+    for label in range(num_classes):
+        folder = os.path.join(data_dir, str(label))
+        if not os.path.isdir(folder):
+            continue
+        for fname in os.listdir(folder):
+            if fname.endswith(".jpg"):
+                paths.append(os.path.join(folder, fname))
+                labels.append(label)
+    return paths, labels
+
+
+def _decode(args):
+    from PIL import Image
+    path, img_size = args
+    img = Image.open(path).convert('L')
+    img = img.resize((img_size, img_size))
+    return np.asarray(img, dtype=np.uint8)
+
+
+def build_dataset_cache(data_dir, cache_dir, img_size=24, num_classes=10, workers=None, chunksize=64):
+    """
+    Decodes every image in a process pool and writes them to cache_dir.
+    Returns the number of images written.
+    """
+    paths, labels = list_dataset(data_dir, num_classes)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    images_path = os.path.join(cache_dir, IMAGES_FILE)
+    tmp_path = images_path + ".tmp.npy"
+    images = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.uint8,
+                                       shape=(len(paths), img_size, img_size))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        jobs = ((p, img_size) for p in paths)
+        for i, img in enumerate(pool.map(_decode, jobs, chunksize=chunksize)):
+            images[i] = img
+    images.flush()
+    del images
+    os.replace(tmp_path, images_path)
+
+    np.save(os.path.join(cache_dir, LABELS_FILE), np.array(labels, dtype=np.uint8))
+    with open(os.path.join(cache_dir, META_FILE), "w") as f:
+        json.dump({"version": CACHE_VERSION, "data_dir": os.path.abspath(data_dir),
+                   "img_size": img_size, "count": len(paths)}, f, indent=2)
+    return len(paths)
+
+
+def has_dataset_cache(cache_dir):
+    return all(os.path.exists(os.path.join(cache_dir, f)) for f in (IMAGES_FILE, LABELS_FILE, META_FILE))
+
+
+def load_dataset_cache(cache_dir):
+    """
+    Returns (images, labels); images is a read-only uint8 memmap, so nothing
+    is read from disk until a batch touches it.
+    """
+    with open(os.path.join(cache_dir, META_FILE)) as f:
+        meta = json.load(f)
+    if meta.get("version") != CACHE_VERSION:
+        raise ValueError(f"Dataset cache '{cache_dir}' has version {meta.get('version')}, "
+                         f"expected {CACHE_VERSION}; rebuild it with 'preprocess'")
+    images = np.load(os.path.join(cache_dir, IMAGES_FILE), mmap_mode="r")
+    labels = np.load(os.path.join(cache_dir, LABELS_FILE))
+    return images, labels
+
+
+def iter_minibatches(images, labels, batch_size, shuffle=True, rng=None, dtype=np.float32):
+    """
+    Yields (x, y) with x as dtype (B, 1, H, W) in [0, 1] and y as int labels.
+    images may be the uint8 cache or an already scaled float array.
+    Only one batch is materialized at a time.
+    """
+    order = np.arange(len(images))
+    if shuffle:
+        (rng or np.random).shuffle(order)
+    for i in range(0, len(order), batch_size):
+        # Sorted indices read the memmap front to back within a batch
+        idx = np.sort(order[i:i+batch_size])
+        x = images[idx]
+        if x.dtype == np.uint8:
+            x = x.astype(dtype) / 255
+        yield x.reshape(len(idx), 1, *images.shape[1:]), labels[idx].astype(np.int64)
@@ -1,39 +1,86 @@
 import numpy as np
+from matmul_backend import matmul
+from workspace import get_buffer
+from layer_profiler import span
 
 class Dense:
-    def __init__(self, input_size, output_size):
+    def __init__(self, input_size, output_size, backend=None, dtype=np.float32):
+        # Parameters, activations and gradients are kept in this dtype
+        self.dtype = np.dtype(dtype)
+
         # Weight initialization
-        self.weights = np.random.randn(input_size, output_size) * 0.01
-        self.biases = np.zeros(output_size)
+        self.weights = (np.random.randn(input_size, output_size) * 0.01).astype(self.dtype)
+        self.biases = np.zeros(output_size, dtype=self.dtype)
+
+        self.grad_w = np.zeros_like(self.weights)
+        self.grad_b = np.zeros_like(self.biases)
 
-        # Cache for backprop
+        # Matmul backend name for this layer; None follows matmul_backend's default
+        self.backend = backend
+
+        # Cache for backprop, only kept in training mode (see train())
+        self.training = True
         self.last_input = None
         self.last_output = None
 
-    def sw_dot(self, A, B, C):
-        return np.dot(A, B) + C
+        # Optional workspace.Workspace for temporaries; None allocates per call
+        self.workspace = None
+
+    def train(self, mode=True):
+        """
+        mode=False (eval): forward stops caching tensors for backward and
+        drops the ones already held.
+        """
+        self.training = mode
+        if not mode:
+            self.last_input = None
+            self.last_output = None
+
+    def sw_dot(self, A, B, C, backend=None):
+        out = get_buffer(self.workspace, 'out', (A.shape[0], B.shape[1]), self.dtype)
+        matmul(A, B, backend if backend is not None else self.backend, out=out)
+        out += C
+        return out
     
-    def forward(self, x):
+    def forward(self, x, backend=None):
         """
         x shape: (batch_size, input_size)
         Returns: (batch_size, output_size)
+        backend: per-call matmul backend, overrides self.backend
         """
-        self.last_input = x
+        x = x.astype(self.dtype, copy=False)
         # output = np.dot(x, self.weights) + self.biases
-        output = self.sw_dot(x, self.weights, self.biases)
-        self.last_output = output
+        output = self.sw_dot(x, self.weights, self.biases, backend)
+        if self.training:
+            self.last_input = x
+            self.last_output = output
         return output
 
-    def backward(self, d_out, learning_rate):
+    def backward(self, d_out, learning_rate=None):
         """
         d_out shape: (batch_size, output_size)
+        Stores the parameter gradients in grad_w / grad_b; applies them right
+        away when learning_rate is given, else leaves that to apply_gradients().
         """
-        d_input = np.dot(d_out, self.weights.T)
-        d_weights = np.dot(self.last_input.T, d_out)
-        d_biases = np.sum(d_out, axis=0)
+        if self.last_input is None:
+            raise RuntimeError("Dense.backward needs a forward pass in training mode")
+        d_out = d_out.astype(self.dtype, copy=False)
+        batch_size = d_out.shape[0]
+        with span("matmul", "matmul", backend="numpy"):
+            d_input = np.dot(d_out, self.weights.T,
+                             out=get_buffer(self.workspace, 'd_input', (batch_size, self.weights.shape[0]), self.dtype))
+            d_weights = np.dot(self.last_input.T, d_out,
+                               out=get_buffer(self.workspace, 'grad_w', self.weights.shape, self.dtype))
+        d_biases = np.sum(d_out, axis=0, out=get_buffer(self.workspace, 'grad_b', self.biases.shape, self.dtype))
 
-        # Update weights and biases
-        self.weights -= learning_rate * d_weights
-        self.biases -= learning_rate * d_biases
+        self.grad_w = d_weights
+        self.grad_b = d_biases
+        if learning_rate is not None:
+            self.apply_gradients(learning_rate)
 
         return d_input
+
+    def apply_gradients(self, learning_rate):
+        step = get_buffer(self.workspace, 'step_w', self.weights.shape, self.dtype)
+        self.weights -= np.multiply(self.grad_w, learning_rate, out=step)
+        self.biases -= learning_rate * self.grad_b
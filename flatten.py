@@ -2,14 +2,21 @@ import numpy as np
 
 class Flatten:
     def __init__(self):
+        self.training = True
         self.original_shape = None
 
+    def train(self, mode=True):
+        self.training = mode
+        if not mode:
+            self.original_shape = None
+
     def forward(self, x):
         """
         x shape: (batch_size, channels, height, width)
         Returns: (batch_size, channels * height * width)
         """
-        self.original_shape = x.shape
+        if self.training:
+            self.original_shape = x.shape
         return x.reshape(x.shape[0], -1)
 
     def backward(self, d_out):
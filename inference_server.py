@@ -0,0 +1,223 @@
+import argparse
+import asyncio
+import collections
+import io
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from CNN_digit_recognizer import MODEL_FILE, IMG_SIZE, load_image, resolve_model_file
+from simple_cnn import SimpleCNN
+
+# Resident inference service for SimpleCNN.
+#
+# The model is loaded once. Each request is one image; concurrent requests are
+# coalesced into micro-batches (up to max_batch images, waiting at most
+# max_wait_ms after the first one arrives) and each batch runs as a single
+# SimpleCNN.forward on one compute thread, so the event loop keeps accepting
+# connections while a batch is in flight.
+#
+# Minimal HTTP/1.1 over TCP or a Unix socket:
+#   POST /predict   body = encoded image (jpg/png/...) -> {"pred", "confidence", "probs"}
+#   GET  /stats     -> queue depth, batch count, latency percentiles (ms)
+#   GET  /health    -> {"ok": true}
+#
+#   python inference_server.py --port 8000
+#   curl --data-binary @digit.jpg http://127.0.0.1:8000/predict
+
+MAX_BATCH = 64
+MAX_WAIT_MS = 5.0
+LATENCY_WINDOW = 10000
+
+
+class MicroBatcher:
+    """
+    Queues single images and runs them through forward_fn in batches.
+    forward_fn: (B, 1, H, W) array -> (B, NUM_CLASSES) probabilities.
+    """
+
+    def __init__(self, forward_fn, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS):
+        self.forward_fn = forward_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.queue = asyncio.Queue()
+        # One thread: SimpleCNN layers keep per-forward state, so batches must not overlap
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self.batches = 0
+        self.requests = 0
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.executor.shutdown(wait=True)
+
+    async def predict(self, x):
+        """
+        x: (1, H, W) image. Resolves to its probability vector.
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((x, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self):
+        items = [await self.queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(items) < self.max_batch:
+            try:
+                items.append(self.queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            # Not asyncio.wait_for: before Python 3.12 its timeout can cancel a
+            # get() that has already taken an item, and that request is lost
+            get_task = asyncio.ensure_future(self.queue.get())
+            try:
+                await asyncio.wait({get_task}, timeout=timeout)
+            finally:
+                if not get_task.done():
+                    get_task.cancel()
+            try:
+                items.append(await get_task)
+            except asyncio.CancelledError:
+                break
+        return items
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            items = await self._collect()
+            x = np.stack([item[0] for item in items])
+            try:
+                probs = await loop.run_in_executor(self.executor, self.forward_fn, x)
+            except Exception as e:
+                for _, future, _ in items:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            done = time.perf_counter()
+            self.batches += 1
+            for (_, future, start), p in zip(items, probs):
+                self.latencies.append(done - start)
+                self.requests += 1
+                if not future.done():
+                    future.set_result(p)
+
+    def stats(self):
+        lat_ms = np.array(self.latencies) * 1000.0
+        percentiles = {}
+        if len(lat_ms):
+            for q in (50, 90, 99):
+                percentiles[f"p{q}"] = float(np.percentile(lat_ms, q))
+        return {
+            "queue_depth": self.queue.qsize(),
+            "requests": self.requests,
+            "batches": self.batches,
+            "mean_batch_size": self.requests / self.batches if self.batches else 0.0,
+            "latency_ms": percentiles,
+        }
+
+
+class InferenceServer:
+    def __init__(self, model_file=MODEL_FILE, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS, backend=None):
+        self.model = SimpleCNN.from_file(resolve_model_file(model_file), backend=backend)
+        self.model.eval()
+        self.batcher = MicroBatcher(self.model.forward, max_batch, max_wait_ms)
+
+    async def _respond(self, writer, status, payload):
+        body = json.dumps(payload).encode()
+        reason = {200: "OK", 400: "Bad Request", 404: "Not Found", 500: "Internal Server Error"}[status]
+        writer.write(f"HTTP/1.1 {status} {reason}\r\n"
+                     f"Content-Type: application/json\r\n"
+                     f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+        await writer.drain()
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode().split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode().partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                if method == "GET" and path == "/health":
+                    await self._respond(writer, 200, {"ok": True})
+                elif method == "GET" and path == "/stats":
+                    await self._respond(writer, 200, self.batcher.stats())
+                elif method == "POST" and path == "/predict":
+                    try:
+                        x = load_image(io.BytesIO(body)).reshape(1, IMG_SIZE, IMG_SIZE)
+                    except Exception as e:
+                        await self._respond(writer, 400, {"error": f"Could not decode image: {e}"})
+                    else:
+                        try:
+                            probs = await self.batcher.predict(x)
+                        except Exception as e:
+                            await self._respond(writer, 500, {"error": str(e)})
+                        else:
+                            pred = int(np.argmax(probs))
+                            await self._respond(writer, 200, {"pred": pred, "confidence": float(probs[pred]),
+                                                              "probs": [float(p) for p in probs]})
+                else:
+                    await self._respond(writer, 404, {"error": f"No route for {method} {path}"})
+
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=8000, unix_path=None):
+        self.batcher.start()
+        if unix_path is not None:
+            server = await asyncio.start_unix_server(self._handle, path=unix_path)
+            where = unix_path
+        else:
+            server = await asyncio.start_server(self._handle, host, port)
+            where = f"http://{host}:{port}"
+        print(f"Serving SimpleCNN on {where}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await self.batcher.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micro-batching SimpleCNN inference service")
+    parser.add_argument("--model", default=MODEL_FILE)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--unix", default=None, help="serve on this Unix socket path instead of TCP")
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH)
+    parser.add_argument("--max-wait-ms", type=float, default=MAX_WAIT_MS)
+    parser.add_argument("--backend", default=None, help="matmul backend (default: $MATMUL_BACKEND or numpy)")
+    args = parser.parse_args()
+
+    server = InferenceServer(args.model, args.max_batch, args.max_wait_ms, args.backend)
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,190 @@
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+# Per-layer instrumentation for SimpleCNN.
+#
+#     with LayerProfiler() as prof:
+#         model.forward(x)
+#     prof.print_summary()
+#     prof.export_json("layer_profile.json")
+#     prof.export_chrome_trace("layer_trace.json")   # chrome://tracing / Perfetto
+#
+# While a profiler is active, every compiled-graph op records a span per
+# forward/backward with wall time, FLOPs and (with track_memory) the peak
+# bytes allocated inside it. matmul_backend.matmul and the hardware wrappers
+# open nested "matmul" and "hw" spans, and each span's time is also added to
+# every enclosing span, so a layer reports its matmul time and, within that,
+# the time spent in the RTL simulation. Only the thread that started a
+# profiler records into it (sim_farm workers run untracked; the farm times
+# its dispatch from the calling thread).
+
+_active = []
+
+
+def active():
+    """
+    The innermost running LayerProfiler started on this thread, or None (the
+    common, zero-cost case).
+    """
+    if not _active:
+        return None
+    prof = _active[-1]
+    return prof if prof._thread == threading.get_ident() else None
+
+
+class _NullSpan:
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name, kind, **args):
+    """
+    Context manager for a nested span on the active profiler; a no-op when
+    none is running.
+    """
+    prof = active()
+    if prof is None:
+        return _NULL_SPAN
+    return prof.span(name, kind, **args)
+
+
+class _Span:
+    def __init__(self, prof, name, kind, args):
+        self.prof = prof
+        self.event = {"name": name, "kind": kind, "args": args}
+
+    def __enter__(self):
+        prof = self.prof
+        event = self.event
+        event["depth"] = len(prof._stack)
+        event["nested_s"] = {}
+        if prof.track_memory:
+            event["_mem_start"] = tracemalloc.get_traced_memory()[0]
+            # Peaks of enclosing spans are folded in before resetting
+            for parent in prof._stack:
+                parent["_mem_peak"] = max(parent.get("_mem_peak", 0), tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        prof._stack.append(event)
+        event["start"] = time.perf_counter()
+        return event
+
+    def __exit__(self, *exc):
+        prof = self.prof
+        event = self.event
+        end = time.perf_counter()
+        event["dur_s"] = end - event["start"]
+        prof._stack.pop()
+        if prof.track_memory:
+            peak = max(event.pop("_mem_peak", 0), tracemalloc.get_traced_memory()[1])
+            event["bytes_allocated"] = max(0, peak - event.pop("_mem_start"))
+            for parent in prof._stack:
+                parent["_mem_peak"] = max(parent.get("_mem_peak", 0), peak)
+        for parent in prof._stack:
+            parent["nested_s"][event["kind"]] = parent["nested_s"].get(event["kind"], 0.0) + event["dur_s"]
+        prof.events.append(event)
+        return False
+
+
+class LayerProfiler:
+    """
+    Collects spans while active (inside a with block, or between start() and
+    stop()). track_memory uses tracemalloc, which NumPy reports its buffers
+    to; it slows everything down, so it is off by default.
+    """
+
+    def __init__(self, track_memory=False):
+        self.track_memory = track_memory
+        self.events = []
+        self._stack = []
+        self._t0 = None
+        self._thread = None
+        self._started_tracemalloc = False
+
+    def start(self):
+        self._t0 = time.perf_counter()
+        self._thread = threading.get_ident()
+        if self.track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        _active.append(self)
+        return self
+
+    def stop(self):
+        _active.remove(self)
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def span(self, name, kind, **args):
+        return _Span(self, name, kind, args)
+
+    def layer_events(self):
+        return [e for e in self.events if e["kind"] in ("forward", "backward")]
+
+    def summary(self):
+        """
+        Totals per (layer op, phase), in first-seen order.
+        """
+        rows = {}
+        for e in self.layer_events():
+            key = (e["name"], e["kind"])
+            row = rows.setdefault(key, {"layer": e["name"], "phase": e["kind"], "calls": 0, "time_s": 0.0,
+                                        "flops": 0, "bytes_allocated": 0, "matmul_s": 0.0, "hw_s": 0.0})
+            row["calls"] += 1
+            row["time_s"] += e["dur_s"]
+            row["flops"] += e["args"].get("flops", 0)
+            row["bytes_allocated"] += e.get("bytes_allocated", 0)
+            row["matmul_s"] += e["nested_s"].get("matmul", 0.0)
+            row["hw_s"] += e["nested_s"].get("hw", 0.0)
+        return list(rows.values())
+
+    def print_summary(self):
+        rows = self.summary()
+        total = sum(r["time_s"] for r in rows) or 1.0
+        print(f"{'layer':28s} {'phase':8s} {'calls':>5s} {'ms':>9s} {'%':>6s} {'GFLOP/s':>8s} "
+              f"{'MB alloc':>9s} {'matmul ms':>10s} {'hw ms':>9s}")
+        for r in rows:
+            gflops = r["flops"] / r["time_s"] / 1e9 if r["time_s"] > 0 else 0.0
+            print(f"{r['layer']:28s} {r['phase']:8s} {r['calls']:5d} {r['time_s'] * 1e3:9.2f} "
+                  f"{100 * r['time_s'] / total:6.1f} {gflops:8.2f} {r['bytes_allocated'] / 1e6:9.2f} "
+                  f"{r['matmul_s'] * 1e3:10.2f} {r['hw_s'] * 1e3:9.2f}")
+
+    def export_json(self, path):
+        events = [{k: v for k, v in e.items() if not k.startswith("_")} for e in self.events]
+        for e in events:
+            e["start_s"] = e.pop("start") - self._t0
+        with open(path, "w") as f:
+            json.dump({"summary": self.summary(), "events": events}, f, indent=2)
+
+    def export_chrome_trace(self, path):
+        """
+        Chrome trace event format: one complete ("X") event per span, nested
+        by time on a single track.
+        """
+        pid = os.getpid()
+        trace = []
+        for e in self.events:
+            args = dict(e["args"])
+            if "bytes_allocated" in e:
+                args["bytes_allocated"] = e["bytes_allocated"]
+            for kind, seconds in e["nested_s"].items():
+                args[f"{kind}_ms"] = seconds * 1e3
+            trace.append({"name": e["name"], "cat": e["kind"], "ph": "X", "pid": pid, "tid": 0,
+                          "ts": (e["start"] - self._t0) * 1e6, "dur": e["dur_s"] * 1e6, "args": args})
+        with open(path, "w") as f:
+            json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f)
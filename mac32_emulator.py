@@ -0,0 +1,418 @@
+import numpy as np
+from tiled_matmul import plan_tiles
+
+# Bit-exact NumPy model of RTL/MAC32_top.v and the DotProductEngine /
+# MatrixMulEngine accumulation around it.
+#
+# Every signal of the MAC datapath (R4Booth, WallaceTree, PreNormalizer,
+# CSA/EACAdder, MSBIncrementer, LeadingOneDetector, Normalizer, Rounder) is
+# computed with the same widths and the same case order as the RTL, on uint64
+# arrays so one call evaluates all M x N outputs at once. Signals wider than
+# 64 bits (the 74..76-bit aligned/normalized mantissas) are kept as (hi, lo)
+# pairs of 64-bit limbs.
+#
+# This reproduces the hardware, not IEEE-754: the MAC rounds toward +inf
+# (Rounder "RUP logic"), and edge cases such as overflow, NaN operands or a
+# product far below A's ulp follow the RTL behaviour.
+#
+# Cost: about 1 us per multiply-accumulate, whatever the shape (the K loop
+# already runs every M x N accumulator at once; smaller blocks only add
+# NumPy call overhead). One 576x288x64 conv3 GEMM takes ~10 s, a baseline
+# SimpleCNN forward ~17M MACs, i.e. ~15-20 s per 24x24 image. That is far
+# faster than the RTL simulation, but a full-dataset accuracy study on this
+# backend still runs for hours per thousand images; evaluate on a subset.
+
+_U = np.uint64
+
+PARM_MANT = 23
+PARM_BIAS = 127
+
+
+def _m(width):
+    return _U((1 << width) - 1)
+
+
+def _bit(x, i):
+    return (x >> _U(i)) & _U(1)
+
+
+def _sl(x, n):
+    """x << n for per-element n, 0 once n >= 64 (C shifts are undefined there)."""
+    n = np.asarray(n, dtype=_U)
+    return np.where(n < 64, x << np.minimum(n, _U(63)), _U(0))
+
+
+def _sr(x, n):
+    n = np.asarray(n, dtype=_U)
+    return np.where(n < 64, x >> np.minimum(n, _U(63)), _U(0))
+
+
+# --- 128-bit (hi, lo) helpers for the wide mantissa signals ---
+
+def _w_shl(hi, lo, n):
+    if isinstance(n, int):
+        if n == 0:
+            return hi, lo
+        if n < 64:
+            return (hi << _U(n)) | (lo >> _U(64 - n)), lo << _U(n)
+        return lo << _U(n - 64), _U(0) * lo
+    n = np.asarray(n, dtype=_U)
+    small = n < 64
+    n_lo = np.where(small, n, _U(0))
+    n_hi = np.where(small, _U(0), n - _U(64))
+    hi_small = _sl(hi, n_lo) | _sr(lo, _U(64) - n_lo)
+    return np.where(small, hi_small, _sl(lo, n_hi)), np.where(small, _sl(lo, n_lo), _U(0))
+
+
+def _w_shr(hi, lo, n):
+    if isinstance(n, int):
+        if n == 0:
+            return hi, lo
+        if n < 64:
+            return hi >> _U(n), (lo >> _U(n)) | (hi << _U(64 - n))
+        return _U(0) * hi, hi >> _U(n - 64)
+    n = np.asarray(n, dtype=_U)
+    small = n < 64
+    n_lo = np.where(small, n, _U(0))
+    n_hi = np.where(small, _U(0), n - _U(64))
+    lo_small = _sr(lo, n_lo) | _sl(hi, _U(64) - n_lo)
+    return np.where(small, _sr(hi, n_lo), _U(0)), np.where(small, lo_small, _sr(hi, n_hi))
+
+
+def _w_mask(hi, lo, width):
+    return hi & _m(width - 64), lo
+
+
+def _w_bits(hi, lo, msb, lsb):
+    """x[msb:lsb] of a (hi, lo) value; the slice must be at most 64 bits wide."""
+    return _w_shr(hi, lo, lsb)[1] & _m(msb - lsb + 1)
+
+
+def _w_concat(upper, lower, lower_width):
+    """{upper, lower} where lower has lower_width (<= 64) bits."""
+    hi, lo = _w_shl(_U(0) * upper, upper, lower_width)
+    return hi, lo | lower
+
+
+def _csa(a, b, c):
+    """Compressor32 / FullAdder array: bitwise sum and carry."""
+    return a ^ b ^ c, (a & b) | (b & c) | (c & a)
+
+
+# --- MAC32_top submodules ---
+
+def _booth_pp(mant_a, mant_b):
+    """R4Booth: MantA_i is the multiplicand, MantB_i is recoded."""
+    pad = mant_b << _U(1)  # {2'd0, MantB_i, 1'd0}
+    pp_raw = []
+    sign = []
+    for j in range(13):
+        b0 = _bit(pad, 2 * j)
+        b1 = _bit(pad, 2 * j + 1)
+        b2 = _bit(pad, 2 * j + 2)
+        mul1x = b0 ^ b1
+        mul2x = ((b0 ^ _U(1)) & (b1 ^ _U(1)) & b2) | (b0 & b1 & (b2 ^ _U(1)))
+        # mul1x and mul2x are exclusive; a negative digit inverts the 25-bit row
+        tmp = mant_a * mul1x + (mant_a << _U(1)) * mul2x
+        pp_raw.append(tmp ^ (_m(PARM_MANT + 2) * b2))
+        sign.append(b2)
+
+    pp = [pp_raw[0] | (sign[0] << _U(25)) | (sign[0] << _U(26)) | ((sign[0] ^ _U(1)) << _U(27))]
+    for j in range(1, 12):
+        pp.append(sign[j - 1] << _U(2 * (j - 1))
+                  | pp_raw[j] << _U(2 * j)
+                  | (sign[j] ^ _U(1)) << _U(2 * j + 25)
+                  | _U(1) << _U(2 * j + 26))
+    pp.append(sign[11] << _U(22) | (pp_raw[12] & _m(PARM_MANT + 1)) << _U(24))
+    return pp
+
+
+def _wallace(pp):
+    """WallaceTree: returns (sum, carry, suppression_sign_extension), 49-bit."""
+    m49 = _m(2 * PARM_MANT + 3)
+
+    def sh(x):
+        return (x << _U(1)) & m49
+
+    s0, c0 = _csa(pp[0], pp[1], pp[2])
+    s1, c1 = _csa(pp[3], pp[4], pp[5])
+    s2, c2 = _csa(pp[6], pp[7], pp[8])
+    s3, c3 = _csa(pp[9], pp[10], pp[11])
+
+    s4, c4 = _csa(s0, sh(c0), s1)
+    s5, c5 = _csa(sh(c1), s2, sh(c2))
+    s6, c6 = _csa(s3, sh(c3), pp[12])
+
+    s7, c7 = _csa(s4, sh(c4), s5)
+    s8, c8 = _csa(sh(c5), s6, sh(c6))
+
+    # Compressor42 (its inner Compressor32s default to XLEN = 49)
+    top_sum, top_carry = _csa(s7, sh(c7), s8)
+    w_sum, w_carry = _csa(top_sum, sh(top_carry), sh(c8))
+
+    msb = 2 * PARM_MANT + 2
+    suppression = _U(0) * w_sum
+    for c in (c3, c4, c5, c6, c7, c8, top_carry):
+        suppression = suppression | _bit(c, msb)
+    return w_sum, w_carry, suppression
+
+
+def _leading_one(hi, lo):
+    """LeadingOneDetector_Top(74): (shift_num, allzero) over data[72:0]."""
+    data_hi, data_lo = _w_mask(hi, lo, 73)
+    # index of the highest set bit in data[72:0]; bit 0 / all-zero both give 72
+    msb_hi = np.where(data_hi != 0, _U(64) + _floor_log2(data_hi), _U(0))
+    msb_lo = np.where(data_lo != 0, _floor_log2(data_lo), _U(0))
+    msb = np.where(data_hi != 0, msb_hi, msb_lo)
+    shift_num = _U(72) - msb
+    allzero = ((data_hi == 0) & (data_lo == 0)).astype(_U)
+    return shift_num, allzero
+
+
+def _floor_log2(x):
+    """floor(log2(x)) for x >= 1 (0 maps to 0), exact for all 64-bit values."""
+    x = np.asarray(x, dtype=_U)
+    r = np.zeros(x.shape, dtype=_U)
+    for s in (32, 16, 8, 4, 2, 1):
+        big = x >= (_U(1) << _U(s))
+        x = np.where(big, x >> _U(s), x)
+        r = r + np.where(big, _U(s), _U(0))
+    return r
+
+
+def mac32(a_bits, b_bits, c_bits):
+    """
+    MAC32_top: Result = A + B * C on IEEE-754 bit patterns.
+    a_bits, b_bits, c_bits: broadcastable integer arrays of uint32 words.
+    Returns the uint32 result words (as uint64).
+    """
+    A = np.asarray(a_bits, dtype=_U)
+    B = np.asarray(b_bits, dtype=_U)
+    C = np.asarray(c_bits, dtype=_U)
+    m8, m10, m23 = _m(8), _m(10), _m(PARM_MANT)
+    one = _U(1)
+
+    def fields(X):
+        exp = (X >> _U(PARM_MANT)) & m8
+        mant = X & m23
+        lead = (exp != 0).astype(_U)
+        exp_full = exp == 255
+        mant_zero = mant == 0
+        zero = ((lead == 0) & mant_zero).astype(_U)
+        inf = (exp_full & mant_zero).astype(_U)
+        nan = (exp_full & ~mant_zero).astype(_U)
+        den = ((lead == 0) & ~mant_zero).astype(_U)
+        return (X >> _U(31)) & one, exp, np.where(den == 1, one, exp), (lead << _U(PARM_MANT)) | mant, zero, inf, nan, den
+
+    A_Sign, A_Exp_raw, A_Exp, A_Mant, A_Zero, A_Inf, A_NaN, A_DeN = fields(A)
+    B_Sign, _, B_Exp, B_Mant, B_Zero, B_Inf, B_NaN, _ = fields(B)
+    C_Sign, _, C_Exp, C_Mant, C_Zero, C_Inf, C_NaN, _ = fields(C)
+    Sub_Sign = A_Sign ^ B_Sign ^ C_Sign
+
+    # Product in carry-save form
+    W_sum, W_carry, W_suppr = _wallace(_booth_pp(B_Mant, C_Mant))
+
+    # Exponent movement (10-bit two's complement)
+    Exp_mv = (_U(27) - A_Exp + B_Exp + C_Exp - _U(PARM_BIAS)) & m10
+    Exp_mv_sign = _bit(Exp_mv, 9)
+    Mv_halt = (((Exp_mv_sign == 0) & ((Exp_mv & _m(9)) > 73)) | (A_Zero == 1)).astype(_U)
+
+    # --- PreNormalizer ---
+    shift = np.where(Mv_halt == 1, _U(0), Exp_mv)
+    # {A_Mant, 74'd0} >> shift, split into A_Mant_aligned (74 bits) and Drop_bits (24 bits)
+    al_hi, al_lo = _w_shr(*_w_shl(_U(0) * A_Mant, A_Mant, 50), shift)
+    _, dr_lo = _w_shr(*_w_shl(_U(0) * A_Mant, A_Mant, 74), shift)
+    Drop_bits = dr_lo & _m(PARM_MANT + 1)
+
+    Sign_aligned = np.where(Exp_mv_sign == 1, A_Sign, B_Sign ^ C_Sign)
+    Exp_aligned = np.where(Exp_mv_sign == 1, A_Exp, (B_Exp + C_Exp - _U(PARM_BIAS) + _U(27)) & m10)
+
+    # A_Mant_aligned_o (75 bits)
+    sh50_hi, sh50_lo = _w_shl(_U(0) * A_Mant, A_Mant, 50)
+    inv_hi = np.where(Sub_Sign == 1, ~al_hi, al_hi) & _m(10)
+    inv_lo = np.where(Sub_Sign == 1, ~al_lo, al_lo)
+    inv_hi = inv_hi | (Sub_Sign << _U(10))
+    Aal_hi = np.where(Exp_mv_sign == 1, sh50_hi, np.where(Mv_halt == 0, inv_hi, _U(0)))
+    Aal_lo = np.where(Exp_mv_sign == 1, sh50_lo, np.where(Mv_halt == 0, inv_lo, _U(0)))
+    A_high = _w_bits(Aal_hi, Aal_lo, 74, 48)  # 27 bits
+    A_low = _w_bits(Aal_hi, Aal_lo, 47, 0)    # 48 bits
+
+    # Mant_sticky_sht_out_o: |(~x + 1) over 24 bits is just |x, in both branches
+    Mant_sticky_sht_out = np.where(Mv_halt == 1, A_Mant != 0, Drop_bits != 0).astype(_U)
+
+    # --- CSA + end-around-carry adder ---
+    m48, m49 = _m(48), _m(49)
+    W_sum = np.where(Exp_mv_sign == 1, _U(0), W_sum)
+    W_carry = np.where(Exp_mv_sign == 1, _U(0), W_carry)
+    CSA_sum, CSA_carry = _csa(A_low, W_sum & m48, (W_carry << one) & m48)
+
+    wallace_msb_G = _bit(W_sum, 48) & _bit(W_carry, 47)
+    adder_Correlated_sign = W_suppr | _bit(W_carry, 48) | wallace_msb_G
+    Carry_postcor = (Exp_mv_sign ^ one) & ((adder_Correlated_sign ^ one) ^ _bit(CSA_carry, 47))
+
+    end_round_carry = Sub_Sign & (A_Zero ^ one)
+    carry_word = (Carry_postcor << _U(48)) | ((CSA_carry & _m(47)) << one) | end_round_carry
+    low = (CSA_sum + carry_word) & m49
+    low_sum, low_carry = low & m48, low >> _U(48)
+    low_inv = (_U(2) + ((one << _U(48)) | (~CSA_sum & m48)) + (~carry_word & m49)) & m49
+    low_sum_inv, low_carry_inv = low_inv & m48, low_inv >> _U(48)
+
+    # --- MSBIncrementer (27 bits) ---
+    m27 = _m(27)
+    high_sum = np.where(low_carry == 1, A_high + one, A_high) & m27
+    high_sum_inv = np.where(low_carry_inv == 1, ~A_high, ~A_high - one) & m27
+
+    bc_not_strange = (B_Inf | C_Inf | B_Zero | C_Zero | B_NaN | C_NaN) ^ one
+    sub_minus_top = (((A_high & _m(26)) << one) - bc_not_strange) & m27
+    SignFlip = _bit(high_sum, 26)
+    Adder_sign = np.where(Exp_mv_sign == 1, Sign_aligned, SignFlip ^ Sign_aligned)
+
+    # --- PosSum (74 bits) ---
+    ps_halt = (_U(0) * low_sum, low_sum)
+    ps_minus = _w_concat(sub_minus_top, _U(0) * low_sum, 47)
+    ps_plain = _w_concat(A_high & _m(26), _U(0) * low_sum, 48)
+    ps_flip = _w_concat(high_sum_inv & _m(26), low_sum_inv, 48)
+    ps_norm = _w_concat(high_sum & _m(26), low_sum, 48)
+    ps_msign = tuple(np.where(Sub_Sign == 1, m, p) for m, p in zip(ps_minus, ps_plain))
+    ps_add = tuple(np.where(SignFlip == 1, f, n) for f, n in zip(ps_flip, ps_norm))
+    PosSum = tuple(np.where(Mv_halt == 1, h, np.where(Exp_mv_sign == 1, s, a))
+                   for h, s, a in zip(ps_halt, ps_msign, ps_add))
+    PosSum = _w_mask(*PosSum, 74)
+
+    Minus_sticky_bit = Exp_mv_sign & bc_not_strange
+
+    shift_num, allzero = _leading_one(*PosSum)
+
+    # --- Normalizer ---
+    Exp_i = Exp_aligned
+    Shift_num = np.where((Exp_mv_sign == 1) | (_w_bits(*PosSum, 73, 73) == 1), _U(0), shift_num)
+    exp_neg = _bit(Exp_i, 9) == 1
+    exp_gt = Exp_i > Shift_num
+    norm_amt = np.where(exp_neg, _U(0), np.where(exp_gt, Shift_num, ((Exp_i & _m(9)) - one) & _m(9)))
+    Mant_norm = _w_mask(*_w_shl(*PosSum, norm_amt), 74)
+    Exp_norm = np.where(exp_neg, _U(0), np.where(exp_gt, Exp_i - Shift_num, one)) & m10
+    Exp_norm_mone = (Exp_i - Shift_num - one) & m10
+    Exp_max_rs = ((Exp_i & _m(9)) + _U(74)) & m10
+    Rs_count = ((~Exp_i + one) + one) & m10
+    Rs_Mant = _w_mask(*_w_shr(*_w_shl(*PosSum, 2), Rs_count), 76)
+
+    # --- Rounder ---
+    def mn(msb, lsb):
+        return _w_bits(*Mant_norm, msb, lsb)
+
+    def rs(msb, lsb):
+        return _w_bits(*Rs_Mant, msb, lsb)
+
+    sticky_changed = np.where(_bit(Exp_norm, 9) == 1, rs(49, 2),
+                     np.where(Exp_norm == 0, mn(48, 1),
+                     np.where(mn(73, 73) == 1, mn(47, 0), (mn(46, 0) << one))))
+    Sticky_one = ((sticky_changed != 0) | (Mant_sticky_sht_out == 1) | (Minus_sticky_bit == 1)).astype(_U)
+
+    zero = _U(0) * A
+    # Each case: (condition, Mant_result_norm, Exp_result_norm, Mant_lower, Sign_result, Mant_sticky)
+    any_inf = (A_Inf | B_Inf | C_Inf) == 1
+    exp_n8 = Exp_norm & m8
+    cases = [
+        (any_inf, zero, _U(255) + zero, zero, np.where(A_Inf == 1, A_Sign, B_Sign ^ C_Sign), zero),
+        ((B_Zero | C_Zero) == 1, A_Mant, A_Exp_raw, zero, A_Sign, zero),
+        (Exp_mv_sign == 1, A_Mant, A_Exp_raw, zero, A_Sign, Sticky_one),
+        (allzero == 1, zero, zero, zero, Adder_sign, zero),
+        (exp_neg & (_bit(Exp_max_rs, 9) == 0), zero, zero, zero, Adder_sign, zero),
+        (exp_neg, rs(75, 52), zero, rs(51, 50), Adder_sign, Sticky_one),
+        ((exp_n8 == 255) & ((mn(73, 73) == 1) | (mn(73, 50) == 0)), zero, zero, zero, Adder_sign, zero),
+        (exp_n8 == 255, mn(71, 49), _U(254) + zero, mn(48, 47), Adder_sign, Sticky_one),
+        (_bit(Exp_norm, 8) == 1, zero, zero, zero, Adder_sign, zero),
+        (Exp_norm == 0, mn(73, 51), zero, mn(50, 49), Adder_sign, Sticky_one),
+        (Exp_norm == 1, mn(73, 50), mn(73, 73), mn(49, 48), Adder_sign, Sticky_one),
+        (mn(73, 73) == 0, mn(72, 49), Exp_norm_mone & m8, mn(48, 47), Adder_sign, Sticky_one),
+    ]
+    Mant_result_norm = mn(73, 50)
+    Exp_result_norm = exp_n8
+    Mant_lower = mn(49, 48)
+    Sign_result = Adder_sign
+    Mant_sticky = Sticky_one
+    for cond, mant, exp, lower, sign, sticky in reversed(cases):
+        Mant_result_norm = np.where(cond, mant, Mant_result_norm)
+        Exp_result_norm = np.where(cond, exp, Exp_result_norm)
+        Mant_lower = np.where(cond, lower, Mant_lower)
+        Sign_result = np.where(cond, sign, Sign_result)
+        Mant_sticky = np.where(cond, sticky, Mant_sticky)
+
+    GRS = ((Mant_lower != 0) | (Mant_sticky == 1)).astype(_U)
+    Mant_roundup = GRS & (Adder_sign ^ one)  # round toward +inf
+    upper = (Mant_result_norm + Mant_roundup) & _m(PARM_MANT + 2)
+    renorm = _bit(upper, PARM_MANT + 1)
+    Mant_result = np.where(renorm == 1, (upper >> one) & m23, upper & m23)
+    Exp_result = (Exp_result_norm + renorm) & m8
+
+    return (Sign_result << _U(31)) | (Exp_result << _U(PARM_MANT)) | Mant_result
+
+
+def matrix_mul_bits(A_bits, B_bits):
+    """
+    MatrixMulEngine on IEEE-754 words: A_bits (..., M, K), B_bits (..., K, N)
+    -> C_bits (..., M, N); leading dimensions broadcast, so many independent
+    products can run in one pass.
+    Each DotProductEngine pass starts from acc = +0.0 and feeds
+    acc = MAC32(acc, A[row, k], B[k, col]) for k = 0 .. K-1; all
+    accumulators advance together.
+    """
+    A_bits = np.asarray(A_bits, dtype=_U)
+    B_bits = np.asarray(B_bits, dtype=_U)
+    K = A_bits.shape[-1]
+    if K != B_bits.shape[-2]:
+        raise ValueError(f"Matrix shape mismatch: A is {A_bits.shape}, B is {B_bits.shape} (K != K2)")
+
+    shape = np.broadcast_shapes(A_bits.shape[:-2], B_bits.shape[:-2]) + (A_bits.shape[-2], B_bits.shape[-1])
+    acc = np.zeros(shape, dtype=_U)
+    for k in range(K):
+        acc = mac32(acc, A_bits[..., :, k:k + 1], B_bits[..., k:k + 1, :])
+    return acc
+
+
+def matrix_mul_emulated(A, B):
+    """
+    A: (M, K), B: (K, N) -> float32 (M, N), bit-identical to MatrixMul_top's C.
+    Operands are rounded to float32 as the wrappers do before sending them.
+    """
+    A_bits = np.ascontiguousarray(A, dtype=np.float32).view(np.uint32)
+    B_bits = np.ascontiguousarray(B, dtype=np.float32).view(np.uint32)
+    C_bits = matrix_mul_bits(A_bits, B_bits).astype(np.uint32)
+    return C_bits.view(np.float32)
+
+
+def matrix_mul_tiled_emulated(A, B, **limits):
+    """
+    A: (M, K), B: (K, N) -> (M, N), bit-identical to the hw backend, i.e.
+    tiled_matmul.matrix_mul_tiled over MatrixMul_top with the K-split partial
+    sums added on the host in float64.
+
+    All tiles run in one batched pass. Operands are zero-padded to whole
+    tiles; a zero product leaves the MAC accumulator unchanged, so the
+    padding does not alter any real output. limits: max_m/max_k/max_n/max_words.
+    Returns float32 for every shape (the float64 tile sums are rounded once).
+    """
+    M, K = A.shape
+    K2, N = B.shape
+    if K != K2:
+        raise ValueError(f"Matrix shape mismatch: A is {A.shape}, B is {B.shape} (K != K2)")
+    tm, tk, tn = plan_tiles(M, K, N, **limits)
+    if (tm, tk, tn) == (M, K, N):
+        return matrix_mul_emulated(A, B)
+
+    Mt, Kt, Nt = -(-M // tm), -(-K // tk), -(-N // tn)
+    A_pad = np.zeros((Mt * tm, Kt * tk), dtype=np.float32)
+    B_pad = np.zeros((Kt * tk, Nt * tn), dtype=np.float32)
+    A_pad[:M, :K] = A
+    B_pad[:K, :N] = B
+
+    # A tiles: (Mt, Kt, 1, tm, tk), B tiles: (1, Kt, Nt, tk, tn)
+    A_tiles = A_pad.view(np.uint32).reshape(Mt, tm, Kt, tk).transpose(0, 2, 1, 3)[:, :, None]
+    B_tiles = B_pad.view(np.uint32).reshape(Kt, tk, Nt, tn).transpose(0, 2, 1, 3)[None]
+    partial = matrix_mul_bits(A_tiles, B_tiles).astype(np.uint32).view(np.float32)
+
+    # Host accumulation in k order, as matrix_mul_tiled does
+    C = np.zeros((Mt, Nt, tm, tn))
+    for k in range(Kt):
+        C += partial[:, k]
+    return C.transpose(0, 2, 1, 3).reshape(Mt * tm, Nt * tn)[:M, :N].astype(np.float32)
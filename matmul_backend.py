@@ -0,0 +1,144 @@
+import os
+from contextlib import contextmanager
+import numpy as np
+import layer_profiler
+
+# Name of the env var that picks the process-wide default backend
+BACKEND_ENV_VAR = "MATMUL_BACKEND"
+DEFAULT_BACKEND = "numpy"
+
+_backends = {}
+# Backends whose fn also takes out= and writes C into it directly
+_out_backends = set()
+_global_backend = None
+_backend_stack = []
+
+
+def register_backend(name, fn, supports_out=False):
+    """
+    Registers fn(A, B) -> C under name.
+    A: (M, K), B: (K, N), C: (M, N)
+    supports_out: fn also accepts fn(A, B, out=C) and fills C in place.
+    """
+    _backends[name] = fn
+    if supports_out:
+        _out_backends.add(fn)
+    else:
+        _out_backends.discard(fn)
+    return fn
+
+
+def available_backends():
+    return sorted(_backends)
+
+
+def set_backend(name):
+    """
+    Sets the global backend. None falls back to $MATMUL_BACKEND / numpy.
+    """
+    global _global_backend
+    if name is not None and name not in _backends:
+        raise ValueError(f"Unknown matmul backend '{name}'. Available: {available_backends()}")
+    _global_backend = name
+
+
+@contextmanager
+def use_backend(name):
+    """
+    with use_backend("hw"):
+        model.forward(x)   # every layer without its own backend runs on hw
+    """
+    if name not in _backends:
+        raise ValueError(f"Unknown matmul backend '{name}'. Available: {available_backends()}")
+    _backend_stack.append(name)
+    try:
+        yield
+    finally:
+        _backend_stack.pop()
+
+
+def current_backend():
+    """
+    Backend used when neither the call nor the layer picks one.
+    Precedence: use_backend() > set_backend() > $MATMUL_BACKEND > numpy
+    """
+    if _backend_stack:
+        return _backend_stack[-1]
+    if _global_backend is not None:
+        return _global_backend
+    return os.environ.get(BACKEND_ENV_VAR, DEFAULT_BACKEND)
+
+
+def get_backend(name=None):
+    if name is None:
+        name = current_backend()
+    try:
+        return _backends[name]
+    except KeyError:
+        raise ValueError(f"Unknown matmul backend '{name}'. Available: {available_backends()}") from None
+
+
+def matmul(A, B, backend=None, out=None):
+    """
+    A: (M, K), B: (K, N) -> (M, N) using the selected backend.
+    backend: per-call override; layers pass their own backend here.
+    out: optional preallocated (M, N) array to write C into (returned).
+    The result has the operands' dtype whatever the backend computed in
+    (the hardware paths produce float32 words and accumulate tiles in float64).
+    """
+    if layer_profiler.active() is None:
+        return _matmul(A, B, backend, out)
+    name = backend if backend is not None else current_backend()
+    M, K = A.shape
+    with layer_profiler.span("matmul", "matmul", backend=name, shape=[M, K, B.shape[1]],
+                             flops=2 * M * K * B.shape[1]):
+        return _matmul(A, B, backend, out)
+
+
+def _matmul(A, B, backend, out):
+    fn = get_backend(backend)
+    if out is None:
+        return np.asarray(fn(A, B), dtype=np.result_type(A, B))
+    if fn in _out_backends:
+        return fn(A, B, out=out)
+    np.copyto(out, fn(A, B))
+    return out
+
+
+def _matrix_mul_numpy(A, B, out=None):
+    return np.dot(A, B, out=out)
+
+
+def _matrix_mul_hw(A, B):
+    # Imported lazily so the software path never needs the cocotb flow.
+    # Tiled so shapes beyond MatrixMul_top's MAX_M/MAX_K/MAX_N still work.
+    from tiled_matmul import matrix_mul_tiled
+    from matrix_hw_wrapper import matrix_mul_hw
+    return matrix_mul_tiled(A, B, matrix_mul_hw)
+
+
+def _matrix_mul_hw_server(A, B):
+    # Same as hw, but every tile is streamed to one long-lived simulation
+    from tiled_matmul import matrix_mul_tiled
+    from matrix_hw_wrapper import matrix_mul_hw
+    return matrix_mul_tiled(A, B, lambda A, B: matrix_mul_hw(A, B, persistent=True))
+
+
+def _matrix_mul_hw_farm(A, B):
+    # Tiles simulated in parallel, one workdir per simulator ($MATMUL_FARM_WORKERS)
+    from sim_farm import default_farm
+    return default_farm().matmul(A, B)
+
+
+def _matrix_mul_emulated(A, B):
+    # Bit-exact model of the hw backend (tiled MatrixMul_top), no simulator;
+    # ~1 us per MAC, so ~15-20 s per image through SimpleCNN
+    from mac32_emulator import matrix_mul_tiled_emulated
+    return matrix_mul_tiled_emulated(A, B)
+
+
+register_backend("numpy", _matrix_mul_numpy, supports_out=True)
+register_backend("hw", _matrix_mul_hw)
+register_backend("hw_server", _matrix_mul_hw_server)
+register_backend("hw_farm", _matrix_mul_hw_farm)
+register_backend("emulator", _matrix_mul_emulated)
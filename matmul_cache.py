@@ -0,0 +1,189 @@
+import glob
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# Setting this env var turns on the shared cache for matrix_mul_hw
+CACHE_DIR_ENV_VAR = "MATMUL_HW_CACHE_DIR"
+RTL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "RTL")
+
+_rtl_digests = {}
+
+
+def rtl_digest(rtl_dir=RTL_DIR):
+    """
+    sha256 over every <rtl_dir>/*.v file, so editing the design invalidates old results.
+    Computed once per process for each directory.
+    """
+    rtl_dir = os.path.realpath(rtl_dir)
+    if rtl_dir not in _rtl_digests:
+        h = hashlib.sha256()
+        for path in sorted(glob.glob(os.path.join(rtl_dir, "*.v"))):
+            h.update(os.path.basename(path).encode())
+            with open(path, "rb") as f:
+                h.update(f.read())
+        _rtl_digests[rtl_dir] = h.hexdigest()
+    return _rtl_digests[rtl_dir]
+
+
+def matmul_key(A, B):
+    """
+    Content hash of one hardware matmul. Operands are hashed as the float32
+    words the hardware actually sees, together with the shapes and the RTL.
+    """
+    h = hashlib.sha256()
+    h.update(f"{A.shape}x{B.shape}".encode())
+    h.update(np.ascontiguousarray(A, dtype='<f4').tobytes())
+    h.update(np.ascontiguousarray(B, dtype='<f4').tobytes())
+    h.update(rtl_digest().encode())
+    return h.hexdigest()
+
+
+class MatmulCache:
+    """
+    Two-tier cache of hardware matmul results keyed by matmul_key().
+
+    Memory tier: LRU of up to max_entries results.
+    Disk tier (optional): one .npy per key under directory, capped at
+    max_disk_bytes; least recently used files are evicted first.
+    Safe to share between threads (sim_farm workers); a key being computed
+    by two threads at once is simply simulated twice.
+    """
+
+    def __init__(self, directory=None, max_entries=256, max_disk_bytes=1 << 30):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        self._disk_bytes = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            self._disk_bytes = sum(os.path.getsize(p) for p in self._disk_files())
+
+    def _disk_files(self):
+        return glob.glob(os.path.join(self.directory, "*.npy"))
+
+    def _disk_path(self, key):
+        return os.path.join(self.directory, key + ".npy")
+
+    def _remember(self, key, C):
+        self._memory[key] = C
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            return self._get(key)
+
+    def _get(self, key):
+        C = self._memory.get(key)
+        if C is not None:
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return C.copy()
+
+        if self.directory is not None:
+            path = self._disk_path(key)
+            try:
+                C = np.load(path)
+            except (FileNotFoundError, ValueError, OSError):
+                C = None
+            if C is not None:
+                os.utime(path)  # mark as recently used for eviction
+                self._remember(key, C)
+                self.disk_hits += 1
+                return C.copy()
+
+        self.misses += 1
+        return None
+
+    def put(self, key, C):
+        with self._lock:
+            self._put(key, C)
+
+    def _put(self, key, C):
+        C = np.array(C)
+        self._remember(key, C)
+        if self.directory is None:
+            return
+
+        path = self._disk_path(key)
+        if os.path.exists(path):
+            return
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, C)
+        os.replace(tmp_path, path)
+        self._disk_bytes += os.path.getsize(path)
+        if self._disk_bytes > self.max_disk_bytes:
+            self._evict()
+
+    def _evict(self):
+        entries = []
+        for path in self._disk_files():
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._disk_bytes = total
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self.directory is not None:
+                for path in self._disk_files():
+                    os.remove(path)
+                self._disk_bytes = 0
+
+    def matmul(self, A, B, matmul_fn):
+        """
+        Returns the cached C for (A, B), or computes it with matmul_fn and stores it.
+        """
+        key = matmul_key(A, B)
+        C = self.get(key)
+        if C is None:
+            C = matmul_fn(A, B)
+            self.put(key, C)
+        return C
+
+
+_default_cache = None
+
+
+def set_default_cache(cache):
+    """
+    Installs the cache used by matrix_mul_hw when none is passed (None disables it).
+    """
+    global _default_cache
+    _default_cache = cache
+
+
+def default_cache():
+    """
+    The cache installed with set_default_cache(), else one rooted at
+    $MATMUL_HW_CACHE_DIR if that is set, else None (caching off).
+    """
+    global _default_cache
+    if _default_cache is None and os.environ.get(CACHE_DIR_ENV_VAR):
+        _default_cache = MatmulCache(os.environ[CACHE_DIR_ENV_VAR])
+    return _default_cache
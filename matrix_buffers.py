@@ -0,0 +1,131 @@
+import os
+import numpy as np
+
+# Exchange files between the Python wrappers and the cocotb testbenches.
+#
+# "bin" (default): a little-endian uint32 header followed by raw IEEE-754
+#   float32 words, so both sides read a whole matrix as one array view and
+#   the testbench gets the bit patterns to drive without per-element packing.
+#     input_buffer.bin : magic, M, K, N, A[M*K], B[K*N]
+#     output_buffer.bin: magic, M, N, C[M*N]
+# "text": the original human-readable input_buffer.txt / output_buffer.txt,
+#   kept for debugging.
+FORMAT_ENV_VAR = "MATMUL_BUFFER_FORMAT"
+FORMATS = ("bin", "text")
+
+INPUT_FILES = {"bin": "input_buffer.bin", "text": "input_buffer.txt"}
+OUTPUT_FILES = {"bin": "output_buffer.bin", "text": "output_buffer.txt"}
+
+INPUT_MAGIC = 0x4D4D4941   # "AIMM"
+OUTPUT_MAGIC = 0x4D4D4943  # "CIMM"
+_WORD = np.dtype('<u4')
+_FLOAT = np.dtype('<f4')
+
+
+def buffer_format(fmt=None):
+    """
+    Resolves fmt, falling back to $MATMUL_BUFFER_FORMAT and then "text"
+    (so a bare `make` still picks up a hand-written input_buffer.txt).
+    """
+    if fmt is None:
+        fmt = os.environ.get(FORMAT_ENV_VAR, "text")
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown buffer format '{fmt}'. Use one of {FORMATS}")
+    return fmt
+
+
+def input_path(fmt=None, workdir="."):
+    return os.path.join(workdir, INPUT_FILES[buffer_format(fmt)])
+
+
+def output_path(fmt=None, workdir="."):
+    return os.path.join(workdir, OUTPUT_FILES[buffer_format(fmt)])
+
+
+def write_input(A, B, fmt=None, workdir="."):
+    """
+    A: (M, K), B: (K, N). Host side, written before the simulation starts.
+    """
+    fmt = buffer_format(fmt)
+    M, K = A.shape
+    N = B.shape[1]
+    path = input_path(fmt, workdir)
+    if fmt == "text":
+        with open(path, "w") as f:
+            f.write(f"M {M}\n")
+            f.write(f"K {K}\n")
+            f.write(f"N {N}\n")
+            f.write("A " + " ".join(map(str, A.flatten())) + "\n")
+            f.write("B " + " ".join(map(str, B.flatten())) + "\n")
+        return path
+
+    with open(path, "wb") as f:
+        np.array([INPUT_MAGIC, M, K, N], dtype=_WORD).tofile(f)
+        np.ascontiguousarray(A, dtype=_FLOAT).tofile(f)
+        np.ascontiguousarray(B, dtype=_FLOAT).tofile(f)
+    return path
+
+
+def read_input_bits(fmt=None, workdir="."):
+    """
+    Testbench side. Returns (M, K, N, A_bits, B_bits) where A_bits/B_bits are
+    flat uint32 arrays holding the IEEE-754 encoding of each element.
+    """
+    fmt = buffer_format(fmt)
+    path = input_path(fmt, workdir)
+    if fmt == "text":
+        with open(path, "r") as f:
+            lines = f.readlines()
+        M = int(lines[0].split()[1])
+        K = int(lines[1].split()[1])
+        N = int(lines[2].split()[1])
+        A = np.array(lines[3].split()[1:], dtype=np.float64).astype(_FLOAT)
+        B = np.array(lines[4].split()[1:], dtype=np.float64).astype(_FLOAT)
+        return M, K, N, A.view(_WORD), B.view(_WORD)
+
+    words = np.memmap(path, dtype=_WORD, mode="r")
+    magic, M, K, N = (int(w) for w in words[:4])
+    if magic != INPUT_MAGIC:
+        raise ValueError(f"{path} is not a matmul input buffer (magic 0x{magic:08X})")
+    A_bits = words[4:4 + M * K]
+    B_bits = words[4 + M * K:4 + M * K + K * N]
+    return M, K, N, A_bits, B_bits
+
+
+def write_output_bits(C_bits, M, N, fmt=None, workdir="."):
+    """
+    Testbench side. C_bits: M*N uint32 IEEE-754 words in row-major order.
+    """
+    fmt = buffer_format(fmt)
+    C_bits = np.asarray(C_bits, dtype=_WORD)
+    path = output_path(fmt, workdir)
+    if fmt == "text":
+        with open(path, "w") as f:
+            f.write("C " + " ".join(map(str, C_bits.view(_FLOAT).tolist())) + "\n")
+        return path
+
+    with open(path, "wb") as f:
+        np.array([OUTPUT_MAGIC, M, N], dtype=_WORD).tofile(f)
+        C_bits.tofile(f)
+    return path
+
+
+def read_output(M, N, fmt=None, workdir="."):
+    """
+    Host side. Returns C as a float32 (M, N) array, exactly the words the
+    hardware produced.
+    """
+    fmt = buffer_format(fmt)
+    path = output_path(fmt, workdir)
+    if fmt == "text":
+        with open(path, "r") as f:
+            line = f.readline()
+            assert line.startswith("C ")
+            values = list(map(float, line.strip().split()[1:]))
+        return np.array(values, dtype=np.float32).reshape(M, N)
+
+    words = np.fromfile(path, dtype=_WORD)
+    magic, out_m, out_n = (int(w) for w in words[:3])
+    if magic != OUTPUT_MAGIC or (out_m, out_n) != (M, N):
+        raise ValueError(f"{path} does not hold a {M}x{N} matmul result")
+    return words[3:3 + M * N].view(_FLOAT).astype(np.float32).reshape(M, N)
@@ -1,12 +1,68 @@
 import numpy as np
 import subprocess
-import time
 import os
+from matrix_buffers import FORMAT_ENV_VAR, write_input, output_path, read_output
+from matmul_cache import default_cache
+from layer_profiler import span
 
-def matrix_mul_hw(A, B):
+# The cocotb Makefile; run with -f from a job's workdir, so exchange files
+# and sim_build live there instead of in the repo
+MAKEFILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Makefile")
+
+# Limits of MatrixMul_top as built (RTL/MatrixMul_top.v parameters)
+HW_MAX_M = 784
+HW_MAX_K = 288
+HW_MAX_N = 64
+# spi_matrix_loader counts words in a 16-bit register (and C_size is 16-bit),
+# so a single A, B or C transfer must fit in 2**16 words
+HW_MAX_WORDS = 1 << 16
+
+# How the cocotb testbenches move data in and out of MatrixMul_top:
+#   "protocol"   (default) A and B over SPI through spi_matrix_loader, C back
+#                over SPI through spi_matrix_sender
+#   "functional" A and B written straight into the loader's memories and C
+#                read straight out of the engine's (backdoor), so only the
+#                MAC datapath is simulated; same numerics, no SPI time
+FIDELITY_ENV_VAR = "MATMUL_HW_FIDELITY"
+FIDELITIES = ("protocol", "functional")
+
+def hw_fidelity(fidelity=None):
+    """
+    Resolves fidelity, falling back to $MATMUL_HW_FIDELITY and then "protocol".
+    """
+    if fidelity is None:
+        fidelity = os.environ.get(FIDELITY_ENV_VAR, "protocol")
+    if fidelity not in FIDELITIES:
+        raise ValueError(f"Unknown hardware fidelity '{fidelity}'. Use one of {FIDELITIES}")
+    return fidelity
+
+def check_hw_shape(M, K, N):
+    """
+    Raises ValueError if an (M, K) x (K, N) product does not fit MatrixMul_top.
+    The 12-bit rows/cols fields of the SPI header are covered by the MAX_* limits.
+    """
+    if M > HW_MAX_M or K > HW_MAX_K or N > HW_MAX_N:
+        raise ValueError(f"Matmul ({M}x{K}) x ({K}x{N}) exceeds hardware limits "
+                         f"MAX_M={HW_MAX_M}, MAX_K={HW_MAX_K}, MAX_N={HW_MAX_N}; use tiled_matmul")
+    if max(M * K, K * N, M * N) > HW_MAX_WORDS:
+        raise ValueError(f"Matmul ({M}x{K}) x ({K}x{N}) has a matrix larger than "
+                         f"{HW_MAX_WORDS} words; use tiled_matmul")
+
+def matrix_mul_hw(A, B, persistent=False, fmt="bin", cache=None, fidelity=None, workdir="."):
     """
     A: numpy array of shape (M, K)
     B: numpy array of shape (K, N)
+    persistent: stream the job to the shared long-lived simulation
+                (matrix_sim_server) instead of running make for this call
+    fmt: "bin" raw float32 exchange files, or "text" for debugging
+    cache: MatmulCache to consult first; None uses matmul_cache.default_cache()
+           ($MATMUL_HW_CACHE_DIR), False bypasses caching
+    fidelity: "protocol" (full SPI transfers) or "functional" (backdoor
+              loads, MAC datapath only); None uses $MATMUL_HW_FIDELITY.
+              Both give the same C, so they share cache entries.
+    workdir: directory for the exchange files, make.log and sim_build (or
+             the persistent server run from there); simulations in different
+             workdirs can run concurrently (see sim_farm)
     Returns: numpy array of shape (M, N)
     """
     M, K = A.shape
@@ -14,28 +70,58 @@ def matrix_mul_hw(A, B):
 
     if K != K2:
         raise ValueError(f"Matrix shape mismatch: A is {A.shape}, B is {B.shape} (K != K2)")
+    check_hw_shape(M, K, N)
+    fidelity = hw_fidelity(fidelity)
+
+    if cache is None:
+        cache = default_cache()
+    if cache:
+        return cache.matmul(A, B, lambda A, B: _run_hw(A, B, persistent, fmt, fidelity, workdir))
+    return _run_hw(A, B, persistent, fmt, fidelity, workdir)
+
+def _run_hw(A, B, persistent, fmt, fidelity="protocol", workdir="."):
+    """
+    One simulated matmul, no caching. Shapes are already validated.
+    Timed as an "hw" span so profiles separate simulation from host work.
+    """
+    with span("hw_sim", "hw", shape=[A.shape[0], A.shape[1], B.shape[1]], persistent=persistent,
+              fidelity=fidelity):
+        return _simulate(A, B, persistent, fmt, fidelity, workdir)
+
+def _simulate(A, B, persistent, fmt, fidelity, workdir):
+    M, N = A.shape[0], B.shape[1]
+
+    if persistent:
+        from matrix_sim_server import get_server
+        return get_server(workdir).matmul(A, B, fidelity)
+
+    os.makedirs(workdir, exist_ok=True)
+    # A result left over from an earlier run must never be read back as this one's
+    out_path = output_path(fmt, workdir)
+    if os.path.exists(out_path):
+        os.remove(out_path)
 
-    # Flatten data and write to input_buffer.txt
-    with open("input_buffer.txt", "w") as f:
-        f.write(f"M {M}\n")
-        f.write(f"K {K}\n")
-        f.write(f"N {N}\n")
-        f.write("A " + " ".join(map(str, A.flatten())) + "\n")
-        f.write("B " + " ".join(map(str, B.flatten())) + "\n")
+    # Write A and B to the input buffer (input_buffer.bin / .txt)
+    write_input(A, B, fmt, workdir)
 
-    # Run cocotb testbench via Makefile
-    make_cmd = ["make"]
-    subprocess.run(make_cmd, check=True)
+    # Run cocotb testbench via Makefile; make returns once the testbench has
+    # written the output buffer
+    make_cmd = ["make", "-f", MAKEFILE]
+    env = dict(os.environ, **{FORMAT_ENV_VAR: fmt, FIDELITY_ENV_VAR: fidelity})
+    if os.path.abspath(workdir) == os.getcwd():
+        subprocess.run(make_cmd, check=True, env=env)
+    else:
+        # Side-by-side jobs would interleave their output; keep it with the job
+        log_path = os.path.join(workdir, "make.log")
+        with open(log_path, "w") as log:
+            result = subprocess.run(make_cmd, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+        if result.returncode != 0:
+            raise RuntimeError(f"❌ Cocotb simulation failed; see '{log_path}'.")
 
-    # Wait for output_buffer.txt
-    while not os.path.exists("output_buffer.txt"):
-        time.sleep(0.1)
+    if not os.path.exists(out_path):
+        raise RuntimeError(f"❌ Simulation finished without writing '{out_path}'.")
 
     # Read result matrix C
-    with open("output_buffer.txt", "r") as f:
-        line = f.readline()
-        assert line.startswith("C ")
-        values = list(map(float, line.strip().split()[1:]))
-        C = np.array(values).reshape(M, N)
+    C = read_output(M, N, fmt, workdir)
 
     return C
@@ -2,7 +2,8 @@ import numpy as np
 import struct
 import subprocess
 import os
-import time
+from matrix_buffers import FORMAT_ENV_VAR, write_input, output_path, read_output
+from matrix_hw_wrapper import MAKEFILE, FIDELITY_ENV_VAR, hw_fidelity
 
 def float_to_hex(f):
     return struct.unpack('<I', struct.pack('<f', f))[0]
@@ -10,43 +11,48 @@ def float_to_hex(f):
 def hex_to_float(h):
     return struct.unpack('<f', struct.pack('<I', h))[0]
 
-def matrix_mul_hw(A: np.ndarray, B: np.ndarray) -> np.ndarray:
+def matrix_mul_hw(A: np.ndarray, B: np.ndarray, persistent: bool = False, fmt: str = "bin",
+                  fidelity: str = None) -> np.ndarray:
     """
     Calls cocotb to perform matrix multiplication in Verilog via SPI.
+    With persistent=True the job goes to the shared long-lived simulation
+    (matrix_sim_server) instead of launching make.
+    fmt selects the exchange files: "bin" (raw float32) or "text" for debugging.
+    fidelity: "protocol" or "functional"; None uses $MATMUL_HW_FIDELITY
+    (see matrix_hw_wrapper.hw_fidelity).
     Returns the resulting matrix C.
     """
     assert A.shape[1] == B.shape[0], "Matrix multiplication not valid: A.cols != B.rows"
     M, K = A.shape
     K2, N = B.shape
     assert K == K2
+    fidelity = hw_fidelity(fidelity)
 
-    # Flatten data and write to input_buffer.txt
-    with open("input_buffer.txt", "w") as f:
-        f.write(f"M {M}\n")
-        f.write(f"K {K}\n")
-        f.write(f"N {N}\n")
-        f.write("A " + " ".join(map(str, A.flatten())) + "\n")
-        f.write("B " + " ".join(map(str, B.flatten())) + "\n")
+    if persistent:
+        from matrix_sim_server import get_server
+        return get_server().matmul(A, B, fidelity)
 
-    # Run cocotb (make sure you're in correct directory)
+    # Drop any result left by an earlier run before starting this one
+    if os.path.exists(output_path(fmt)):
+        os.remove(output_path(fmt))
+
+    # Write A and B to the input buffer (input_buffer.bin / .txt)
+    write_input(A, B, fmt)
+
+    # Run cocotb (the Makefile finds the RTL relative to itself)
     print("🔧 Launching cocotb testbench via make...")
-    result = subprocess.run(["make"], capture_output=True, text=True)
+    result = subprocess.run(["make", "-f", MAKEFILE], capture_output=True, text=True,
+                            env=dict(os.environ, **{FORMAT_ENV_VAR: fmt, FIDELITY_ENV_VAR: fidelity}))
     # print(result.stdout)
     if result.returncode != 0:
         print(result.stderr)
         raise RuntimeError("❌ Cocotb simulation failed.")
 
     # Read output matrix
-
-    # Wait for output_buffer.txt
-    while not os.path.exists("output_buffer.txt"):
-        time.sleep(0.1)
+    if not os.path.exists(output_path(fmt)):
+        raise RuntimeError("❌ Cocotb simulation did not write the output buffer.")
 
     # Read result matrix C
-    with open("output_buffer.txt", "r") as f:
-        line = f.readline()
-        assert line.startswith("C ")
-        values = list(map(float, line.strip().split()[1:]))
-        C = np.array(values).reshape(M, N)
+    C = read_output(M, N, fmt)
 
     return C
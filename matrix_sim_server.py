@@ -0,0 +1,224 @@
+import atexit
+import os
+import shutil
+import socket
+import struct
+import subprocess
+import tempfile
+import threading
+import time
+import numpy as np
+from matrix_hw_wrapper import MAKEFILE, check_hw_shape, hw_fidelity
+
+# cocotb module that loops on jobs instead of running one matmul and exiting
+SERVER_MODULE = "test_matrix_mul_server"
+# The cocotb test connects back to the Unix socket named by this env var
+SOCKET_ENV_VAR = "MATMUL_SERVER_SOCKET"
+
+# Wire format (little-endian): a 16-byte header of uint32 (opcode, M, K, N),
+# then A (M*K) and B (K*N) as raw float32. The reply is C (M*N) as float32.
+# The matmul opcode carries the job's fidelity (see matrix_hw_wrapper).
+OP_SHUTDOWN = 0
+OP_MATMUL = 1
+OP_MATMUL_FUNCTIONAL = 2
+_FIDELITY_OPS = {"protocol": OP_MATMUL, "functional": OP_MATMUL_FUNCTIONAL}
+_HEADER = struct.Struct("<4I")
+
+
+def recv_exact(sock, size):
+    buf = bytearray(size)
+    view = memoryview(buf)
+    got = 0
+    while got < size:
+        n = sock.recv_into(view[got:])
+        if n == 0:
+            raise ConnectionError("Simulation server connection closed")
+        got += n
+    return bytes(buf)
+
+
+def send_job(sock, A, B, fidelity="protocol"):
+    M, K = A.shape
+    N = B.shape[1]
+    sock.sendall(_HEADER.pack(_FIDELITY_OPS[fidelity], M, K, N))
+    sock.sendall(np.ascontiguousarray(A, dtype='<f4').tobytes())
+    sock.sendall(np.ascontiguousarray(B, dtype='<f4').tobytes())
+
+
+def recv_job(sock):
+    """
+    Returns (M, K, N, A_bits, B_bits, fidelity) with A/B as flat uint32
+    IEEE-754 words, or None on shutdown.
+    """
+    op, M, K, N = _HEADER.unpack(recv_exact(sock, _HEADER.size))
+    if op == OP_SHUTDOWN:
+        return None
+    fidelity = "functional" if op == OP_MATMUL_FUNCTIONAL else "protocol"
+    A_bits = np.frombuffer(recv_exact(sock, 4 * M * K), dtype='<u4')
+    B_bits = np.frombuffer(recv_exact(sock, 4 * K * N), dtype='<u4')
+    return M, K, N, A_bits, B_bits, fidelity
+
+
+def send_result(sock, C_bits):
+    sock.sendall(np.asarray(C_bits, dtype='<u4').tobytes())
+
+
+def recv_result(sock, M, N):
+    C = np.frombuffer(recv_exact(sock, 4 * M * N), dtype='<f4')
+    return C.astype(np.float32).reshape(M, N)
+
+
+class MatrixMulServer:
+    """
+    Long-lived cocotb simulation of MatrixMul_top.
+
+    start() launches `make MODULE=test_matrix_mul_server` once; every
+    matmul() call then streams one job over a Unix socket and waits for C,
+    so the Icarus elaboration and cocotb startup are paid only once.
+    make runs in workdir, which holds the server's sim_build.
+    Calls are serialised (one job on the socket at a time). If the simulator
+    has died, the next start() or matmul() launches a new one.
+
+        with MatrixMulServer() as server:
+            C = server.matmul(A, B)
+    """
+
+    def __init__(self, workdir=".", startup_timeout=600.0):
+        self.workdir = workdir
+        self.startup_timeout = startup_timeout
+        self.proc = None
+        self.conn = None
+        self._listener = None
+        self._tmpdir = None
+        self.log_path = None
+        self._lock = threading.RLock()
+
+    def alive(self):
+        return self.proc is not None and self.proc.poll() is None
+
+    def start(self):
+        with self._lock:
+            if self.alive():
+                return self
+            # Clean up after a simulator that exited (crashed or was killed)
+            self.close()
+            return self._launch()
+
+    def _launch(self):
+        self._tmpdir = tempfile.mkdtemp(prefix="matmul_server_")
+        socket_path = os.path.join(self._tmpdir, "server.sock")
+        self.log_path = os.path.join(self._tmpdir, "make.log")
+
+        self._listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._listener.bind(socket_path)
+        self._listener.listen(1)
+        self._listener.settimeout(1.0)
+
+        env = os.environ.copy()
+        env[SOCKET_ENV_VAR] = socket_path
+        os.makedirs(self.workdir, exist_ok=True)
+        with open(self.log_path, "w") as log:
+            self.proc = subprocess.Popen(["make", "-f", MAKEFILE, f"MODULE={SERVER_MODULE}"], cwd=self.workdir,
+                                         env=env, stdout=log, stderr=subprocess.STDOUT)
+
+        deadline = time.time() + self.startup_timeout
+        while self.conn is None:
+            try:
+                self.conn, _ = self._listener.accept()
+            except socket.timeout:
+                if self.proc.poll() is not None:
+                    self._fail("❌ Simulation server exited before connecting.")
+                if time.time() > deadline:
+                    self._fail("❌ Timed out waiting for the simulation server.")
+        self.conn.settimeout(None)
+        return self
+
+    def _fail(self, message):
+        with open(self.log_path) as log:
+            print(log.read()[-4000:])
+        self.close()
+        raise RuntimeError(message)
+
+    def matmul(self, A, B, fidelity=None):
+        """
+        A: (M, K), B: (K, N) within the hardware limits -> C: (M, N)
+        fidelity: per job; None uses $MATMUL_HW_FIDELITY (see matrix_hw_wrapper)
+        """
+        M, K = A.shape
+        K2, N = B.shape
+        if K != K2:
+            raise ValueError(f"Matrix shape mismatch: A is {A.shape}, B is {B.shape} (K != K2)")
+        check_hw_shape(M, K, N)
+        fidelity = hw_fidelity(fidelity)
+
+        with self._lock:
+            self.start()
+            try:
+                send_job(self.conn, A, B, fidelity)
+                return recv_result(self.conn, M, N)
+            except OSError:
+                # ConnectionError/BrokenPipeError: the simulator died mid-job.
+                # Retry once on a fresh one; a second failure is raised.
+                self.close()
+                self.start()
+                send_job(self.conn, A, B, fidelity)
+                return recv_result(self.conn, M, N)
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def _close(self):
+        if self.conn is not None:
+            try:
+                self.conn.sendall(_HEADER.pack(OP_SHUTDOWN, 0, 0, 0))
+            except OSError:
+                pass
+            self.conn.close()
+            self.conn = None
+        if self.proc is not None:
+            try:
+                self.proc.wait(timeout=60)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+                self.proc.wait()
+            self.proc = None
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+        if self._tmpdir is not None:
+            shutil.rmtree(self._tmpdir, ignore_errors=True)
+            self._tmpdir = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# workdir (absolute) -> MatrixMulServer
+_servers = {}
+_servers_lock = threading.Lock()
+
+
+def get_server(workdir="."):
+    """
+    Shared server for workdir in this process, started on first use and
+    closed at exit. Servers in different workdirs run side by side; one
+    whose simulator has died is restarted.
+    """
+    key = os.path.abspath(workdir)
+    with _servers_lock:
+        server = _servers.get(key)
+        if server is None:
+            server = _servers[key] = MatrixMulServer(workdir)
+            atexit.register(server.close)
+    return server.start()
+
+
+def close_server(workdir="."):
+    with _servers_lock:
+        server = _servers.pop(os.path.abspath(workdir), None)
+    if server is not None:
+        server.close()
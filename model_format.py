@@ -0,0 +1,89 @@
+import json
+import os
+import struct
+import numpy as np
+
+# Versioned weight file that loads without copying.
+#
+#   magic      8 bytes  b"SCNNWTS\0"
+#   version    uint32 (little-endian)
+#   header_len uint32
+#   header     JSON: {"tensors": {name: {"dtype", "shape", "offset"}}, "metadata": {...}}
+#   data       raw little-endian C-order tensors, each starting at a multiple
+#              of ALIGNMENT bytes; offsets are from the start of the file
+#
+# load_weights() maps the whole file once and returns array views into it, so
+# nothing is read until a tensor is touched and processes loading the same
+# file share its pages through the OS page cache.
+MAGIC = b"SCNNWTS\0"
+VERSION = 1
+ALIGNMENT = 64
+_PREAMBLE = struct.Struct("<8sII")
+
+
+def _align(n):
+    return -(-n // ALIGNMENT) * ALIGNMENT
+
+
+def is_weights_file(path):
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def save_weights(path, tensors, metadata=None):
+    """
+    tensors: name -> array. Written atomically (temp file + rename).
+    """
+    tensors = {name: np.ascontiguousarray(arr) for name, arr in tensors.items()}
+    entries = {}
+    for name, arr in tensors.items():
+        entries[name] = {"dtype": arr.dtype.newbyteorder("<").str, "shape": list(arr.shape), "offset": 0}
+
+    # Offsets depend on the header length, which depends on the offsets'
+    # digits; iterate until the layout is stable
+    data_start = 0
+    while True:
+        offset = data_start
+        for name, arr in tensors.items():
+            entries[name]["offset"] = offset
+            offset = _align(offset + arr.nbytes)
+        header = json.dumps({"tensors": entries, "metadata": metadata or {}}).encode()
+        new_start = _align(_PREAMBLE.size + len(header))
+        if new_start == data_start:
+            break
+        data_start = new_start
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_PREAMBLE.pack(MAGIC, VERSION, len(header)))
+        f.write(header)
+        for name, arr in tensors.items():
+            f.seek(entries[name]["offset"])
+            f.write(arr.astype(arr.dtype.newbyteorder("<"), copy=False).tobytes())
+        f.truncate(offset)
+    os.replace(tmp_path, path)
+
+
+def load_weights(path, mode="c"):
+    """
+    Returns (tensors, metadata) with every tensor a view into one np.memmap.
+    mode: "c" (copy-on-write: writable, changes stay private to this
+    process) or "r" (read-only).
+    """
+    with open(path, "rb") as f:
+        magic, version, header_len = _PREAMBLE.unpack(f.read(_PREAMBLE.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a SimpleCNN weights file")
+        if version != VERSION:
+            raise ValueError(f"{path} has weights format version {version}, expected {VERSION}")
+        header = json.loads(f.read(header_len))
+
+    data = np.memmap(path, dtype=np.uint8, mode=mode)
+    tensors = {}
+    for name, entry in header["tensors"].items():
+        dtype = np.dtype(entry["dtype"])
+        shape = tuple(entry["shape"])
+        count = int(np.prod(shape))
+        offset = entry["offset"]
+        tensors[name] = data[offset:offset + count * dtype.itemsize].view(dtype).reshape(shape)
+    return tensors, header["metadata"]
@@ -0,0 +1,152 @@
+import multiprocessing as mp
+import os
+from multiprocessing import shared_memory
+import numpy as np
+from simple_cnn import SimpleCNN
+
+# Data-parallel mini-batch training for SimpleCNN.
+#
+# All weights live in one shared-memory block that the parent model and every
+# worker map directly, so nothing is copied per step. Each step the batch is
+# split into one shard per worker; a worker runs forward/backward on its shard
+# and writes its gradients into its own row of a second shared block. The
+# parent sums the rows and applies a single SGD update in place, which the
+# workers see on their next step.
+#
+#     with DataParallelTrainer(model, workers=4) as trainer:
+#         loss = trainer.step(x_batch, y_onehot, lr)
+
+# Per-worker worker-process state, set by _init_worker
+_worker = {}
+
+
+def _param_layout(params):
+    """
+    name -> (offset, shape) inside one flat buffer, plus its total size.
+    """
+    layout = {}
+    offset = 0
+    for name, arr in params.items():
+        layout[name] = (offset, arr.shape)
+        offset += arr.size
+    return layout, offset
+
+
+def _views(buf, layout):
+    return {name: buf[off:off + int(np.prod(shape))].reshape(shape)
+            for name, (off, shape) in layout.items()}
+
+
+def _init_worker(params_name, grads_name, layout, total, slots, dtype, spec, backend):
+    params_shm = shared_memory.SharedMemory(name=params_name)
+    grads_shm = shared_memory.SharedMemory(name=grads_name)
+    params = np.ndarray((total,), dtype=dtype, buffer=params_shm.buf)
+    grads = np.ndarray((slots, total), dtype=dtype, buffer=grads_shm.buf)
+
+    model = SimpleCNN(backend=backend, dtype=dtype, spec=spec)
+    model.set_params(_views(params, layout))
+    _worker.update(model=model, layout=layout, grads=grads, shms=(params_shm, grads_shm))
+
+
+def _worker_step(args):
+    """
+    Gradients of one shard, written to grads[slot]. Returns the shard's summed
+    cross-entropy and its number of correct predictions.
+    """
+    slot, x, y, batch_size = args
+    model = _worker["model"]
+    output = model.forward(x)
+    # Scaled by the full batch size so the shard gradients simply add up
+    model.backward((output - y) / batch_size)
+
+    grad_views = _views(_worker["grads"][slot], _worker["layout"])
+    for name, g in model.get_grads().items():
+        grad_views[name][...] = g
+
+    loss = -np.sum(y * np.log(output + 1e-8))
+    correct = int(np.sum(np.argmax(output, axis=1) == np.argmax(y, axis=1)))
+    return loss, correct
+
+
+class DataParallelTrainer:
+    """
+    Runs SGD steps for model across `workers` processes. The model's weights
+    are moved into shared memory on construction; call close() (or use a with
+    block) to release it, after which the model keeps private copies.
+
+    threads_per_worker sets OMP_NUM_THREADS for the workers so that
+    workers * threads does not oversubscribe the machine.
+    """
+
+    def __init__(self, model, workers=None, threads_per_worker=1, backend=None):
+        self.model = model
+        self.workers = workers or os.cpu_count()
+
+        params = model.get_params()
+        dtype = model.dtype
+        self.layout, self.total = _param_layout(params)
+        nbytes = dtype.itemsize * self.total
+        self._params_shm = shared_memory.SharedMemory(create=True, size=nbytes)
+        self._grads_shm = shared_memory.SharedMemory(create=True, size=nbytes * self.workers)
+        self.params = np.ndarray((self.total,), dtype=dtype, buffer=self._params_shm.buf)
+        self.grads = np.ndarray((self.workers, self.total), dtype=dtype, buffer=self._grads_shm.buf)
+
+        shared = _views(self.params, self.layout)
+        for name, arr in params.items():
+            shared[name][...] = arr
+        model.set_params(shared)
+
+        # Spawned workers import numpy fresh, so OMP_NUM_THREADS takes effect there
+        old_threads = os.environ.get("OMP_NUM_THREADS")
+        os.environ["OMP_NUM_THREADS"] = str(threads_per_worker)
+        try:
+            self.pool = mp.get_context("spawn").Pool(
+                self.workers, initializer=_init_worker,
+                initargs=(self._params_shm.name, self._grads_shm.name, self.layout,
+                          self.total, self.workers, dtype, model.spec, backend))
+        finally:
+            if old_threads is None:
+                del os.environ["OMP_NUM_THREADS"]
+            else:
+                os.environ["OMP_NUM_THREADS"] = old_threads
+
+    def step(self, x, y, lr):
+        """
+        x: (B, C, H, W), y: one-hot (B, num_classes). One SGD update over the
+        whole batch. Returns (mean loss, correct predictions).
+        """
+        batch_size = len(x)
+        shards = [(slot, xs, ys, batch_size)
+                  for slot, (xs, ys) in enumerate(zip(np.array_split(x, self.workers),
+                                                      np.array_split(y, self.workers)))
+                  if len(xs)]
+        results = self.pool.map(_worker_step, shards)
+
+        grad = self.grads[shards[0][0]].copy()
+        for slot, *_ in shards[1:]:
+            grad += self.grads[slot]
+        self.params -= lr * grad
+        self.model.graph.invalidate()
+
+        loss = sum(r[0] for r in results) / batch_size
+        correct = sum(r[1] for r in results)
+        return loss, correct
+
+    def close(self):
+        if self.pool is None:
+            return
+        self.pool.close()
+        self.pool.join()
+        self.pool = None
+        # Give the model its own copies before the shared block goes away
+        self.model.set_params({name: arr.copy() for name, arr in self.model.get_params().items()})
+        self.params = self.grads = None
+        for shm in (self._params_shm, self._grads_shm):
+            shm.close()
+            shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,95 @@
+import numpy as np
+
+class _Pool2D:
+    """
+    Shared window handling for MaxPool2D / AvgPool2D.
+    x: (batch_size, channels, height, width), no padding, output size
+    (H - k) // stride + 1 per spatial dim.
+    """
+
+    def __init__(self, kernel_size=2, stride=None):
+        if isinstance(kernel_size, int):
+            self.kernel_size = (kernel_size, kernel_size)
+        else:
+            self.kernel_size = tuple(kernel_size)
+        self.stride = stride if stride is not None else self.kernel_size[0]
+
+        # Cache for backprop, only kept in training mode (see train())
+        self.training = True
+        self.input_shape = None
+
+    def train(self, mode=True):
+        self.training = mode
+        if not mode:
+            self._clear_cache()
+
+    def _clear_cache(self):
+        self.input_shape = None
+
+    def output_size(self, in_h, in_w):
+        kh, kw = self.kernel_size
+        return (in_h - kh) // self.stride + 1, (in_w - kw) // self.stride + 1
+
+    def _windows(self, x):
+        """
+        View of every pooling window: (B, C, out_h, out_w, kh, kw).
+        """
+        kh, kw = self.kernel_size
+        out_h, out_w = self.output_size(*x.shape[2:])
+        windows = np.lib.stride_tricks.sliding_window_view(x, (kh, kw), axis=(2, 3))
+        return windows[:, :, ::self.stride, ::self.stride][:, :, :out_h, :out_w]
+
+    def _scatter(self, d_x, per_offset):
+        """
+        Adds per_offset(ki, kj) (shape of d_out) back to every window position.
+        Loops over the kh * kw offsets only; overlapping windows accumulate.
+        """
+        kh, kw = self.kernel_size
+        s = self.stride
+        out_h, out_w = self.output_size(*d_x.shape[2:])
+        for ki in range(kh):
+            for kj in range(kw):
+                d_x[:, :, ki:ki + s * out_h:s, kj:kj + s * out_w:s] += per_offset(ki, kj)
+        return d_x
+
+
+class MaxPool2D(_Pool2D):
+    def __init__(self, kernel_size=2, stride=None):
+        super().__init__(kernel_size, stride)
+        self.argmax = None
+
+    def _clear_cache(self):
+        self.input_shape = None
+        self.argmax = None
+
+    def forward(self, x):
+        windows = self._windows(x)
+        windows = windows.reshape(*windows.shape[:4], -1)
+        idx = np.argmax(windows, axis=-1)
+        if self.training:
+            self.input_shape = x.shape
+            self.argmax = idx.astype(np.uint8 if windows.shape[-1] <= 256 else np.int64)
+        return np.take_along_axis(windows, idx[..., None], axis=-1)[..., 0]
+
+    def backward(self, d_out):
+        if self.argmax is None:
+            raise RuntimeError("MaxPool2D.backward needs a forward pass in training mode")
+        kw = self.kernel_size[1]
+        d_x = np.zeros(self.input_shape, dtype=d_out.dtype)
+        # Each output's gradient goes to the position that won its window
+        return self._scatter(d_x, lambda ki, kj: d_out * (self.argmax == ki * kw + kj))
+
+
+class AvgPool2D(_Pool2D):
+    def forward(self, x):
+        if self.training:
+            self.input_shape = x.shape
+        return self._windows(x).mean(axis=(-2, -1), dtype=x.dtype)
+
+    def backward(self, d_out):
+        if self.input_shape is None:
+            raise RuntimeError("AvgPool2D.backward needs a forward pass in training mode")
+        kh, kw = self.kernel_size
+        d_x = np.zeros(self.input_shape, dtype=d_out.dtype)
+        share = d_out / (kh * kw)
+        return self._scatter(d_x, lambda ki, kj: share)
@@ -0,0 +1,275 @@
+import copy
+import time
+import numpy as np
+from conv2d import Conv2D
+from simple_cnn import SimpleCNN
+from model_format import save_weights, load_weights
+from matmul_backend import matmul
+
+# INT8 post-training quantization for SimpleCNN.
+#
+# Weights: symmetric int8 with one scale per output channel (Conv2D filter /
+# Dense column). Activations: symmetric int8 with one scale per layer input,
+# calibrated as the largest |x| seen over a calibration set (or a percentile
+# of it). Each Conv2D/Dense quantizes its input, runs the same im2col +
+# matmul as the float layer with int8 operands and int32 accumulation, and
+# dequantizes with in_scale * w_scale[n] before adding the float bias. ReLU,
+# pooling, Flatten and Softmax stay in float32.
+#
+# This is a size and accuracy format, not a speed-up: weights are 4x smaller
+# on disk and in memory, and the arithmetic matches an int8 MAC array, but
+# on the NumPy backend inference is slower than the float model (~1.7x for
+# 64 images). NumPy has no integer GEMM kernel; int32 np.matmul/einsum
+# measured 30-200x slower than float32 BLAS on these layer shapes, so
+# int8_matmul widens to float instead and pays the quantize/convert passes
+# on top. accuracy_report() times both models.
+QMAX = 127
+
+
+def quantize_tensor(x, scale):
+    return np.clip(np.rint(x / scale), -QMAX, QMAX).astype(np.int8)
+
+
+def channel_scales(w, axis):
+    """
+    Per-channel scale so the largest |w| along every other axis maps to QMAX.
+    """
+    other = tuple(i for i in range(w.ndim) if i != axis)
+    scale = np.max(np.abs(w), axis=other) / QMAX
+    return np.where(scale > 0, scale, 1.0).astype(np.float32)
+
+
+def int8_matmul(A, B, backend=None):
+    """
+    A: int8 (M, K), B: int8 (K, N) -> int32 (M, N), on the selected
+    matmul_backend. NumPy has no integer GEMM kernel, so the operands go to
+    the backend in a float type wide enough to hold every partial sum
+    exactly (float32 while K * 127**2 < 2**24, else float64) and the result
+    is converted back to int32. The hardware backends stay exact too: a
+    tile has K <= 288, and K-split partial sums are added in float64.
+    """
+    K = A.shape[1]
+    ftype = np.float32 if K * QMAX * QMAX < (1 << 24) else np.float64
+    return matmul(A.astype(ftype), B.astype(ftype), backend).astype(np.int32)
+
+
+class QuantizedConv2D(Conv2D):
+    """
+    Inference-only int8 Conv2D. Reuses Conv2D's padding and im2col with
+    int8 activations.
+    """
+
+    def __init__(self, conv, in_scale):
+        super().__init__(conv.in_channels, conv.out_channels, conv.kernel_size,
+                         conv.stride, conv.padding, backend=conv.backend, dtype=np.int8)
+        self.training = False
+        w = conv.weights.reshape(conv.out_channels, -1)
+        self.w_scale = channel_scales(w, axis=0)
+        self.weights = quantize_tensor(w, self.w_scale[:, None]).reshape(conv.weights.shape)
+        self.biases = np.asarray(conv.biases, dtype=np.float32)
+        self.in_scale = np.float32(in_scale)
+        self.grad_w = self.grad_b = None
+
+    def train(self, mode=True):
+        if mode:
+            raise RuntimeError("QuantizedConv2D is inference only")
+
+    def forward(self, x, backend=None):
+        batch_size, _, in_h, in_w = x.shape
+        kh, kw = self.kernel_size
+        out_h = (in_h + 2 * self.padding - kh) // self.stride + 1
+        out_w = (in_w + 2 * self.padding - kw) // self.stride + 1
+
+        x_q = quantize_tensor(x, self.in_scale)
+        A = self._im2col(self._pad_input(x_q), out_h, out_w)  # int8 (batch_size * out_h * out_w, K)
+        B = self.weights.reshape(self.out_channels, -1).T      # int8 (K, out_channels)
+        acc = int8_matmul(A, B, backend if backend is not None else self.backend)
+
+        # float32 throughout: an int32 array times a float32 one would promote to float64
+        C = acc.astype(np.float32) * (self.in_scale * self.w_scale) + self.biases
+        C = C.reshape(batch_size, out_h, out_w, self.out_channels)
+        return C.transpose(0, 3, 1, 2)
+
+    def backward(self, d_out, learning_rate=None):
+        raise RuntimeError("QuantizedConv2D is inference only")
+
+
+class QuantizedDense:
+    """
+    Inference-only int8 Dense: x (batch_size, input_size) -> (batch_size, output_size).
+    """
+
+    def __init__(self, dense, in_scale):
+        self.training = False
+        self.w_scale = channel_scales(dense.weights, axis=1)
+        self.weights = quantize_tensor(dense.weights, self.w_scale[None, :])
+        self.biases = np.asarray(dense.biases, dtype=np.float32)
+        self.in_scale = np.float32(in_scale)
+        self.backend = dense.backend
+
+    def train(self, mode=True):
+        if mode:
+            raise RuntimeError("QuantizedDense is inference only")
+
+    def forward(self, x, backend=None):
+        acc = int8_matmul(quantize_tensor(x, self.in_scale), self.weights,
+                          backend if backend is not None else self.backend)
+        return acc.astype(np.float32) * (self.in_scale * self.w_scale) + self.biases
+
+
+def calibrate(model, batches, percentile=None):
+    """
+    Runs model (in eval mode) over batches of inputs and returns
+    {layer name: activation scale} for every Conv2D/Dense input.
+    percentile: use this percentile of |x| per batch instead of the max,
+    which ignores rare outliers at the cost of clipping them.
+    """
+    peaks = {name: 0.0 for name in model.param_layers}
+    with model.no_grad():
+        for x in batches:
+            x = np.asarray(x, dtype=model.dtype)
+            for name in model.layers:
+                if name in peaks:
+                    a = np.abs(x)
+                    peak = np.percentile(a, percentile) if percentile is not None else a.max()
+                    peaks[name] = max(peaks[name], float(peak))
+                x = getattr(model, name).forward(x)
+    return {name: (peak / QMAX if peak > 0 else 1.0) for name, peak in peaks.items()}
+
+
+class QuantizedCNN:
+    """
+    Int8 version of a SimpleCNN, built with from_float() or load().
+    Same forward() interface, spec and layer names as the float model.
+    """
+
+    def __init__(self, spec, layers, param_layers):
+        self.spec = spec
+        self.layers = list(layers)
+        self.param_layers = list(param_layers)
+
+    @classmethod
+    def from_float(cls, model, in_scales):
+        qmodel = cls(model.spec, model.layers, model.param_layers)
+        for name in model.layers:
+            layer = getattr(model, name)
+            if isinstance(layer, Conv2D):
+                layer = QuantizedConv2D(layer, in_scales[name])
+            elif name in model.param_layers:
+                layer = QuantizedDense(layer, in_scales[name])
+            else:
+                # Parameter-free layers (ReLU, pooling, ...) run as-is in eval mode
+                layer = copy.copy(layer)
+                layer.train(False)
+            setattr(qmodel, name, layer)
+        return qmodel
+
+    def forward(self, x):
+        x = np.asarray(x, dtype=np.float32)
+        for name in self.layers:
+            x = getattr(self, name).forward(x)
+        return x
+
+    def weight_bytes(self):
+        return sum(getattr(self, name).weights.nbytes + getattr(self, name).w_scale.nbytes +
+                   getattr(self, name).biases.nbytes for name in self.param_layers)
+
+    def save(self, path):
+        tensors = {}
+        layers = {}
+        for name in self.param_layers:
+            layer = getattr(self, name)
+            tensors[f'{name}_wq'] = layer.weights
+            tensors[f'{name}_ws'] = layer.w_scale
+            tensors[f'{name}_b'] = layer.biases
+            layers[name] = {'in_scale': float(layer.in_scale)}
+            if isinstance(layer, QuantizedConv2D):
+                layers[name].update(kernel_size=list(layer.kernel_size), stride=layer.stride, padding=layer.padding)
+        save_weights(path, tensors, metadata={'model': 'SimpleCNN-int8', 'spec': self.spec, 'layers': layers})
+
+    @classmethod
+    def load(cls, path):
+        tensors, metadata = load_weights(path, mode="r")
+        if metadata.get('model') != 'SimpleCNN-int8':
+            raise ValueError(f"{path} is not a quantized SimpleCNN")
+        # Build the layer objects from a throwaway float model, then swap in the stored tensors
+        template = SimpleCNN(use_workspace=False, spec=metadata['spec'])
+        qmodel = cls.from_float(template, {name: 1.0 for name in template.param_layers})
+        for name in qmodel.param_layers:
+            layer = getattr(qmodel, name)
+            layer.weights = tensors[f'{name}_wq']
+            layer.w_scale = tensors[f'{name}_ws']
+            layer.biases = tensors[f'{name}_b']
+            layer.in_scale = np.float32(metadata['layers'][name]['in_scale'])
+        return qmodel
+
+
+def quantize_model(model, calib_batches, percentile=None):
+    return QuantizedCNN.from_float(model, calibrate(model, calib_batches, percentile))
+
+
+def accuracy_report(model, qmodel, batches):
+    """
+    batches: iterable of (x, labels). Compares the float and int8 models on
+    the same inputs, including their forward wall time.
+    """
+    total = float_correct = int8_correct = agree = 0
+    max_prob_diff = float_s = int8_s = 0.0
+    with model.no_grad():
+        for x, labels in batches:
+            t0 = time.perf_counter()
+            p_float = model.forward(x)
+            t1 = time.perf_counter()
+            p_int8 = qmodel.forward(x)
+            float_s += t1 - t0
+            int8_s += time.perf_counter() - t1
+            pred_float = np.argmax(p_float, axis=1)
+            pred_int8 = np.argmax(p_int8, axis=1)
+            total += len(labels)
+            float_correct += int(np.sum(pred_float == labels))
+            int8_correct += int(np.sum(pred_int8 == labels))
+            agree += int(np.sum(pred_float == pred_int8))
+            max_prob_diff = max(max_prob_diff, float(np.max(np.abs(p_float - p_int8))))
+    float_bytes = sum(a.nbytes for a in model.get_params().values())
+    return {
+        "samples": total,
+        "float_accuracy": float_correct / total,
+        "int8_accuracy": int8_correct / total,
+        "top1_agreement": agree / total,
+        "max_prob_diff": max_prob_diff,
+        "float_weight_bytes": float_bytes,
+        "int8_weight_bytes": qmodel.weight_bytes(),
+        "float_forward_s": float_s,
+        "int8_forward_s": int8_s,
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    from CNN_digit_recognizer import (MODEL_FILE, DATA_DIR, DATASET_CACHE_DIR, INFER_BATCH_SIZE, IMG_SIZE,
+                                      load_data, resolve_model_file)
+    from dataset_cache import has_dataset_cache, load_dataset_cache, iter_minibatches
+
+    parser = argparse.ArgumentParser(description="INT8 post-training quantization of SimpleCNN")
+    parser.add_argument("--model", default=MODEL_FILE)
+    parser.add_argument("--output", default="trained_model.int8.weights")
+    parser.add_argument("--calib", type=int, default=512, help="number of calibration images")
+    parser.add_argument("--percentile", type=float, default=None,
+                        help="activation range percentile (default: max)")
+    args = parser.parse_args()
+
+    if has_dataset_cache(DATASET_CACHE_DIR):
+        images, labels = load_dataset_cache(DATASET_CACHE_DIR)
+    else:
+        X, labels = load_data(DATA_DIR)
+        images = X.reshape(-1, IMG_SIZE, IMG_SIZE)
+
+    model = SimpleCNN.from_file(resolve_model_file(args.model))
+    calib = (x for x, _ in iter_minibatches(images[:args.calib], labels[:args.calib], INFER_BATCH_SIZE))
+    qmodel = quantize_model(model, calib, args.percentile)
+    qmodel.save(args.output)
+
+    report = accuracy_report(model, qmodel, iter_minibatches(images, labels, INFER_BATCH_SIZE, shuffle=False))
+    print(json.dumps(report, indent=2))
+    print(f"Quantized model saved to '{args.output}'.")
@@ -2,27 +2,45 @@ import numpy as np
 
 class ReLU:
     def __init__(self):
+        self.training = True
         self.mask = None
 
+    def train(self, mode=True):
+        self.training = mode
+        if not mode:
+            self.mask = None
+
     def forward(self, x):
+        if not self.training:
+            return np.maximum(x, 0)
         self.mask = (x > 0)
         return x * self.mask
 
     def backward(self, d_out):
+        if self.mask is None:
+            raise RuntimeError("ReLU.backward needs a forward pass in training mode")
         return d_out * self.mask
 
 
 class Softmax:
     def __init__(self):
+        self.training = True
         self.last_output = None
 
+    def train(self, mode=True):
+        self.training = mode
+        if not mode:
+            self.last_output = None
+
     def forward(self, x):
         """
         x shape: (batch_size, num_classes)
         """
         exp_shifted = np.exp(x - np.max(x, axis=1, keepdims=True))
-        self.last_output = exp_shifted / np.sum(exp_shifted, axis=1, keepdims=True)
-        return self.last_output
+        output = exp_shifted / np.sum(exp_shifted, axis=1, keepdims=True)
+        if self.training:
+            self.last_output = output
+        return output
 
     def backward(self, d_out):
         """
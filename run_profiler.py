@@ -1,23 +1,91 @@
+import argparse
 import cProfile
+import os
 import pstats
-import sys
+import numpy as np
 
-# Set the path to your image here
-IMAGE_PATH = "../Generate_Modified_Images/Dataset_24x24/0/0.jpg"
+from CNN_digit_recognizer import (IMG_SIZE, NUM_CLASSES, MODEL_FILE, MODEL_SPEC, INFER_BATCH_SIZE,
+                                  load_image, one_hot, expand_image_paths, resolve_model_file)
+from simple_cnn import SimpleCNN
+from matmul_backend import use_backend, current_backend
+from layer_profiler import LayerProfiler
 
-# Import your model script (assuming infer is a top-level function)
-from CNN_digit_recognizer import *
+# Per-layer profile of SimpleCNN inference and, optionally, training steps.
+#
+#   python run_profiler.py                         # random batch, trained model if present
+#   python run_profiler.py digits/ --batch-size 32 # real images
+#   python run_profiler.py --train-steps 3 --memory --backend emulator
+#
+# Writes layer_profile.json (per-layer totals + every span) and
+# layer_trace.json (open in chrome://tracing or ui.perfetto.dev).
+# --cprofile additionally runs the same workload under cProfile.
+
+
+def load_batch(specs, batch_size, rng):
+    paths = expand_image_paths(specs) if specs else []
+    if paths:
+        paths = paths[:batch_size]
+        return np.stack([load_image(p) for p in paths]).reshape(-1, 1, IMG_SIZE, IMG_SIZE)
+    return rng.random((batch_size, 1, IMG_SIZE, IMG_SIZE), dtype=np.float32)
+
+
+def load_model(path):
+    path = resolve_model_file(path)
+    if os.path.exists(path):
+        return SimpleCNN.from_file(path)
+    print(f"'{path}' not found; profiling an untrained {MODEL_SPEC} model.")
+    return SimpleCNN(spec=MODEL_SPEC)
+
+
+def run_workload(model, x, infer_runs, train_steps, labels):
+    # Training first, so the eval graph compiled by the inference runs is
+    # still current when the next workload (the profiled one) starts
+    model.train()
+    for _ in range(train_steps):
+        model.train_step(x, labels, lr=0.0)
+    model.eval()
+    for _ in range(infer_runs):
+        model.forward(x)
 
-def profile_infer():
-    cProfile.runctx(
-        'infer(IMAGE_PATH)',
-        globals(),
-        locals(),
-        filename='infer_profile.prof'
-    )
 
 if __name__ == "__main__":
-    profile_infer()
-    stats = pstats.Stats('infer_profile.prof')
-    stats.strip_dirs().sort_stats('cumtime').print_stats(20)
-    print("Profiling complete. Use `snakeviz infer_profile.prof` to view.")
+    parser = argparse.ArgumentParser(description="Per-layer profile of SimpleCNN")
+    parser.add_argument("images", nargs="*", help="images, directories or globs (default: random input)")
+    parser.add_argument("--model", default=MODEL_FILE)
+    parser.add_argument("--batch-size", type=int, default=INFER_BATCH_SIZE)
+    parser.add_argument("--infer-runs", type=int, default=3)
+    parser.add_argument("--train-steps", type=int, default=0)
+    parser.add_argument("--backend", default=None, help="matmul backend (default: current)")
+    parser.add_argument("--memory", action="store_true", help="track bytes allocated (slower)")
+    parser.add_argument("--json", default="layer_profile.json")
+    parser.add_argument("--trace", default="layer_trace.json")
+    parser.add_argument("--cprofile", action="store_true", help="also write infer_profile.prof")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    model = load_model(args.model)
+    x = load_batch(args.images, args.batch_size, rng)
+    labels = one_hot(rng.integers(0, NUM_CLASSES, len(x)), NUM_CLASSES)
+    backend = args.backend or current_backend()
+
+    with use_backend(backend):
+        # Warm-up pass outside the profile: compiles the graphs and fills the workspace
+        run_workload(model, x, 1, min(args.train_steps, 1), labels)
+
+        with LayerProfiler(track_memory=args.memory) as prof:
+            run_workload(model, x, args.infer_runs, args.train_steps, labels)
+
+        if args.cprofile:
+            cProfile.runctx('run_workload(model, x, args.infer_runs, args.train_steps, labels)',
+                            globals(), locals(), filename='infer_profile.prof')
+
+    print(f"batch {len(x)}, backend {backend}, {args.infer_runs} inference runs, {args.train_steps} train steps")
+    prof.print_summary()
+    prof.export_json(args.json)
+    prof.export_chrome_trace(args.trace)
+    print(f"Wrote '{args.json}' and '{args.trace}'.")
+
+    if args.cprofile:
+        stats = pstats.Stats('infer_profile.prof')
+        stats.strip_dirs().sort_stats('cumtime').print_stats(20)
+        print("Use `snakeviz infer_profile.prof` to view.")
@@ -0,0 +1,311 @@
+import numpy as np
+import layer_profiler
+from conv2d import Conv2D
+from dense import Dense
+from flatten import Flatten
+from relu_softmax import ReLU, Softmax
+
+# Layer graph with optimization passes.
+#
+# Sequential holds the layers in forward order and compiles them into a list
+# of ops, once per mode (training / eval); each compiled graph is reused for
+# every forward in its mode until the parameters change. Passes rewrite the op
+# list:
+#
+#   elide_flatten  (eval) Flatten -> Dense on a conv output is run as one op
+#                  that feeds the conv's NHWC buffer straight to a Dense whose
+#                  rows were permuted to match, so the activations are never
+#                  copied into NCHW order. The permuted copy of the weights is
+#                  only made when a batch is at least as large as the Dense
+#                  output (so the one-off copy costs no more than the
+#                  activation copy it saves) and never for memmapped weights,
+#                  which stay shared between processes.
+#   fuse_relu      Conv2D/Dense (+ bias) -> ReLU becomes one op that applies
+#                  the ReLU in place on the layer's output buffer; training
+#                  keeps only the mask.
+#   fold_softmax   (training) a final Softmax becomes a cache-free head that
+#                  loss() skips, computing softmax + cross-entropy together
+#                  (softmax_cross_entropy) and the logit gradient directly.
+
+
+def softmax(logits):
+    exp_shifted = np.exp(logits - np.max(logits, axis=1, keepdims=True))
+    return exp_shifted / np.sum(exp_shifted, axis=1, keepdims=True)
+
+
+def softmax_cross_entropy(logits, labels):
+    """
+    logits, one-hot labels: (batch_size, num_classes).
+    Returns (probs, mean loss, d_logits) using log-softmax, so no epsilon is
+    needed inside the log.
+    """
+    shifted = logits - np.max(logits, axis=1, keepdims=True)
+    log_probs = shifted - np.log(np.sum(np.exp(shifted), axis=1, keepdims=True))
+    probs = np.exp(log_probs)
+    batch_size = logits.shape[0]
+    loss = -np.sum(labels * log_probs) / batch_size
+    return probs, loss, (probs - labels) / batch_size
+
+
+class LayerOp:
+    """
+    One unmodified layer.
+    """
+
+    def __init__(self, name, layer):
+        self.name = name
+        self.layer = layer
+        self.has_params = isinstance(layer, (Conv2D, Dense))
+
+    def forward(self, x):
+        return self.layer.forward(x)
+
+    def backward(self, d_out, lr):
+        if self.has_params:
+            return self.layer.backward(d_out, lr)
+        return self.layer.backward(d_out)
+
+
+class FusedReLU:
+    """
+    op followed by ReLU. op's output is a buffer the op owns (GEMM output
+    plus bias), so the ReLU is applied to it in place.
+    """
+
+    def __init__(self, op, relu_name, relu):
+        self.name = f"{op.name}+{relu_name}"
+        self.op = op
+        self.relu = relu
+
+    def forward(self, x):
+        y = self.op.forward(x)
+        np.maximum(y, 0, out=y)
+        if self.relu.training:
+            self.relu.mask = y > 0
+        return y
+
+    def backward(self, d_out, lr):
+        return self.op.backward(self.relu.backward(d_out), lr)
+
+
+def _is_memmapped(a):
+    while a is not None:
+        if isinstance(a, np.memmap):
+            return True
+        a = a.base
+    return False
+
+
+class FlattenDense:
+    """
+    Eval-only Flatten -> Dense. A conv output is a (B, C, H, W) view of a
+    contiguous (B, H, W, C) buffer; flattening that buffer as-is needs no
+    copy, and permuting Dense's rows from (C, H, W) to (H, W, C) order once
+    gives the same product. Until that permuted copy exists (see
+    elide_flatten for when it is made) the op is a plain Flatten + Dense.
+    """
+
+    def __init__(self, flatten_name, flatten, dense_name, dense):
+        self.name = f"{flatten_name}+{dense_name}"
+        self.flatten = flatten
+        self.dense = dense
+        self._weights = None
+        self._chw = None
+
+    def forward(self, x):
+        if x.ndim != 4:
+            return self.dense.forward(self.flatten.forward(x))
+        nhwc = x.transpose(0, 2, 3, 1)
+        if not nhwc.flags.c_contiguous:
+            return self.dense.forward(self.flatten.forward(x))
+
+        batch_size, channels, h, w = x.shape
+        if self._chw != (channels, h, w):
+            out_features = self.dense.weights.shape[1]
+            if batch_size < out_features or _is_memmapped(self.dense.weights):
+                return self.dense.forward(self.flatten.forward(x))
+            self._weights = np.ascontiguousarray(
+                self.dense.weights.reshape(channels, h, w, out_features).transpose(1, 2, 0, 3)
+            ).reshape(channels * h * w, out_features)
+            self._chw = (channels, h, w)
+        return self.dense.sw_dot(nhwc.reshape(batch_size, -1).astype(self.dense.dtype, copy=False),
+                                 self._weights, self.dense.biases)
+
+    def backward(self, d_out, lr):
+        raise RuntimeError("FlattenDense is only used in eval mode")
+
+
+class SoftmaxHead:
+    """
+    Folded final Softmax: keeps no cache; its backward is the identity, as
+    Softmax.backward is (the caller passes the logit gradient).
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def forward(self, x):
+        return softmax(x)
+
+    def backward(self, d_out, lr):
+        return d_out
+
+
+def elide_flatten(ops, training):
+    if training:
+        return ops
+    out = []
+    for op in ops:
+        prev = out[-1] if out else None
+        if (isinstance(op, LayerOp) and isinstance(op.layer, Dense) and
+                isinstance(prev, LayerOp) and isinstance(prev.layer, Flatten)):
+            out[-1] = FlattenDense(prev.name, prev.layer, op.name, op.layer)
+        else:
+            out.append(op)
+    return out
+
+
+def fuse_relu(ops, training):
+    out = []
+    for op in ops:
+        prev = out[-1] if out else None
+        fusable = (isinstance(prev, FlattenDense) or
+                   (isinstance(prev, LayerOp) and prev.has_params))
+        if isinstance(op, LayerOp) and isinstance(op.layer, ReLU) and fusable:
+            out[-1] = FusedReLU(prev, op.name, op.layer)
+        else:
+            out.append(op)
+    return out
+
+
+def fold_softmax(ops, training):
+    if training and ops and isinstance(ops[-1], LayerOp) and isinstance(ops[-1].layer, Softmax):
+        return ops[:-1] + [SoftmaxHead(ops[-1].name)]
+    return ops
+
+
+DEFAULT_PASSES = (elide_flatten, fuse_relu, fold_softmax)
+
+
+def op_flops(op, in_shape, out_shape, backward=False):
+    """
+    Approximate FLOPs of one op call, for profiling. A GEMM counts 2 per
+    multiply-add (backward runs two: d_w and d_x); bias, ReLU, pooling and
+    softmax count one per element.
+    """
+    if isinstance(op, FusedReLU):
+        return op_flops(op.op, in_shape, out_shape, backward) + int(np.prod(out_shape))
+    layer = op.dense if isinstance(op, FlattenDense) else getattr(op, "layer", None)
+    if isinstance(layer, Conv2D):
+        kh, kw = layer.kernel_size
+        macs = int(np.prod(out_shape)) * layer.in_channels * kh * kw
+    elif isinstance(layer, Dense):
+        macs = int(np.prod(out_shape)) * layer.weights.shape[0]
+    elif isinstance(layer, Flatten):
+        return 0
+    else:
+        return max(int(np.prod(in_shape)), int(np.prod(out_shape)))
+    return 2 * macs * (2 if backward else 1) + int(np.prod(out_shape))
+
+
+class CompiledGraph:
+    def __init__(self, ops):
+        self.ops = ops
+        self.softmax_head = bool(ops) and isinstance(ops[-1], SoftmaxHead)
+
+    def forward(self, x, logits=False):
+        """
+        logits=True stops before a folded Softmax head.
+        """
+        prof = layer_profiler.active()
+        for op in self.ops:
+            if logits and isinstance(op, SoftmaxHead):
+                break
+            if prof is None:
+                x = op.forward(x)
+            else:
+                with prof.span(op.name, "forward") as event:
+                    y = op.forward(x)
+                event["args"].update(in_shape=list(x.shape), out_shape=list(y.shape),
+                                     flops=op_flops(op, x.shape, y.shape))
+                x = y
+        return x
+
+    def backward(self, d_out, lr):
+        prof = layer_profiler.active()
+        for op in reversed(self.ops):
+            if prof is None:
+                d_out = op.backward(d_out, lr)
+            else:
+                with prof.span(op.name, "backward") as event:
+                    d_x = op.backward(d_out, lr)
+                # The op's input/output are the shapes of d_x/d_out
+                event["args"].update(in_shape=list(d_x.shape), out_shape=list(d_out.shape),
+                                     flops=op_flops(op, d_x.shape, d_out.shape, backward=True))
+                d_out = d_x
+        return d_out
+
+
+class Sequential:
+    """
+    layers: [(name, layer)] in forward order. The layer objects are shared,
+    not copied, so parameters stay in the layers themselves.
+    """
+
+    def __init__(self, layers, passes=DEFAULT_PASSES):
+        self.layers = list(layers)
+        self.passes = tuple(passes)
+        self.training = True
+        self._compiled = {}
+
+    def train(self, mode=True):
+        self.training = mode
+        # One compiled graph per mode, so switching keeps both
+        for _, layer in self.layers:
+            layer.train(mode)
+        return self
+
+    def eval(self):
+        return self.train(False)
+
+    def invalidate(self):
+        """
+        Drops the compiled graphs; call after changing parameters from outside.
+        """
+        self._compiled.clear()
+
+    def compile(self, training=None):
+        if training is None:
+            training = self.training
+        graph = self._compiled.get(training)
+        if graph is None:
+            ops = [LayerOp(name, layer) for name, layer in self.layers]
+            for run_pass in self.passes:
+                ops = run_pass(ops, training)
+            graph = CompiledGraph(ops)
+            self._compiled[training] = graph
+        return graph
+
+    def forward(self, x, logits=False):
+        return self.compile().forward(x, logits)
+
+    def backward(self, d_out, lr=None):
+        """
+        d_out is the gradient of the graph output; with a folded Softmax that
+        is the logit gradient (probs - labels) / batch_size, as before.
+        """
+        d_x = self.compile().backward(d_out, lr)
+        if lr:
+            # Parameters changed: the eval graph's derived weights are stale.
+            # lr=0 (benchmarks, profiling) leaves them as they were.
+            self._compiled.pop(False, None)
+        return d_x
+
+    def loss(self, x, labels):
+        """
+        Training forward with the Softmax folded into the cross-entropy.
+        Returns (probs, mean loss, d_logits) ready for backward(d_logits, lr).
+        """
+        if not self.compile().softmax_head:
+            raise RuntimeError("loss() needs a training graph ending in Softmax with fold_softmax enabled")
+        return softmax_cross_entropy(self.forward(x, logits=True), labels)
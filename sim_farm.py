@@ -0,0 +1,169 @@
+import atexit
+import fcntl
+import os
+import queue
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
+from matrix_hw_wrapper import matrix_mul_hw, hw_fidelity
+from tiled_matmul import plan_tiles, iter_tiles
+from layer_profiler import span
+
+# Independent MatrixMul_top simulations run side by side.
+#
+#     with SimFarm(workers=4) as farm:
+#         C = farm.matmul(A, B)                        # tiles spread over 4 simulators
+#         for key, C in farm.imap_unordered(jobs):     # jobs: [(key, A, B)], as they finish
+#             ...
+#
+# Each worker owns a <root>/worker_<i> directory: its exchange files,
+# make.log, results.xml and sim_build live there, so no two simulations share
+# a file and each worker compiles the RTL once and reuses the build for every
+# later job. With a fixed root (rather than a temporary one) the builds also
+# survive between runs; a farm holds an flock on every directory it uses, so
+# farms in other processes sharing the root claim other ones. Threads are
+# enough: a job spends its time in a make/vvp child process, or with
+# persistent=True in the worker's own server.
+#
+# The "hw_farm" matmul backend uses default_farm(): $MATMUL_FARM_WORKERS
+# workers (default DEFAULT_WORKERS, since every new worker directory costs
+# one Icarus build) under $MATMUL_FARM_ROOT (default sim_farm/ in the repo).
+WORKERS_ENV_VAR = "MATMUL_FARM_WORKERS"
+ROOT_ENV_VAR = "MATMUL_FARM_ROOT"
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+DEFAULT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sim_farm")
+
+
+def claim_workdirs(root, count):
+    """
+    Claims count worker_<i> directories under root, lowest free index first.
+    Returns (workdirs, lock files); each directory stays claimed until its
+    lock file is closed.
+    """
+    workdirs, locks = [], []
+    i = 0
+    while len(workdirs) < count:
+        workdir = os.path.join(root, f"worker_{i}")
+        os.makedirs(workdir, exist_ok=True)
+        lock = open(os.path.join(workdir, ".lock"), "w")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock.close()
+        else:
+            workdirs.append(workdir)
+            locks.append(lock)
+        i += 1
+    return workdirs, locks
+
+
+class SimFarm:
+    """
+    Pool of `workers` (default DEFAULT_WORKERS) simulators, each with its
+    own workdir under root (a temporary directory, removed by close(), when
+    root is None).
+    persistent, fmt, fidelity and cache are passed to matrix_mul_hw for
+    every job; the cache is shared by all workers.
+    """
+
+    def __init__(self, workers=None, root=None, persistent=False, fmt="bin", fidelity=None, cache=None):
+        self.workers = workers or DEFAULT_WORKERS
+        self.persistent = persistent
+        self.fmt = fmt
+        self.fidelity = hw_fidelity(fidelity)
+        self.cache = cache
+        self._tmp_root = root is None
+        self.root = tempfile.mkdtemp(prefix="sim_farm_") if root is None else root
+        self.workdirs, self._locks = claim_workdirs(self.root, self.workers)
+        # Idle workdirs; a job holds one for as long as its simulation runs
+        self._idle = queue.Queue()
+        for workdir in self.workdirs:
+            self._idle.put(workdir)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="sim_farm")
+
+    def _run(self, A, B):
+        workdir = self._idle.get()
+        try:
+            return matrix_mul_hw(A, B, self.persistent, self.fmt, self.cache, self.fidelity, workdir)
+        finally:
+            self._idle.put(workdir)
+
+    def submit(self, A, B):
+        """
+        Queues one hardware-sized matmul. Returns a Future of C (M, N).
+        """
+        return self._executor.submit(self._run, A, B)
+
+    def imap_unordered(self, jobs):
+        """
+        jobs: iterable of (key, A, B). Yields (key, C) in completion order.
+        """
+        futures = {self.submit(A, B): key for key, A, B in jobs}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+    def map(self, pairs):
+        """
+        [(A, B)] -> [C] in input order, simulated in parallel.
+        """
+        results = dict(self.imap_unordered((i, A, B) for i, (A, B) in enumerate(pairs)))
+        return [results[i] for i in range(len(results))]
+
+    def matmul(self, A, B):
+        """
+        A: (M, K), B: (K, N) -> (M, N). Like tiled_matmul.matrix_mul_tiled,
+        but every tile is a separate job. Partial sums are added in tile
+        order, not completion order, so the result is the same on every run.
+        """
+        M, K = A.shape
+        K2, N = B.shape
+        if K != K2:
+            raise ValueError(f"Matrix shape mismatch: A is {A.shape}, B is {B.shape} (K != K2)")
+
+        tm, tk, tn = plan_tiles(M, K, N)
+        with span("sim_farm", "hw", shape=[M, K, N], workers=self.workers):
+            if (tm, tk, tn) == (M, K, N):
+                return self.submit(A, B).result()
+
+            tiles = list(iter_tiles(M, K, N, tm, tk, tn))
+            C_tiles = self.map([(A[m0:m1, k0:k1], B[k0:k1, n0:n1]) for m0, m1, k0, k1, n0, n1 in tiles])
+            C = np.zeros((M, N))
+            for (m0, m1, k0, k1, n0, n1), C_tile in zip(tiles, C_tiles):
+                C[m0:m1, n0:n1] += C_tile
+            return C
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        if self.persistent:
+            from matrix_sim_server import close_server
+            for workdir in self.workdirs:
+                close_server(workdir)
+        for lock in self._locks:
+            lock.close()
+        self._locks = []
+        if self._tmp_root:
+            shutil.rmtree(self.root, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_farm = None
+
+
+def default_farm():
+    """
+    Shared farm for this process ($MATMUL_FARM_WORKERS workers under
+    $MATMUL_FARM_ROOT, kept between runs), created on first use and closed
+    at exit.
+    """
+    global _farm
+    if _farm is None:
+        workers = int(os.environ.get(WORKERS_ENV_VAR, 0)) or None
+        _farm = SimFarm(workers, root=os.environ.get(ROOT_ENV_VAR) or DEFAULT_ROOT)
+        atexit.register(_farm.close)
+    return _farm
@@ -1,86 +1,241 @@
 import pickle
+from contextlib import contextmanager
+import numpy as np
 from conv2d import Conv2D
 from dense import Dense
 from flatten import Flatten
+from pooling import MaxPool2D, AvgPool2D
 from relu_softmax import ReLU, Softmax
+from workspace import Workspace
+from model_format import save_weights, load_weights, is_weights_file
+from sequential import Sequential
+from layer_profiler import span
 
 NUM_CLASSES = 10
 IMG_SIZE = 24
+# Model-wide precision; float32 matches the MAC32_top datapath
+DEFAULT_DTYPE = np.float32
+
+# Architecture spec: comma-separated layers in forward order
+#   conv<N>              3x3 Conv2D, stride 1, padding 1, N output channels
+#   maxpool<k>/avgpool<k> k x k pooling with stride k
+#   dense<N>             Dense with N outputs
+#   relu, flatten, softmax
+DEFAULT_SPEC = "conv8,relu,conv32,relu,conv64,relu,flatten,dense128,relu,dense10,softmax"
+SPECS = {
+    "baseline": DEFAULT_SPEC,
+    # dense1 input 64*6*6 = 2304 (16x smaller)
+    "pool16x": "conv8,relu,maxpool2,conv32,relu,conv64,relu,maxpool2,flatten,dense128,relu,dense10,softmax",
+    # dense1 input 64*3*3 = 576 (64x smaller)
+    "pool64x": "conv8,relu,maxpool2,conv32,relu,maxpool2,conv64,relu,maxpool2,flatten,dense128,relu,dense10,softmax",
+}
+
+
+def parse_spec(spec):
+    """
+    spec: a SPECS name, a comma-separated string or a list of tokens.
+    Returns the normalized comma-separated string.
+    """
+    if spec is None:
+        spec = DEFAULT_SPEC
+    if isinstance(spec, str):
+        spec = SPECS.get(spec, spec).split(",")
+    return ",".join(token.strip().lower() for token in spec)
+
+
+def build_layers(spec, in_channels=1, img_size=IMG_SIZE, backend=None, dtype=DEFAULT_DTYPE):
+    """
+    Returns [(name, layer)] for a spec. Names follow the original SimpleCNN:
+    conv<i>/dense<i>/pool<i> by position, relu<i> after conv<i>, relu_fc
+    after a dense layer, flatten and softmax.
+    """
+    layers = []
+    channels, h, w = in_channels, img_size, img_size
+    features = None
+    counts = {}
+    last_param = None
+
+    def name_for(kind):
+        counts[kind] = counts.get(kind, 0) + 1
+        return f"{kind}{counts[kind]}"
+
+    for token in parse_spec(spec).split(","):
+        if token.startswith("conv"):
+            out_channels = int(token[4:])
+            layer = Conv2D(in_channels=channels, out_channels=out_channels, kernel_size=3, stride=1, padding=1,
+                           backend=backend, dtype=dtype)
+            name = last_param = name_for("conv")
+            channels = out_channels
+        elif token.startswith(("maxpool", "avgpool")):
+            k = int(token[7:])
+            layer = (MaxPool2D if token.startswith("max") else AvgPool2D)(k)
+            name = name_for("pool")
+            h, w = layer.output_size(h, w)
+        elif token.startswith("dense"):
+            out_features = int(token[5:])
+            if features is None:
+                raise ValueError(f"'{token}' needs a flatten before it in spec '{spec}'")
+            layer = Dense(input_size=features, output_size=out_features, backend=backend, dtype=dtype)
+            name = last_param = name_for("dense")
+            features = out_features
+        elif token == "relu":
+            layer = ReLU()
+            if last_param is None or last_param.startswith("conv"):
+                name = f"relu{last_param[4:] if last_param else ''}"
+            else:
+                name = "relu_fc" if last_param == "dense1" else f"relu_fc{last_param[5:]}"
+        elif token == "flatten":
+            layer = Flatten()
+            name = "flatten"
+            features = channels * h * w
+        elif token == "softmax":
+            layer = Softmax()
+            name = "softmax"
+        else:
+            raise ValueError(f"Unknown layer '{token}' in spec '{spec}'")
+        if any(name == n for n, _ in layers):
+            raise ValueError(f"Spec '{spec}' produces the layer name '{name}' twice")
+        layers.append((name, layer))
+    return layers
+
 
 class SimpleCNN:
-    def __init__(self):
-        # Conv Block 1
-        self.conv1 = Conv2D(in_channels=1, out_channels=8, kernel_size=3, stride=1, padding=1)
-        self.relu1 = ReLU()
-
-        # Conv Block 2
-        self.conv2 = Conv2D(in_channels=8, out_channels=32, kernel_size=3, stride=1, padding=1)
-        self.relu2 = ReLU()
-
-        # Conv Block 3
-        self.conv3 = Conv2D(in_channels=32, out_channels=64, kernel_size=3, stride=1, padding=1)
-        self.relu3 = ReLU()
-
-        # Flatten and Dense
-        self.flatten = Flatten()
-        self.dense1 = Dense(input_size=64 * IMG_SIZE * IMG_SIZE, output_size=128)
-        self.relu_fc = ReLU()
-        self.dense2 = Dense(input_size=128, output_size=NUM_CLASSES)
-        self.softmax = Softmax()
+    def __init__(self, backend=None, dtype=DEFAULT_DTYPE, use_workspace=True, spec=None):
+        # backend: matmul backend name for every Conv2D/Dense layer (None = global default)
+        # dtype: precision of weights, activations and gradients in every layer
+        # use_workspace: Conv2D/Dense temporaries come from one reusable Workspace
+        # spec: architecture (see SPECS / parse_spec); default is the original
+        #       conv8-conv32-conv64-dense128-dense10 network
+        self.dtype = np.dtype(dtype)
+        self.spec = parse_spec(spec)
 
-    def forward(self, x):
-        x = self.conv1.forward(x)
-        x = self.relu1.forward(x)
+        # Every layer is also an attribute (self.conv1, self.relu1, ...)
+        self.layers = []
+        # Layers with weights/biases, in save() order; params are named <layer>_w / <layer>_b
+        self.param_layers = []
+        for name, layer in build_layers(self.spec, 1, IMG_SIZE, backend, dtype):
+            setattr(self, name, layer)
+            self.layers.append(name)
+            if isinstance(layer, (Conv2D, Dense)):
+                self.param_layers.append(name)
+        self.training = True
+        # Compiled once per mode with the fusion passes; runs forward/backward
+        self.graph = Sequential([(name, getattr(self, name)) for name in self.layers])
+
+        self.workspace = Workspace() if use_workspace else None
+        if self.workspace is not None:
+            for name in self.param_layers:
+                getattr(self, name).workspace = self.workspace.scope(name)
+
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        """
+        Builds a model with the architecture stored in path and loads it.
+        """
+        spec = None
+        if is_weights_file(path):
+            _, metadata = load_weights(path, mode="r")
+            spec = metadata.get('spec')
+        model = cls(spec=spec, **kwargs)
+        model.load(path)
+        return model
+
+    def train(self, mode=True):
+        """
+        mode=False is inference (eval) mode: layers keep no backprop caches, so
+        each activation is freed as soon as the next layer has consumed it.
+        """
+        self.training = mode
+        self.graph.train(mode)
+        return self
 
-        x = self.conv2.forward(x)
-        x = self.relu2.forward(x)
+    def eval(self):
+        return self.train(False)
+
+    @contextmanager
+    def no_grad(self):
+        """
+        Eval mode for the duration of a with block, then back to the previous mode.
+        """
+        was_training = self.training
+        self.eval()
+        try:
+            yield self
+        finally:
+            self.train(was_training)
+
+    def forward(self, x):
+        with span("SimpleCNN.forward", "model", batch_size=len(x)):
+            return self.graph.forward(x.astype(self.dtype, copy=False))
 
-        x = self.conv3.forward(x)
-        x = self.relu3.forward(x)
+    def backward(self, d_out, lr=None):
+        """
+        lr=None only computes the gradients (see get_grads / apply_gradients).
+        d_out is the gradient w.r.t. the logits, (probs - labels) / batch_size.
+        """
+        with span("SimpleCNN.backward", "model", batch_size=len(d_out)):
+            self.graph.backward(d_out, lr)
 
-        x = self.flatten.forward(x)
-        x = self.dense1.forward(x)
-        x = self.relu_fc.forward(x)
-        x = self.dense2.forward(x)
-        x = self.softmax.forward(x)
-        return x
+    def train_step(self, x, labels, lr):
+        """
+        One SGD step with Softmax folded into the cross-entropy loss.
+        labels: one-hot. Returns (probs, mean loss).
+        """
+        with span("SimpleCNN.train_step", "model", batch_size=len(x)):
+            probs, loss, d_logits = self.graph.loss(x.astype(self.dtype, copy=False), labels)
+            self.backward(d_logits, lr)
+        return probs, loss
 
-    def backward(self, d_out, lr):
-        d_out = self.dense2.backward(d_out, lr)
-        d_out = self.relu_fc.backward(d_out)
-        d_out = self.dense1.backward(d_out, lr)
-        d_out = self.flatten.backward(d_out)
+    def get_params(self):
+        params = {}
+        for name in self.param_layers:
+            layer = getattr(self, name)
+            params[f'{name}_w'] = layer.weights
+            params[f'{name}_b'] = layer.biases
+        return params
 
-        d_out = self.relu3.backward(d_out)
-        d_out = self.conv3.backward(d_out, lr)
+    def set_params(self, params):
+        """
+        Arrays already in the model dtype are used as-is (no copy), others
+        (e.g. a float64 checkpoint) are converted.
+        """
+        for name in self.param_layers:
+            layer = getattr(self, name)
+            layer.weights = np.asarray(params[f'{name}_w'], dtype=self.dtype)
+            layer.biases = np.asarray(params[f'{name}_b'], dtype=self.dtype)
+        self.graph.invalidate()
 
-        d_out = self.relu2.backward(d_out)
-        d_out = self.conv2.backward(d_out, lr)
+    def get_grads(self):
+        grads = {}
+        for name in self.param_layers:
+            layer = getattr(self, name)
+            grads[f'{name}_w'] = layer.grad_w
+            grads[f'{name}_b'] = layer.grad_b
+        return grads
 
-        d_out = self.relu1.backward(d_out)
-        d_out = self.conv1.backward(d_out, lr)
+    def apply_gradients(self, lr):
+        for name in self.param_layers:
+            getattr(self, name).apply_gradients(lr)
+        self.graph.invalidate()
 
     def save(self, path):
-        params = {
-            'conv1_w': self.conv1.weights, 'conv1_b': self.conv1.biases,
-            'conv2_w': self.conv2.weights, 'conv2_b': self.conv2.biases,
-            'conv3_w': self.conv3.weights, 'conv3_b': self.conv3.biases,
-            'dense1_w': self.dense1.weights, 'dense1_b': self.dense1.biases,
-            'dense2_w': self.dense2.weights, 'dense2_b': self.dense2.biases
-        }
-        with open(path, 'wb') as f:
-            pickle.dump(params, f)
+        """
+        Writes the weights in model_format's memory-mappable layout.
+        """
+        save_weights(path, self.get_params(), metadata={'model': 'SimpleCNN', 'spec': self.spec})
 
     def load(self, path):
-        with open(path, 'rb') as f:
-            params = pickle.load(f)
-        self.conv1.weights = params['conv1_w']
-        self.conv1.biases = params['conv1_b']
-        self.conv2.weights = params['conv2_w']
-        self.conv2.biases = params['conv2_b']
-        self.conv3.weights = params['conv3_w']
-        self.conv3.biases = params['conv3_b']
-        self.dense1.weights = params['dense1_w']
-        self.dense1.biases = params['dense1_b']
-        self.dense2.weights = params['dense2_w']
-        self.dense2.biases = params['dense2_b']
+        """
+        Maps a model_format file copy-on-write, so weights are paged in on
+        first use and shared with other processes until written. Old pickle
+        checkpoints are still read.
+        """
+        if is_weights_file(path):
+            params, metadata = load_weights(path)
+            spec = metadata.get('spec', DEFAULT_SPEC)
+            if spec != self.spec:
+                raise ValueError(f"{path} holds a '{spec}' model, not '{self.spec}'; use SimpleCNN.from_file")
+        else:
+            with open(path, 'rb') as f:
+                params = pickle.load(f)
+        self.set_params(params)
@@ -0,0 +1,300 @@
+import json
+import numpy as np
+from tiled_matmul import plan_tiles, iter_tiles
+
+# Analytic cost of one matmul on MatrixMul_top as driven over SPI by
+# test_matrix_mul_spi.py / test_matrix_mul_server.py.
+#
+# Transfer (cocotb master; every frame starts on a falling clk edge, up to
+# one clk period of alignment, and ends with CS high for cs_gap):
+#   word     (default) one frame per 32-bit word: 32 periods to send; to
+#            receive, half a period of CS setup, then 32 periods each
+#            followed by a half-period sample delay
+#   burst    the whole header + matrix in one CS assertion, 32 SCLK periods
+#            per word; reading C takes one extra leading period
+#   A and B each carry one header word; C is M*N words.
+# Compute (MatrixMulEngine + DotProductEngine): every C element takes 2
+# cycles per K step (RUN, WAIT_RESULT) plus 4 (DPE start, DONE, engine
+# WAIT_DPE -> STORE), so M*N*(2K + 4) clk cycles.
+#
+# The defaults match the drivers (10 ns clk, 10 ns SCLK half period, 40 ns
+# CS gap); the compute coefficients are read off the RTL state machines and
+# have not been fitted to a simulation yet, so the drivers only use them to
+# raise their fixed mul_done poll limit. fit() recalibrates the coefficients from phase timings that the
+# cocotb tests log to $MATMUL_TIMING_LOG, and also learns how many wall
+# seconds Icarus needs per simulated SPI word / compute cycle, so
+# estimate() can say how long a simulation would take before running it.
+TIMING_LOG_ENV_VAR = "MATMUL_TIMING_LOG"
+
+
+def append_timing(path, record):
+    """
+    Appends one JSON timing record (one line) to path.
+    """
+    with open(path, "a") as f:
+        f.write(json.dumps(record) + "\n")
+
+
+def load_timing_log(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class SpiCostModel:
+    """
+    clk_hz: MatrixMul_top clock; sclk_hz: SPI clock. spi_slave detects SCLK
+    edges through a two-flop synchronizer on clk, so each SCLK level must
+    last at least one clk period (sclk_hz <= clk_hz / 2).
+    """
+
+    def __init__(self, clk_hz=100e6, sclk_hz=50e6, cs_gap_s=40e-9, setup_s=210e-9, send_c_s=20e-9,
+                 compute_per_step=2.0, compute_per_element=4.0, compute_fixed=0.0, transfer_scale=1.0,
+                 wall_per_word_s=None, wall_per_cycle_s=None, wall_per_job_s=0.0, burst=False):
+        if sclk_hz > clk_hz / 2:
+            raise ValueError(f"SCLK {sclk_hz / 1e6:g} MHz is too fast for a {clk_hz / 1e6:g} MHz clk: "
+                             f"spi_slave needs sclk_hz <= clk_hz / 2")
+        self.clk_hz = clk_hz
+        self.sclk_hz = sclk_hz
+        # Framing, as selected by $MATMUL_SPI_MODE in the drivers
+        self.burst = burst
+        self.cs_gap_s = cs_gap_s
+        # Reset pulse + first clk edge before the A header (and between server jobs)
+        self.setup_s = setup_s
+        self.send_c_s = send_c_s
+        self.compute_per_step = compute_per_step
+        self.compute_per_element = compute_per_element
+        self.compute_fixed = compute_fixed
+        # Measured / modelled SPI time, fitted from real runs
+        self.transfer_scale = transfer_scale
+        # Simulator speed (None until fitted)
+        self.wall_per_word_s = wall_per_word_s
+        self.wall_per_cycle_s = wall_per_cycle_s
+        self.wall_per_job_s = wall_per_job_s
+
+    @property
+    def half_period_s(self):
+        return 0.5 / self.sclk_hz
+
+    def _frame_s(self, half_periods):
+        return self.transfer_scale * (1.0 / self.clk_hz + half_periods * self.half_period_s + self.cs_gap_s)
+
+    def send_s(self, words):
+        if self.burst:
+            return self._frame_s(words * 32 * 2)
+        return words * self._frame_s(32 * 2)
+
+    def receive_s(self, words):
+        if self.burst:
+            return self._frame_s(1 + words * 32 * 2)
+        return words * self._frame_s(1 + 32 * 3)
+
+    def words(self, M, K, N):
+        """
+        Words on the wire per phase: A and B include their header word.
+        """
+        return {"A": 1 + M * K, "B": 1 + K * N, "C": M * N}
+
+    def compute_cycles(self, M, K, N):
+        return int(round(M * N * (self.compute_per_step * K + self.compute_per_element) + self.compute_fixed))
+
+    def estimate(self, M, K, N):
+        """
+        One (M, K) x (K, N) job within the hardware limits. Times are in
+        simulated (= real hardware) seconds; cycles are clk cycles.
+        wall_s, the expected simulation wall time, is None until fit().
+        """
+        clk_s = 1.0 / self.clk_hz
+        words = self.words(M, K, N)
+        compute_cycles = self.compute_cycles(M, K, N)
+        phases = {
+            "setup": self.setup_s,
+            # The loader raises A_loaded / B_loaded within the CS gap; the
+            # driver then polls one clk edge
+            "A": self.send_s(words["A"]) + clk_s,
+            "B": self.send_s(words["B"]) + clk_s,
+            "compute": compute_cycles * clk_s,
+            "C": self.send_c_s + self.receive_s(words["C"]),
+        }
+        total_s = sum(phases.values())
+        wall_s = None
+        if self.wall_per_word_s is not None and self.wall_per_cycle_s is not None:
+            wall_s = (self.wall_per_job_s + self.wall_per_word_s * sum(words.values()) +
+                      self.wall_per_cycle_s * compute_cycles)
+        return {
+            "shape": [M, K, N],
+            "words": words,
+            "transfer_cycles": int(round((phases["A"] + phases["B"] + phases["C"]) * self.clk_hz)),
+            "compute_cycles": compute_cycles,
+            "phase_s": phases,
+            "total_cycles": int(round(total_s * self.clk_hz)),
+            "latency_s": total_s,
+            "wall_s": wall_s,
+        }
+
+    def estimate_tiled(self, M, K, N):
+        """
+        Any (M, K) x (K, N), split into jobs the way tiled_matmul does.
+        """
+        tm, tk, tn = plan_tiles(M, K, N)
+        tiles = [self.estimate(m1 - m0, k1 - k0, n1 - n0)
+                 for m0, m1, k0, k1, n0, n1 in iter_tiles(M, K, N, tm, tk, tn)]
+        walls = [t["wall_s"] for t in tiles]
+        return {
+            "shape": [M, K, N],
+            "tiles": len(tiles),
+            "tile_shape": [tm, tk, tn],
+            "transfer_cycles": sum(t["transfer_cycles"] for t in tiles),
+            "compute_cycles": sum(t["compute_cycles"] for t in tiles),
+            "total_cycles": sum(t["total_cycles"] for t in tiles),
+            "latency_s": sum(t["latency_s"] for t in tiles),
+            "wall_s": None if None in walls else sum(walls),
+        }
+
+    def fit(self, records):
+        """
+        Recalibrates from timing records (see load_timing_log): each has
+        "shape" [M, K, N], "sim_s" {phase: simulated seconds} and "wall_s"
+        {phase: wall seconds}. Returns a new SpiCostModel.
+        """
+        if not records:
+            raise ValueError("fit() needs at least one timing record")
+        clk_s = 1.0 / self.clk_hz
+        base = SpiCostModel(self.clk_hz, self.sclk_hz, self.cs_gap_s, self.setup_s, self.send_c_s,
+                            burst=self.burst)
+
+        # Transfer: one scale factor on the modelled SPI time
+        modelled = measured = 0.0
+        for r in records:
+            est = base.estimate(*r["shape"])
+            for phase in ("A", "B", "C"):
+                modelled += est["phase_s"][phase]
+                measured += r["sim_s"][phase]
+        transfer_scale = measured / modelled
+
+        # Compute cycles = per_step * M*N*K + per_element * M*N + fixed
+        rows, cycles = [], []
+        for r in records:
+            M, K, N = r["shape"]
+            rows.append([M * N * K, M * N, 1.0])
+            cycles.append(r["sim_s"]["compute"] / clk_s)
+        (per_step, per_element, fixed), *_ = np.linalg.lstsq(np.array(rows), np.array(cycles), rcond=None)
+
+        # Wall time = per_job + per_word * words + per_cycle * compute cycles
+        rows, walls = [], []
+        for r in records:
+            M, K, N = r["shape"]
+            rows.append([1.0, sum(base.words(M, K, N).values()), base.compute_cycles(M, K, N)])
+            walls.append(sum(r["wall_s"].values()))
+        (per_job, per_word, per_cycle), *_ = np.linalg.lstsq(np.array(rows), np.array(walls), rcond=None)
+
+        setup_s = float(np.mean([r["sim_s"]["setup"] for r in records]))
+        return SpiCostModel(self.clk_hz, self.sclk_hz, self.cs_gap_s, setup_s, self.send_c_s,
+                            float(per_step), float(per_element), float(fixed), float(transfer_scale),
+                            max(float(per_word), 0.0), max(float(per_cycle), 0.0), max(float(per_job), 0.0),
+                            self.burst)
+
+    def to_dict(self):
+        return dict(vars(self))
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(**d)
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+
+def layer_gemms(spec="baseline", batch_size=1):
+    """
+    [(layer op name, (M, K, N), numpy seconds)] for every forward GEMM
+    of SimpleCNN(spec), timed on the NumPy backend with the layer profiler.
+    """
+    from simple_cnn import SimpleCNN, IMG_SIZE
+    from layer_profiler import LayerProfiler
+    from matmul_backend import use_backend
+
+    model = SimpleCNN(spec=spec).eval()
+    x = np.random.default_rng(0).random((batch_size, 1, IMG_SIZE, IMG_SIZE), dtype=np.float32)
+    with use_backend("numpy"):
+        model.forward(x)
+        with LayerProfiler() as prof:
+            model.forward(x)
+    layers = prof.layer_events()
+    gemms = []
+    for e in prof.events:
+        if e["kind"] != "matmul":
+            continue
+        end = e["start"] + e["dur_s"]
+        owner = next(l["name"] for l in layers if l["start"] <= e["start"] and l["start"] + l["dur_s"] >= end)
+        gemms.append((owner, tuple(e["args"]["shape"]), e["dur_s"]))
+    return gemms
+
+
+def offload_plan(model, spec="baseline", batch_size=1):
+    """
+    Per forward GEMM: NumPy time vs the modelled hardware latency (and the
+    simulation wall time, once fitted). speedup > 1 means the SPI path
+    would beat the host.
+    """
+    plan = []
+    for layer, (M, K, N), numpy_s in layer_gemms(spec, batch_size):
+        est = model.estimate_tiled(M, K, N)
+        plan.append({"layer": layer, "shape": [M, K, N], "numpy_s": numpy_s, "tiles": est["tiles"],
+                     "hw_latency_s": est["latency_s"], "sim_wall_s": est["wall_s"],
+                     "transfer_share": est["transfer_cycles"] / max(est["total_cycles"], 1),
+                     "speedup": numpy_s / est["latency_s"]})
+    return plan
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Cycle model of the SPI matmul path")
+    parser.add_argument("--model", default=None, help="fitted model JSON (default: built-in coefficients)")
+    parser.add_argument("--sclk-mhz", type=float, default=None, help="override the SPI clock")
+    parser.add_argument("--spi-mode", choices=("burst", "word"), default=None, help="override the framing")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("estimate", help="cost of one (M, K) x (K, N) product, tiled if needed")
+    p.add_argument("M", type=int)
+    p.add_argument("K", type=int)
+    p.add_argument("N", type=int)
+    p = sub.add_parser("fit", help="calibrate from a $MATMUL_TIMING_LOG file")
+    p.add_argument("log")
+    p.add_argument("--output", default="spi_cost_model.json")
+    p = sub.add_parser("plan", help="which SimpleCNN layers are worth offloading")
+    p.add_argument("--spec", default="baseline")
+    p.add_argument("--batch-size", type=int, default=1)
+    args = parser.parse_args()
+
+    model = SpiCostModel.load(args.model) if args.model else SpiCostModel()
+    if args.sclk_mhz is not None:
+        model = SpiCostModel.from_dict(dict(model.to_dict(), sclk_hz=args.sclk_mhz * 1e6))
+    if args.spi_mode is not None:
+        model = SpiCostModel.from_dict(dict(model.to_dict(), burst=args.spi_mode == "burst"))
+
+    if args.command == "estimate":
+        print(json.dumps(model.estimate_tiled(args.M, args.K, args.N), indent=2))
+    elif args.command == "fit":
+        records = load_timing_log(args.log)
+        fitted = model.fit(records)
+        fitted.save(args.output)
+        for r in records:
+            est = fitted.estimate(*r["shape"])
+            print(f"{'x'.join(map(str, r['shape'])):>14s}  sim {sum(r['sim_s'].values()) * 1e3:9.3f} ms "
+                  f"(model {est['latency_s'] * 1e3:9.3f})  wall {sum(r['wall_s'].values()):8.2f} s "
+                  f"(model {est['wall_s']:8.2f})")
+        print(f"Fitted {len(records)} runs -> '{args.output}'.")
+    else:
+        print(f"{'layer':24s} {'M x K x N':>16s} {'tiles':>5s} {'numpy ms':>9s} {'hw ms':>9s} "
+              f"{'SPI %':>6s} {'speedup':>8s} {'sim wall s':>10s}")
+        for row in offload_plan(model, args.spec, args.batch_size):
+            wall = f"{row['sim_wall_s']:10.1f}" if row["sim_wall_s"] is not None else f"{'-':>10s}"
+            print(f"{row['layer']:24s} {'x'.join(map(str, row['shape'])):>16s} {row['tiles']:5d} "
+                  f"{row['numpy_s'] * 1e3:9.3f} {row['hw_latency_s'] * 1e3:9.3f} "
+                  f"{100 * row['transfer_share']:6.1f} {row['speedup']:8.4f} {wall}")
@@ -0,0 +1,32 @@
+import asyncio
+import numpy as np
+from inference_server import MicroBatcher
+
+# Host-side tests for the micro-batcher (pytest):
+#     python -m pytest test_inference_server.py
+
+
+def _forward(x):
+    # One "probability" row per image: its mean, so results can be matched up
+    return x.reshape(len(x), -1).mean(axis=1, keepdims=True)
+
+
+def test_every_request_resolves():
+    async def main():
+        batcher = MicroBatcher(_forward, max_batch=8, max_wait_ms=0.01)
+        batcher.start()
+        try:
+            async def client(i):
+                # Staggered arrivals so batch deadlines expire while gets are pending
+                await asyncio.sleep((i % 7) * 1e-5)
+                return await batcher.predict(np.full((1, 2, 2), i, dtype=np.float32))
+
+            results = await asyncio.wait_for(asyncio.gather(*(client(i) for i in range(500))), 10)
+        finally:
+            await batcher.stop()
+        return results, batcher
+
+    results, batcher = asyncio.run(main())
+    assert [float(r[0]) for r in results] == list(range(500))
+    assert batcher.requests == 500
+    assert batcher.batches >= 500 // 8
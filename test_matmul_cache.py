@@ -0,0 +1,55 @@
+import threading
+import numpy as np
+from matmul_cache import MatmulCache, rtl_digest
+
+# Host-side tests for matmul_cache (pytest; no simulator needed):
+#     python -m pytest test_matmul_cache.py
+
+
+def _operands(seed):
+    rng = np.random.default_rng(seed)
+    return (rng.standard_normal((8, 6)).astype(np.float32),
+            rng.standard_normal((6, 4)).astype(np.float32))
+
+
+def test_hit_after_miss():
+    cache = MatmulCache()
+    A, B = _operands(0)
+    C = cache.matmul(A, B, np.dot)
+    np.testing.assert_array_equal(cache.matmul(A, B, lambda A, B: None), C)
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_shared_between_threads(tmp_path):
+    # Like sim_farm: many workers hit one cache (both tiers) concurrently
+    cache = MatmulCache(str(tmp_path), max_entries=4)
+    operands = [_operands(seed) for seed in range(8)]
+    errors = []
+
+    def worker(index):
+        try:
+            for i in range(200):
+                A, B = operands[(index + i) % len(operands)]
+                np.testing.assert_array_equal(cache.matmul(A, B, np.dot), np.dot(A, B))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    assert cache.hits + cache.disk_hits + cache.misses == 8 * 200
+    assert len(list(tmp_path.glob("*.npy"))) == len(operands)
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_rtl_digest_per_directory(tmp_path):
+    for name in ("a", "b"):
+        (tmp_path / name).mkdir()
+        (tmp_path / name / "top.v").write_text(f"module {name}; endmodule\n")
+    digest_a = rtl_digest(str(tmp_path / "a"))
+    assert rtl_digest(str(tmp_path / "b")) != digest_a
+    assert rtl_digest(str(tmp_path / "b" / ".." / "a")) == digest_a
@@ -1,7 +1,7 @@
 import cocotb
 from cocotb.triggers import RisingEdge, Timer
 from cocotb.clock import Clock
-import struct
+from matrix_buffers import read_input_bits, write_output_bits
 
 @cocotb.test()
 async def matrix_mul_test(dut):
@@ -10,15 +10,8 @@ async def matrix_mul_test(dut):
     # Start the clock with 10ns period
     cocotb.start_soon(Clock(dut.clk, 10, units="ns").start())
 
-    # Load matrix info from input_buffer.txt
-    with open("input_buffer.txt", "r") as f:
-        lines = f.readlines()
-
-    M = int(lines[0].split()[1])
-    K = int(lines[1].split()[1])
-    N = int(lines[2].split()[1])
-    A_flat = list(map(float, lines[3].split()[1:]))
-    B_flat = list(map(float, lines[4].split()[1:]))
+    # Load matrix info from the input buffer ($MATMUL_BUFFER_FORMAT: bin or text)
+    M, K, N, A_bits, B_bits = read_input_bits()
 
     # Set matrix dimensions
     dut.M_val.value = M
@@ -34,10 +27,10 @@ async def matrix_mul_test(dut):
     await RisingEdge(dut.clk)
 
     # Load matrix A and B using IEEE-754 encoding
-    for i, val in enumerate(A_flat):
-        dut.matrix_A[i].value = struct.unpack('I', struct.pack('f', val))[0]
-    for i, val in enumerate(B_flat):
-        dut.matrix_B[i].value = struct.unpack('I', struct.pack('f', val))[0]
+    for i, val in enumerate(A_bits.tolist()):
+        dut.matrix_A[i].value = val
+    for i, val in enumerate(B_bits.tolist()):
+        dut.matrix_B[i].value = val
 
     # Trigger the start signal
     await RisingEdge(dut.clk)
@@ -50,15 +43,12 @@ async def matrix_mul_test(dut):
         await RisingEdge(dut.clk)
     await RisingEdge(dut.clk)  # one extra to latch results
 
-    # Read and decode matrix C
-    C_flat = []
+    # Read matrix C (raw IEEE-754 words)
+    C_bits = []
     for i in range(M * N):
-        raw_val = dut.matrix_C[i].value.integer
-        float_val = struct.unpack('f', struct.pack('I', raw_val))[0]
-        C_flat.append(float_val)
+        C_bits.append(dut.matrix_C[i].value.integer)
 
     # Save results to file
-    with open("output_buffer.txt", "w") as f:
-        f.write("C " + " ".join(map(str, C_flat)) + "\n")
+    path = write_output_bits(C_bits, M, N)
 
-    cocotb.log.info("Matrix multiplication complete. Results written to output_buffer.txt.")
+    cocotb.log.info(f"Matrix multiplication complete. Results written to {path}.")
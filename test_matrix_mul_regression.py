@@ -0,0 +1,81 @@
+import os
+import numpy as np
+import cocotb
+from cocotb.clock import Clock
+from cocotb.triggers import Timer
+from matrix_buffers import read_input_bits, read_output
+from mac32_emulator import matrix_mul_bits
+from test_matrix_mul_spi import reset_dut, protocol_matmul, backdoor_matmul
+
+# Regression for the SPI transport of MatrixMul_top:
+#     make MODULE=test_matrix_mul_regression      (or pytest test_rtl_regression.py)
+# Every case goes through both drivers, one CS frame per word and burst,
+# and C must match mac32_emulator bit for bit. The first case is the
+# committed input_buffer.txt, whose output_buffer.txt must match as well.
+# functional_fidelity runs each case once more with the backdoor loads of
+# $MATMUL_HW_FIDELITY=functional, which must give the very same C words
+# (i.e. the deposits reach MatrixMulEngine through the loader's ports).
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+RANDOM_SHAPES = ((3, 7, 5), (1, 1, 1), (16, 9, 8))
+
+
+def regression_cases():
+    """
+    [(name, M, K, N, A_bits, B_bits, expected C_bits)]
+    """
+    M, K, N, A_bits, B_bits = read_input_bits("text", PROJECT_DIR)
+    golden = read_output(M, N, "text", PROJECT_DIR).view(np.uint32).ravel()
+    expected = matrix_mul_bits(A_bits.reshape(M, K), B_bits.reshape(K, N)).astype(np.uint32).ravel()
+    assert np.array_equal(golden, expected), "mac32_emulator disagrees with output_buffer.txt"
+    cases = [("input_buffer.txt", M, K, N, A_bits, B_bits, golden)]
+
+    rng = np.random.default_rng(0)
+    for M, K, N in RANDOM_SHAPES:
+        A_bits = rng.uniform(-2, 2, M * K).astype(np.float32).view(np.uint32)
+        B_bits = rng.uniform(-2, 2, K * N).astype(np.float32).view(np.uint32)
+        expected = matrix_mul_bits(A_bits.reshape(M, K), B_bits.reshape(K, N)).astype(np.uint32).ravel()
+        cases.append((f"random {M}x{K}x{N}", M, K, N, A_bits, B_bits, expected))
+    return cases
+
+
+def check_case(dut, name, C_bits, expected):
+    C_bits = np.asarray(C_bits, dtype=np.uint32)
+    bad = np.flatnonzero(C_bits != expected)
+    assert bad.size == 0, (f"{name}: {bad.size} of {expected.size} C words differ, first at {bad[0]}: "
+                           f"0x{int(C_bits[bad[0]]):08X} != 0x{int(expected[bad[0]]):08X}")
+    dut._log.info(f"{name}: {expected.size} C words match")
+
+
+async def run_protocol(dut, burst):
+    cocotb.start_soon(Clock(dut.clk, 10, units="ns").start())
+    await Timer(100, units="ns")
+    for name, M, K, N, A_bits, B_bits, expected in regression_cases():
+        await reset_dut(dut, M, K, N)
+        C_bits = await protocol_matmul(dut, M, K, N, A_bits, B_bits, burst)
+        check_case(dut, name, C_bits, expected)
+
+
+@cocotb.test()
+async def spi_word_mode(dut):
+    """One CS frame per 32-bit word."""
+    await run_protocol(dut, burst=False)
+
+
+@cocotb.test()
+async def spi_burst_mode(dut):
+    """Each matrix and all of C in a single CS assertion."""
+    await run_protocol(dut, burst=True)
+
+
+@cocotb.test()
+async def functional_fidelity(dut):
+    """Backdoor-loaded A/B and backdoor-read C are bit-identical to the SPI run."""
+    cocotb.start_soon(Clock(dut.clk, 10, units="ns").start())
+    await Timer(100, units="ns")
+    for name, M, K, N, A_bits, B_bits, expected in regression_cases():
+        await reset_dut(dut, M, K, N)
+        protocol_C = await protocol_matmul(dut, M, K, N, A_bits, B_bits)
+        await reset_dut(dut, M, K, N)
+        functional_C = await backdoor_matmul(dut, M, K, N, A_bits, B_bits)
+        check_case(dut, f"{name} (protocol)", protocol_C, expected)
+        check_case(dut, f"{name} (functional)", functional_C, np.asarray(protocol_C, dtype=np.uint32))
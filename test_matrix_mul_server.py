@@ -0,0 +1,44 @@
+import os
+import socket
+import cocotb
+from cocotb.clock import Clock
+from cocotb.triggers import Timer
+from test_matrix_mul_spi import spi_mode, reset_dut, protocol_matmul, backdoor_matmul, PhaseTimer
+from matrix_sim_server import SOCKET_ENV_VAR, recv_job, send_result
+
+@cocotb.test()
+async def matrixmul_spi_server(dut):
+    """Persistent SPI matmul: serve jobs from matrix_sim_server until shutdown."""
+
+    cocotb.start_soon(Clock(dut.clk, 10, units="ns").start())
+    await Timer(100, units="ns")
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(os.environ[SOCKET_ENV_VAR])
+    dut._log.info("Connected to matmul server socket, waiting for jobs.")
+
+    burst = spi_mode() == "burst"
+    jobs = 0
+    while True:
+        # Blocking read: simulated time does not advance while we wait
+        job = recv_job(sock)
+        if job is None:
+            break
+        M, K, N, A_bits, B_bits, fidelity = job
+        timer = PhaseTimer()
+
+        # Reset between jobs so the loader/engine start from a clean state
+        # (no stale A_loaded/B_loaded from the previous job)
+        await reset_dut(dut, M, K, N)
+        timer.lap("setup")
+
+        if fidelity == "functional":
+            C_bits = await backdoor_matmul(dut, M, K, N, A_bits, B_bits)
+        else:
+            C_bits = await protocol_matmul(dut, M, K, N, A_bits, B_bits, burst, timer)
+            timer.log(M, K, N)
+        send_result(sock, C_bits)
+        jobs += 1
+
+    sock.close()
+    dut._log.info(f"Matmul server shut down after {jobs} jobs.")
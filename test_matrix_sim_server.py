@@ -0,0 +1,111 @@
+import os
+import stat
+import sys
+import threading
+import numpy as np
+import matrix_sim_server
+from matrix_sim_server import MatrixMulServer, get_server, close_server
+from matrix_mul_hw_wrapper import matrix_mul_hw as legacy_matrix_mul_hw
+
+# Host-side tests for matrix_sim_server (pytest; no simulator needed):
+#     python -m pytest test_matrix_sim_server.py
+#
+# A stand-in `make` on PATH plays the cocotb server: it connects to the
+# socket, answers jobs with numpy, and exits after $FAKE_SERVER_JOBS jobs,
+# as a crashed simulator would. Functional-fidelity jobs are answered with
+# -(A @ B), so tests can tell which opcode arrived.
+FAKE_MAKE = f"""#!{sys.executable}
+import os, sys
+sys.path.insert(0, {os.path.dirname(os.path.abspath(__file__))!r})
+import socket
+import numpy as np
+from matrix_sim_server import SOCKET_ENV_VAR, recv_job, send_result
+
+sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+sock.connect(os.environ[SOCKET_ENV_VAR])
+for _ in range(int(os.environ.get("FAKE_SERVER_JOBS", "1000000"))):
+    job = recv_job(sock)
+    if job is None:
+        break
+    M, K, N, A_bits, B_bits, fidelity = job
+    A = A_bits.view(np.float32).reshape(M, K)
+    B = B_bits.view(np.float32).reshape(K, N)
+    C = A @ B if fidelity == "protocol" else -(A @ B)
+    send_result(sock, C.astype(np.float32).view(np.uint32).ravel())
+"""
+
+
+def _fake_make(tmp_path, monkeypatch, jobs=None):
+    bindir = tmp_path / "bin"
+    bindir.mkdir()
+    make = bindir / "make"
+    make.write_text(FAKE_MAKE)
+    make.chmod(make.stat().st_mode | stat.S_IXUSR)
+    monkeypatch.setenv("PATH", f"{bindir}{os.pathsep}{os.environ['PATH']}")
+    if jobs is not None:
+        monkeypatch.setenv("FAKE_SERVER_JOBS", str(jobs))
+
+
+def _operands(seed):
+    rng = np.random.default_rng(seed)
+    return (rng.standard_normal((4, 3)).astype(np.float32),
+            rng.standard_normal((3, 5)).astype(np.float32))
+
+
+def test_restarts_after_simulator_exit(tmp_path, monkeypatch):
+    _fake_make(tmp_path, monkeypatch, jobs=1)
+    with MatrixMulServer(str(tmp_path)) as server:
+        for seed in range(3):
+            A, B = _operands(seed)
+            np.testing.assert_allclose(server.matmul(A, B), A @ B, rtol=1e-6)
+            server.proc.wait(timeout=30)
+            assert not server.alive()
+
+
+def test_get_server_replaces_dead_server(tmp_path, monkeypatch):
+    _fake_make(tmp_path, monkeypatch)
+    workdir = str(tmp_path / "work")
+    try:
+        first = get_server(workdir)
+        first.proc.kill()
+        first.proc.wait()
+        server = get_server(workdir)
+        assert server.alive()
+        A, B = _operands(0)
+        np.testing.assert_allclose(server.matmul(A, B), A @ B, rtol=1e-6)
+    finally:
+        close_server(workdir)
+    assert os.path.abspath(workdir) not in matrix_sim_server._servers
+
+
+def test_concurrent_calls_are_serialised(tmp_path, monkeypatch):
+    _fake_make(tmp_path, monkeypatch)
+    errors = []
+
+    with MatrixMulServer(str(tmp_path)) as server:
+        def worker(seed):
+            try:
+                for i in range(10):
+                    A, B = _operands(seed * 100 + i)
+                    np.testing.assert_allclose(server.matmul(A, B), A @ B, rtol=1e-6)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    assert not errors
+
+
+def test_legacy_wrapper_passes_fidelity(tmp_path, monkeypatch):
+    _fake_make(tmp_path, monkeypatch)
+    monkeypatch.chdir(tmp_path)
+    A, B = _operands(0)
+    try:
+        np.testing.assert_allclose(legacy_matrix_mul_hw(A, B, persistent=True, fidelity="protocol"), A @ B, rtol=1e-6)
+        np.testing.assert_allclose(legacy_matrix_mul_hw(A, B, persistent=True, fidelity="functional"), -(A @ B),
+                                   rtol=1e-6)
+    finally:
+        close_server()
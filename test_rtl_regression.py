@@ -0,0 +1,44 @@
+import os
+import shutil
+import subprocess
+import xml.etree.ElementTree as ET
+import numpy as np
+import pytest
+from matrix_buffers import read_input_bits, read_output
+from matrix_hw_wrapper import MAKEFILE, FIDELITIES, matrix_mul_hw
+from matrix_sim_server import close_server
+
+# Runs the cocotb regression (test_matrix_mul_regression.py) in Icarus from
+# pytest, in a scratch workdir, and the committed golden buffers through the
+# host wrappers at both fidelities. Skipped where the simulator flow is missing.
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+pytestmark = pytest.mark.skipif(shutil.which("iverilog") is None or shutil.which("cocotb-config") is None,
+                                reason="needs Icarus Verilog and cocotb")
+
+
+def test_matrix_mul_regression(tmp_path):
+    result = subprocess.run(["make", "-f", MAKEFILE, "MODULE=test_matrix_mul_regression"], cwd=tmp_path,
+                            capture_output=True, text=True)
+    results = tmp_path / "results.xml"
+    assert result.returncode == 0 and results.exists(), result.stdout[-4000:] + result.stderr[-4000:]
+    cases = list(ET.parse(results).iter("testcase"))
+    failed = [c.get("name") for c in cases if c.find("failure") is not None or c.find("error") is not None]
+    assert cases and not failed, f"cocotb failures: {failed}\n{result.stdout[-4000:]}"
+
+
+@pytest.mark.parametrize("persistent", [False, True], ids=["make", "server"])
+def test_golden_buffers_both_fidelities(tmp_path, persistent):
+    # input_buffer.txt -> output_buffer.txt, bit for bit, whether A/B travel
+    # over SPI or are deposited by the backdoor
+    M, K, N, A_bits, B_bits = read_input_bits("text", PROJECT_DIR)
+    A = A_bits.view(np.float32).reshape(M, K)
+    B = B_bits.view(np.float32).reshape(K, N)
+    golden = read_output(M, N, "text", PROJECT_DIR).astype(np.float32).view(np.uint32)
+    try:
+        for fidelity in FIDELITIES:
+            C = matrix_mul_hw(A, B, persistent, cache=False, fidelity=fidelity, workdir=str(tmp_path))
+            C_bits = np.asarray(C, dtype=np.float32).view(np.uint32)
+            assert np.array_equal(C_bits, golden), f"{fidelity}: C differs from output_buffer.txt"
+    finally:
+        if persistent:
+            close_server(str(tmp_path))
@@ -2,16 +2,23 @@ import cocotb
 from cocotb.clock import Clock
 from cocotb.triggers import RisingEdge, Timer
 import struct
+from test_matrix_mul_spi import spi_receive_burst
 
 
-@cocotb.test()
-async def test_spi_matrix_sender(dut):
-    """Test: Send matrix C from DUT to Python using SPI."""
+# Matrix dimensions
+M, N = 4, 4
+C_size = M * N
+
+
+def float_to_hex(f):
+    return struct.unpack('<I', struct.pack('<f', f))[0]
 
-    # Matrix dimensions
-    M, N = 4, 4
-    C_size = M * N
 
+async def start_sender(dut, burst):
+    """
+    Resets the sender, loads matrix C into it and pulses start_tx.
+    Returns the C words in send order.
+    """
     # Start DUT clock
     cocotb.start_soon(Clock(dut.clk, 10, units="ns").start())
     await Timer(100, units="ns")
@@ -22,14 +29,11 @@ async def test_spi_matrix_sender(dut):
     dut.cs_n.value = 1
     dut.mosi.value = 0
     dut.start_tx.value = 0
+    dut.burst.value = int(burst)
     await Timer(100, units="ns")
     dut.rst_n.value = 1
     await RisingEdge(dut.clk)
 
-    # === Helper ===
-    def float_to_hex(f):
-        return struct.unpack('<I', struct.pack('<f', f))[0]
-
     # === Prepare Matrix C and Load into DUT ===
     matrix_C = [[float(i * N + j + 1) for j in range(N)] for i in range(M)]
     matrix_C_flat = [float_to_hex(x) for row in matrix_C for x in row]
@@ -45,6 +49,14 @@ async def test_spi_matrix_sender(dut):
     dut.start_tx.value = 0
 
     await Timer(200, units="ns")
+    return matrix_C_flat
+
+
+@cocotb.test()
+async def test_spi_matrix_sender(dut):
+    """Test: Send matrix C from DUT to Python using SPI, one CS frame per word."""
+
+    matrix_C_flat = await start_sender(dut, burst=False)
 
     # === Read Matrix C over SPI ===
     received_data = []
@@ -58,6 +70,20 @@ async def test_spi_matrix_sender(dut):
     for i in range(C_size):
         assert received_data[i] == matrix_C_flat[i], f"Mismatch at index {i}: {received_data[i]} != {matrix_C_flat[i]}"
 
+
+@cocotb.test()
+async def test_spi_matrix_sender_burst(dut):
+    """Test: Send matrix C from DUT to Python in a single CS frame (burst)."""
+
+    matrix_C_flat = await start_sender(dut, burst=True)
+    received_data = await spi_receive_burst(dut, C_size)
+
+    for i in range(C_size):
+        assert received_data[i] == matrix_C_flat[i], \
+            f"Mismatch at index {i}: 0x{received_data[i]:08X} != 0x{matrix_C_flat[i]:08X}"
+    # done_tx has pulsed by the end of the frame; the FSM must not hang in BURST_DRAIN
+    assert dut.state.value == 0, "sender did not return to IDLE after the last word"
+
 # === SPI Receive Bit-Bang Function ===
 async def spi_receive_word(dut):
     """Simulate SPI master receive: clock bits and sample MISO."""
@@ -0,0 +1,63 @@
+import numpy as np
+from matrix_hw_wrapper import matrix_mul_hw, HW_MAX_M, HW_MAX_K, HW_MAX_N, HW_MAX_WORDS
+
+
+def _split(size, limit):
+    """
+    Smallest number of equal-ish blocks of at most limit along one axis.
+    Returns the block size used for every block but (possibly) the last.
+    """
+    num_blocks = -(-size // limit)
+    return -(-size // num_blocks)
+
+
+def plan_tiles(M, K, N, max_m=HW_MAX_M, max_k=HW_MAX_K, max_n=HW_MAX_N, max_words=HW_MAX_WORDS):
+    """
+    Picks tile sizes (tm, tk, tn) so every A block (tm, tk), B block (tk, tn)
+    and C block (tm, tn) fits the hardware limits.
+    """
+    tk = _split(K, min(max_k, max_words))
+    tn = _split(N, min(max_n, max_words // tk))
+    tm = _split(M, min(max_m, max_words // tk, max_words // tn))
+    return tm, tk, tn
+
+
+def iter_tiles(M, K, N, tm, tk, tn):
+    """
+    Yields (m0, m1, k0, k1, n0, n1) block bounds.
+    n and k are the outer loops so consecutive tiles share the same B block:
+    B (the weights for a conv/dense layer) is sliced once and reused across
+    every row block of A.
+    """
+    for n0 in range(0, N, tn):
+        for k0 in range(0, K, tk):
+            for m0 in range(0, M, tm):
+                yield m0, min(m0 + tm, M), k0, min(k0 + tk, K), n0, min(n0 + tn, N)
+
+
+def matrix_mul_tiled(A, B, matmul_fn=matrix_mul_hw, max_m=HW_MAX_M, max_k=HW_MAX_K,
+                     max_n=HW_MAX_N, max_words=HW_MAX_WORDS):
+    """
+    A: (M, K), B: (K, N) -> (M, N)
+    Splits the product into hardware-sized blocks, runs each one through
+    matmul_fn and accumulates the K-split partial sums on the host.
+    Products that already fit are forwarded unchanged in a single call.
+    """
+    M, K = A.shape
+    K2, N = B.shape
+    if K != K2:
+        raise ValueError(f"Matrix shape mismatch: A is {A.shape}, B is {B.shape} (K != K2)")
+
+    tm, tk, tn = plan_tiles(M, K, N, max_m, max_k, max_n, max_words)
+    if (tm, tk, tn) == (M, K, N):
+        return matmul_fn(A, B)
+
+    C = np.zeros((M, N))
+    B_block = None
+    B_bounds = None
+    for m0, m1, k0, k1, n0, n1 in iter_tiles(M, K, N, tm, tk, tn):
+        if B_bounds != (k0, k1, n0, n1):
+            B_bounds = (k0, k1, n0, n1)
+            B_block = np.ascontiguousarray(B[k0:k1, n0:n1])
+        C[m0:m1, n0:n1] += matmul_fn(A[m0:m1, k0:k1], B_block)
+    return C
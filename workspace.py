@@ -0,0 +1,73 @@
+import numpy as np
+
+# Reusable buffers for layer temporaries (padded inputs, im2col patches, GEMM
+# outputs, gradients). Each (scope, name) owns one flat block of storage; a
+# request is served as a view of its first prod(shape) elements, and the
+# block is only reallocated when a request needs more than it holds (or a
+# different dtype). Training batches, larger eval batches and a final
+# partial batch therefore share one block, and a loop stops allocating once
+# it has seen its largest shape.
+#
+# Retention: every block stays at the largest size ever requested until the
+# Workspace is cleared (clear()) or dropped with its model.
+#
+# Buffers are overwritten by the next request for the same name: anything a
+# layer returns from a workspace buffer is only valid until that layer runs
+# again.
+
+
+class Workspace:
+    """
+    Per-model arena. scope(name) gives each layer its own key space over the
+    same storage:
+
+        ws = Workspace()
+        conv1.workspace = ws.scope('conv1')
+    """
+
+    def __init__(self, _buffers=None, _prefix=()):
+        # key -> [flat storage, shape of the last view handed out]
+        self._buffers = {} if _buffers is None else _buffers
+        self._prefix = _prefix
+
+    def scope(self, name):
+        return Workspace(self._buffers, self._prefix + (name,))
+
+    def get(self, name, shape, dtype, zero=False):
+        """
+        Buffer of the given shape/dtype. A buffer whose shape differs from the
+        previous request for this name starts zeroed (so e.g. a padding
+        border that is never written stays zero); zero=True also clears a
+        reused one.
+        """
+        key = self._prefix + (name,)
+        shape = tuple(shape)
+        dtype = np.dtype(dtype)
+        size = int(np.prod(shape))
+        entry = self._buffers.get(key)
+        if entry is None or entry[0].size < size or entry[0].dtype != dtype:
+            entry = self._buffers[key] = [np.zeros(size, dtype=dtype), shape]
+            return entry[0].reshape(shape)
+        buf = entry[0][:size].reshape(shape)
+        if zero or entry[1] != shape:
+            buf.fill(0)
+            entry[1] = shape
+        return buf
+
+    @property
+    def nbytes(self):
+        return sum(entry[0].nbytes for key, entry in self._buffers.items()
+                   if key[:len(self._prefix)] == self._prefix)
+
+    def clear(self):
+        for key in [k for k in self._buffers if k[:len(self._prefix)] == self._prefix]:
+            del self._buffers[key]
+
+
+def get_buffer(workspace, name, shape, dtype, zero=False):
+    """
+    workspace.get(...), or a fresh array when the layer has no workspace.
+    """
+    if workspace is None:
+        return np.zeros(shape, dtype=dtype) if zero else np.empty(shape, dtype=dtype)
+    return workspace.get(name, shape, dtype, zero)